@@ -0,0 +1,120 @@
+"""
+Micro-benchmark: single-pass parse_levels_rich vs the previous six-regex extractor.
+
+    python -m benchmarks.bench_levels                   # synthetic OpenLibrary-like payloads
+    python -m benchmarks.bench_levels ed.json wk.json   # your own saved /isbn or /works JSON
+
+Run from the repo root (or with the package installed) so library_data imports.
+
+Also checks that both implementations agree on every payload.
+"""
+import json
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+from library_data.scripts.enrich_levels import parse_levels_rich
+
+# --- previous implementation, kept verbatim for comparison -------------------------------
+RE_LEXILE_ANY   = re.compile(r"\b(\d{3,4})\s*[lL]\b")
+RE_LEXILE_RANGE = re.compile(r"\blexile[^0-9]*?(\d{3,4})\s*[-–]\s*(\d{3,4})\b", re.I)
+RE_GRADES_RANGE = re.compile(r"\bgrades?\s*(\d+)\s*[-–]\s*(\d+)\b", re.I)
+RE_GRADE_SINGLE = re.compile(r"\bgrade\s*(?:level\s*)?(\d+)\b", re.I)
+RE_AGES_RANGE   = re.compile(r"\bages?\s*(\d+)\s*[-–]\s*(\d+)\b", re.I)
+RE_AGE_SINGLE   = re.compile(r"\bage\s*(\d+)\b", re.I)
+
+def _legacy_extract(blob, out):
+    if not blob or not isinstance(blob, str):
+        return
+    m = RE_LEXILE_RANGE.search(blob)
+    if m:
+        out.setdefault("lexile_min", int(m.group(1)))
+        out.setdefault("lexile_max", int(m.group(2)))
+    if "lexile_min" not in out or "lexile_max" not in out:
+        m2 = RE_LEXILE_ANY.search(blob)
+        if m2:
+            n = int(m2.group(1))
+            out.setdefault("lexile_min", n)
+            out.setdefault("lexile_max", n)
+    mg = RE_GRADES_RANGE.search(blob)
+    if mg:
+        out.setdefault("grade_min", int(mg.group(1)))
+        out.setdefault("grade_max", int(mg.group(2)))
+    else:
+        mg2 = RE_GRADE_SINGLE.search(blob)
+        if mg2:
+            g = int(mg2.group(1))
+            out.setdefault("grade_min", g)
+            out.setdefault("grade_max", g)
+    ma = RE_AGES_RANGE.search(blob)
+    if ma:
+        out.setdefault("age_min", int(ma.group(1)))
+        out.setdefault("age_max", int(ma.group(2)))
+    else:
+        ma2 = RE_AGE_SINGLE.search(blob)
+        if ma2:
+            a = int(ma2.group(1))
+            out.setdefault("age_min", a)
+            out.setdefault("age_max", a)
+
+def legacy_parse_levels_rich(obj):
+    out = {}
+    if not obj:
+        return out
+    for s in obj.get("subjects") or []:
+        if isinstance(s, str):
+            _legacy_extract(s, out)
+    for key in ("description", "notes"):
+        v = obj.get(key)
+        if isinstance(v, dict):
+            _legacy_extract(v.get("value"), out)
+        elif isinstance(v, str):
+            _legacy_extract(v, out)
+    return out
+
+# --- payloads ------------------------------------------------------------------------------
+SUBJECTS = [
+    "Fiction", "Juvenile fiction", "Wizards", "Magic", "Schools", "Fantasy fiction",
+    "Hogwarts School of Witchcraft and Wizardry (Imaginary organization)", "Friendship",
+    "England, fiction", "Children's fiction", "Boarding schools", "Orphans", "Witches",
+    "nyt:series_books=2007-08-12", "New York Times bestseller", "Reading Level-Grade 4",
+    "Accelerated Reader 5.5", "Interest Level: Ages 8-12", "Lexile 880L", "Grade 5-7",
+    "Fiction, fantasy, general", "Juvenile works", "Translations into French",
+]
+DESCRIPTIONS = [
+    "Harry Potter has never even heard of Hogwarts when the letters start dropping on the "
+    "doormat at number four, Privet Drive.",
+    "A thrilling adventure for readers ages 9-12. Lexile: 880L. Guided Reading level S.",
+    "The boy who lived returns in the 1998 edition with illustrations by Mary GrandPré.",
+    "",
+]
+
+def synthetic_payloads(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        obj = {"subjects": rnd.sample(SUBJECTS, rnd.randint(3, 15))}
+        if rnd.random() < 0.6:
+            obj["description"] = {"type": "/type/text", "value": rnd.choice(DESCRIPTIONS)}
+        if rnd.random() < 0.2:
+            obj["notes"] = rnd.choice(DESCRIPTIONS)
+        out.append(obj)
+    return out
+
+def main():
+    if len(sys.argv) > 1:
+        payloads = [json.loads(Path(p).read_text(encoding="utf-8")) for p in sys.argv[1:]]
+    else:
+        payloads = synthetic_payloads(2000)
+
+    mismatches = sum(1 for p in payloads if parse_levels_rich(p) != legacy_parse_levels_rich(p))
+    print(f"payloads: {len(payloads)}  mismatches: {mismatches}")
+
+    for name, fn in (("legacy", legacy_parse_levels_rich), ("single-pass", parse_levels_rich)):
+        t = min(timeit.repeat(lambda: [fn(p) for p in payloads], number=5, repeat=5)) / 5
+        print(f"{name:12s} {t * 1e3:8.2f} ms/run  {t / len(payloads) * 1e6:7.2f} us/payload")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Import-time regression check for the console-script modules (python -X importtime).
+
+    python benchmarks/check_import_time.py          # exit 1 if any budget is exceeded
+
+For each entry module: the cumulative import time (best of a few fresh interpreters)
+must stay under its budget, and heavy dependencies that only some code paths use
+must not be imported at module load.
+"""
+import subprocess
+import sys
+
+RUNS = 5
+
+# module -> (budget in ms, modules that must not be loaded by importing it)
+BUDGETS = {
+    "library_data.scripts.query": (30, ("requests", "numpy", "dotenv", "playwright", "asyncio")),
+    "library_data.scripts.nightly": (30, ("requests", "numpy", "dotenv", "playwright")),
+    "library_data.scripts.export_lt": (30, ("requests", "numpy", "dotenv", "playwright")),
+    "library_data.scripts.capture_playwright_state": (30, ("playwright",)),
+    "library_data.scripts.ingest": (250, ("requests", "dotenv", "playwright")),
+    "library_data.scripts.enrich_levels": (400, ("dotenv", "playwright")),
+    "library_data.scripts.dedup": (250, ("requests", "dotenv", "playwright")),
+    "library_data.scripts.similar": (250, ("requests", "dotenv", "playwright")),
+    "library_data.scripts.snapshot": (250, ("requests", "dotenv", "playwright")),
+}
+
+def measure(module: str) -> tuple[float, set[str]]:
+    code = f"import {module}, sys; print('\\n'.join(sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+    loaded = {m.split(".")[0] for m in proc.stdout.split()}
+    return (cumulative_us or 0) / 1000, loaded
+
+def main() -> int:
+    failed = False
+    for module, (budget_ms, forbidden) in BUDGETS.items():
+        best, loaded = None, set()
+        for _ in range(RUNS):
+            ms, loaded = measure(module)
+            best = ms if best is None else min(best, ms)
+        leaked = sorted(set(forbidden) & loaded)
+        ok = best <= budget_ms and not leaked
+        failed |= not ok
+        note = f"  loads {', '.join(leaked)}" if leaked else ""
+        status = "ok  " if ok else "FAIL"
+        print(f"{status} {module:48s} {best:7.1f} ms (budget {budget_ms} ms){note}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import re
 from pathlib import Path
 
 
@@ -15,10 +16,33 @@ def _default_data_root() -> Path:
 DATA_ROOT = _default_data_root()
 DB_DIR = DATA_ROOT / "data" / "db"
 DB_PATH = DB_DIR / "catalog.db"
+# One SQLite file per LibraryThing account/catalog: DB_DIR/shards/<name>.db
+SHARDS_DIR = DB_DIR / "shards"
 EXPORTS_DIR = DATA_ROOT / "exports"
 SECRETS_DIR = DATA_ROOT / "secrets"
+# Columnar analytics snapshots (library-data-snapshot): SNAPSHOTS_DIR/<db name>/
+SNAPSHOTS_DIR = DATA_ROOT / "snapshots"
+# Unix socket of the long-running query daemon (library-data-query serve)
+QUERY_SOCKET = Path(os.getenv("LIBRARY_QUERY_SOCKET") or (DATA_ROOT / "query.sock"))
 
 
 def ensure_dirs():
-    for p in (DB_DIR, EXPORTS_DIR, SECRETS_DIR):
+    for p in (DB_DIR, SHARDS_DIR, EXPORTS_DIR, SECRETS_DIR, SNAPSHOTS_DIR):
         p.mkdir(parents=True, exist_ok=True)
+
+
+def shard_path(name: str) -> Path:
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", name.strip())
+    if not safe or safe.startswith("."):
+        raise ValueError(f"invalid shard name: {name!r}")
+    return SHARDS_DIR / f"{safe}.db"
+
+
+def list_shards() -> list[str]:
+    if not SHARDS_DIR.exists():
+        return []
+    return sorted(p.stem for p in SHARDS_DIR.glob("*.db"))
+
+
+def snapshot_path(db_path: str | Path) -> Path:
+    return SNAPSHOTS_DIR / Path(db_path).stem
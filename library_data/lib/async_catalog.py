@@ -0,0 +1,151 @@
+# lib/async_catalog.py
+"""
+asyncio front end for lib_catalog, for apps that embed the catalog in an event loop.
+
+    async with AsyncCatalog(db_path, max_workers=4) as cat:
+        rows = await cat.filter_books(age=(8, 10), limit=20)
+
+Queries run on a dedicated, bounded pool of reader threads, each with its own
+read-only connection. Identical queries that are already in flight share one
+execution (results are shared objects, so treat them as read-only). Cancelling a
+caller only cancels the query once no other caller is waiting for it: a queued query
+is dropped, a running one is stopped with sqlite3's interrupt().
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from library_data.config import DB_PATH as DB_DEFAULT
+from library_data.lib import lib_catalog
+
+
+class _Flight:
+    """One execution of a query, shared by every caller awaiting the same key."""
+
+    def __init__(self):
+        self.waiters = 0
+        self.con: Optional[sqlite3.Connection] = None
+        self.aborted = False
+        self.lock = threading.Lock()
+        self.future: Optional[asyncio.Future] = None
+
+
+class AsyncCatalog:
+    def __init__(self, db_path: str | Path = DB_DEFAULT, *, max_workers: int = 4,
+                 max_pending: Optional[int] = None, coalesce: bool = True):
+        self.db_path = Path(db_path).resolve()
+        self.coalesce = coalesce
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="catalog-async")
+        # bounds queued + running executions (joining an in-flight query doesn't take a slot)
+        self._gate = asyncio.Semaphore(max_pending or max_workers * 4)
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._inflight: Dict[tuple, _Flight] = {}
+
+    # -- plumbing -------------------------------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            self._local.con = con
+            with self._conns_lock:
+                self._conns.append(con)
+        return con
+
+    def _execute(self, flight: _Flight, fn: Callable, args: tuple, kw: dict):
+        con = self._conn()
+        with flight.lock:
+            if flight.aborted:
+                raise asyncio.CancelledError()
+            flight.con = con
+        # interrupt() is lost if it lands before fn's statement starts; the handler isn't
+        con.set_progress_handler(lambda: flight.aborted, 1000)
+        try:
+            return fn(con, *args, **kw)
+        finally:
+            con.set_progress_handler(None, 0)
+            with flight.lock:
+                flight.con = None
+
+    async def _start(self, flight: _Flight, fn: Callable, args: tuple, kw: dict):
+        async with self._gate:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, self._execute, flight, fn, args, kw)
+
+    def _abort(self, key: Optional[tuple], flight: _Flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        with flight.lock:
+            flight.aborted = True
+            if flight.con is not None:
+                flight.con.interrupt()  # running statement raises OperationalError('interrupted')
+        flight.future.cancel()  # still queued: never runs
+
+    async def _run(self, fn: Callable, *args, **kw) -> Any:
+        key = None
+        if self.coalesce:
+            key = (fn.__name__, json.dumps([args, kw], sort_keys=True, default=list))
+        flight = self._inflight.get(key) if key else None
+        if flight is None:
+            flight = _Flight()
+            flight.future = asyncio.ensure_future(self._start(flight, fn, args, kw))
+            if key:
+                self._inflight[key] = flight
+                flight.future.add_done_callback(
+                    lambda _f: self._inflight.pop(key)
+                    if self._inflight.get(key) is flight else None)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.future)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.future.done():
+                self._abort(key, flight)
+            raise
+        finally:
+            flight.waiters -= 1
+
+    async def close(self):
+        for flight in list(self._inflight.values()):
+            self._abort(None, flight)
+        self._inflight.clear()
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._pool.shutdown(wait=True, cancel_futures=True))
+        with self._conns_lock:
+            for con in self._conns:
+                con.close()
+            self._conns.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # -- queries (same signatures as lib_catalog, minus db_path) ---------------------
+
+    async def get_book(self, book_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(lib_catalog.get_book, book_id)
+
+    async def find_by_isbn(self, isbns, *, clusters: bool = True) -> List[Dict[str, Any]]:
+        if not isinstance(isbns, str):
+            isbns = list(isbns)
+        return await self._run(lib_catalog.find_by_isbn, isbns, clusters=clusters)
+
+    async def filter_books(self, **filters) -> List[Dict[str, Any]]:
+        return await self._run(lib_catalog.filter_books, **filters)
+
+    async def search_text(self, query: str, limit: int = 25, **kw) -> List[Dict[str, Any]]:
+        return await self._run(lib_catalog.search_text, query, limit, **kw)
+
+    async def similar_books(self, book_id: str, k: int = 10) -> List[Dict[str, Any]]:
+        return await self._run(lib_catalog.similar_books, book_id, k)
+
+    async def changes_since(self, cursor: int = 0, limit: int = 1000, **kw) -> List[Dict[str, Any]]:
+        return await self._run(lib_catalog.changes_since, cursor, limit, **kw)
@@ -0,0 +1,250 @@
+# lib/columnar.py
+"""
+Columnar catalog snapshots (written by library-data-snapshot) and aggregations over them.
+
+A snapshot is a directory:
+    meta.json            rows, source DB, build time, and per column its kind and dtype
+    <col>.bin            raw little-endian values, memory-mapped on read
+    <col>.offsets.bin    multi-valued columns: int64 row offsets into <col>.bin (rows + 1)
+    <col>.dict.json      dictionary-encoded columns: code -> string
+
+Column kinds: "int" (int32, INT_NULL = missing), "dict" (int32 codes, -1 = missing),
+"multi" (dict codes per row, CSR layout) and "bytes" (fixed-width ids). Aggregations
+walk columns in CHUNK-row slices, so memory stays bounded whatever the catalog size.
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+INT_NULL = np.iinfo(np.int32).min
+CHUNK = 1 << 20
+AGGS = ("count", "sum", "mean", "min", "max")
+
+
+class SnapshotWriter:
+    """Append row batches column by column; close() publishes the directory atomically."""
+
+    def __init__(self, path: str | Path, schema: Dict[str, str], *, source: str = "",
+                 id_width: int = 16):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(f".{self.path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp.mkdir(parents=True)
+        self.schema = schema
+        self.rows = 0
+        self.source = source
+        self.id_width = id_width
+        self.files = {name: open(self.tmp / f"{name}.bin", "wb") for name in schema}
+        self.offset_files, self.dicts, self.nvalues = {}, {}, {}
+        for name, kind in schema.items():
+            if kind in ("dict", "multi"):
+                self.dicts[name] = {}
+            if kind == "multi":
+                self.offset_files[name] = open(self.tmp / f"{name}.offsets.bin", "wb")
+                self.offset_files[name].write(np.zeros(1, dtype="<i8").tobytes())
+                self.nvalues[name] = 0
+
+    def _codes(self, name: str, values: Iterable[Optional[str]]) -> np.ndarray:
+        d = self.dicts[name]
+        return np.fromiter((-1 if v is None else d.setdefault(v, len(d)) for v in values),
+                           dtype="<i4")
+
+    def append(self, batch: Dict[str, Sequence[Any]]):
+        """batch: column -> one value per row (ints/None, strings/None, or lists of strings)."""
+        n = len(next(iter(batch.values())))
+        for name, kind in self.schema.items():
+            vals = batch[name]
+            if kind == "int":
+                arr = np.fromiter((INT_NULL if v is None else v for v in vals), dtype="<i4",
+                                  count=n)
+            elif kind == "bytes":
+                arr = np.array([v.encode("utf-8") for v in vals], dtype=f"S{self.id_width}")
+            elif kind == "dict":
+                arr = self._codes(name, vals)
+            else:  # multi
+                lens = np.fromiter((len(v) for v in vals), dtype="<i8", count=n)
+                arr = self._codes(name, (x for v in vals for x in v))
+                offs = self.nvalues[name] + np.cumsum(lens)
+                self.offset_files[name].write(offs.astype("<i8").tobytes())
+                self.nvalues[name] += int(lens.sum())
+            self.files[name].write(arr.tobytes())
+        self.rows += n
+
+    def close(self):
+        for f in list(self.files.values()) + list(self.offset_files.values()):
+            f.close()
+        columns = {}
+        for name, kind in self.schema.items():
+            dtype = f"|S{self.id_width}" if kind == "bytes" else "<i4"
+            columns[name] = {"kind": kind, "dtype": dtype}
+            if name in self.dicts:
+                values = sorted(self.dicts[name], key=self.dicts[name].get)
+                (self.tmp / f"{name}.dict.json").write_text(
+                    json.dumps(values, ensure_ascii=False), encoding="utf-8")
+        meta = {"version": 1, "rows": self.rows, "source": self.source, "built_at": time.time(),
+                "columns": columns}
+        (self.tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        # swap in the new directory; readers holding the old files' mappings keep working
+        old = self.path.with_name(f".{self.path.name}.old-{os.getpid()}")
+        if self.path.exists():
+            self.path.rename(old)
+        self.tmp.rename(self.path)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot directory."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+        self.rows = self.meta["rows"]
+        self._maps: Dict[str, np.ndarray] = {}
+        self._dicts: Dict[str, List[str]] = {}
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self) -> Dict[str, str]:
+        return {name: c["kind"] for name, c in self.meta["columns"].items()}
+
+    def kind(self, name: str) -> str:
+        try:
+            return self.meta["columns"][name]["kind"]
+        except KeyError:
+            have = ", ".join(self.meta["columns"])
+            raise KeyError(f"no column {name!r} in snapshot (have: {have})") from None
+
+    def _map(self, fname: str, dtype: str) -> np.ndarray:
+        if fname not in self._maps:
+            p = self.path / fname
+            if p.stat().st_size:
+                self._maps[fname] = np.memmap(p, dtype=dtype, mode="r")
+            else:
+                self._maps[fname] = np.empty(0, dtype=dtype)  # mmap can't map an empty file
+        return self._maps[fname]
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw values (ints, dict codes, or for multi columns the flat code array)."""
+        self.kind(name)
+        return self._map(f"{name}.bin", self.meta["columns"][name]["dtype"])
+
+    def offsets(self, name: str) -> np.ndarray:
+        return self._map(f"{name}.offsets.bin", "<i8")
+
+    def dictionary(self, name: str) -> List[str]:
+        if name not in self._dicts:
+            p = self.path / f"{name}.dict.json"
+            self._dicts[name] = json.loads(p.read_text(encoding="utf-8"))
+        return self._dicts[name]
+
+    # -- aggregation ------------------------------------------------------------------
+
+    def _chunks(self):
+        return [(a, min(a + CHUNK, self.rows)) for a in range(0, self.rows, CHUNK)]
+
+    def _groups(self, key: str):
+        """
+        (names, chunks): group names, and an iterator of (rows, labels) per chunk - row
+        indices and their label into names (a multi-valued row appears once per value).
+        """
+        kind = self.kind(key)
+        col = self.column(key)
+        if kind == "int":
+            parts = [np.unique(col[a:b]) for a, b in self._chunks()]
+            uniq = np.unique(np.concatenate(parts or [[]]))
+            uniq = uniq[uniq != INT_NULL].astype(np.int32)
+            names = uniq.tolist()
+        elif kind in ("dict", "multi"):
+            names = self.dictionary(key)
+        else:
+            raise ValueError(f"cannot group by {kind} column {key!r}")
+
+        def chunks():
+            for a, b in self._chunks():
+                if kind == "multi":
+                    offs = np.asarray(self.offsets(key)[a:b + 1])
+                    rows = np.repeat(np.arange(a, b), np.diff(offs))
+                    yield rows, np.asarray(col[offs[0]:offs[-1]])
+                    continue
+                labels = np.asarray(col[a:b])
+                keep = np.flatnonzero(labels != (INT_NULL if kind == "int" else -1))
+                labels = labels[keep]
+                yield keep + a, np.searchsorted(uniq, labels) if kind == "int" else labels
+
+        return names, chunks()
+
+    def count_by(self, key: str, *, top: Optional[int] = None) -> List[tuple[Any, int]]:
+        """Books per value of key, most common first."""
+        names, chunks = self._groups(key)
+        n = np.zeros(len(names), dtype=np.int64)
+        for _rows, labels in chunks:
+            n += np.bincount(labels, minlength=len(names))
+        order = np.argsort(-n, kind="stable")[:np.count_nonzero(n)]
+        return [(names[i], int(n[i])) for i in order[:top or None]]
+
+    def group_by(self, key: str, value: str, agg: str | Sequence[str] = "mean",
+                 *, top: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Aggregate an int column per value of key, skipping rows where it is missing:
+        [{"key": ..., "count": n, "<agg>": ...}, ...], largest count first.
+        """
+        aggs = [agg] if isinstance(agg, str) else list(agg)
+        for a in aggs:
+            if a not in AGGS:
+                raise ValueError(f"unknown agg {a!r} (one of {', '.join(AGGS)})")
+        if self.kind(value) != "int":
+            raise ValueError(f"value column {value!r} must be an int column")
+        vcol = self.column(value)
+        names, chunks = self._groups(key)
+        g = len(names)
+        n, total = np.zeros(g, dtype=np.int64), np.zeros(g)
+        lo, hi = np.full(g, np.inf), np.full(g, -np.inf)
+        for rows, labels in chunks:
+            v = np.asarray(vcol[rows])
+            keep = v != INT_NULL
+            labels, v = labels[keep], v[keep].astype(np.float64)
+            n += np.bincount(labels, minlength=g)
+            total += np.bincount(labels, weights=v, minlength=g)
+            if "min" in aggs:
+                np.minimum.at(lo, labels, v)
+            if "max" in aggs:
+                np.maximum.at(hi, labels, v)
+        stats = {"sum": total, "min": lo, "max": hi}
+        out = []
+        for i in np.argsort(-n, kind="stable")[:np.count_nonzero(n)][:top or None]:
+            row = {"key": names[i], "count": int(n[i])}
+            for a in aggs:
+                if a == "mean":
+                    row[a] = float(total[i] / n[i])
+                elif a != "count":
+                    row[a] = float(stats[a][i])
+            out.append(row)
+        return out
+
+    def histogram(self, name: str, bins: int | Sequence[float] = 10,
+                  range: Optional[tuple[float, float]] = None) -> tuple[np.ndarray, np.ndarray]:
+        """np.histogram over an int column's non-missing values: (counts, edges)."""
+        if self.kind(name) != "int":
+            raise ValueError(f"histogram needs an int column, not {name!r}")
+        col = self.column(name)
+        if np.ndim(bins) == 0 and range is None:
+            lo, hi = np.inf, -np.inf
+            for a, b in self._chunks():
+                v = col[a:b]
+                v = v[v != INT_NULL]
+                if v.size:
+                    lo, hi = min(lo, int(v.min())), max(hi, int(v.max()))
+            range = (lo, hi) if lo <= hi else (0, 1)
+        edges = np.histogram_bin_edges([], bins=bins, range=range)
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        for a, b in self._chunks():
+            v = col[a:b]
+            counts += np.histogram(v[v != INT_NULL], bins=edges)[0]
+        return counts, edges
@@ -0,0 +1,105 @@
+# lib/isbn_batch.py
+"""
+Batch ISBN normalization/validation.
+
+Candidate strings (isbn/originalisbn/asin/ean/upc values from LT records) are cleaned
+once, packed into a fixed-width (n, 13) digit array and checksummed with NumPy in a
+single pass. Only valid ISBN-10s (converted to 13) and valid 978/979 ISBN-13s survive,
+so junk EAN/UPC values never reach OpenLibrary.
+"""
+import re
+from typing import Sequence
+
+import numpy as np
+
+CANDIDATE_KEYS = ("originalisbn", "asin", "ean", "upc")
+RE_NON_ISBN = re.compile(r"[^0-9Xx]")
+WIDTH = 13
+X = 10  # value of an 'X' check digit
+
+_W10 = np.arange(10, 0, -1, dtype=np.int32)            # ISBN-10 weights 10..1
+_W13 = np.array([1, 3] * 6 + [1], dtype=np.int32)      # EAN-13 weights 1,3,1,3,...
+_PREFIX_978 = np.array([9, 7, 8], dtype=np.int8)
+
+
+def candidate_strings(rec: dict) -> list[str]:
+    """Raw ISBN-ish strings from a LibraryThing record, in preference order."""
+    cand = []
+    isbn_obj = rec.get("isbn")
+    if isinstance(isbn_obj, dict):
+        cand += [v for v in isbn_obj.values() if isinstance(v, str)]
+    elif isinstance(isbn_obj, list):
+        cand += [v for v in isbn_obj if isinstance(v, str)]
+    elif isinstance(isbn_obj, str):
+        cand.append(isbn_obj)
+    for k in CANDIDATE_KEYS:
+        v = rec.get(k)
+        if isinstance(v, str):
+            cand.append(v)
+        elif isinstance(v, list):
+            cand += [x for x in v if isinstance(x, str)]
+    return cand
+
+
+def normalize_isbns(values: Sequence[str]) -> list[str | None]:
+    """
+    Normalize many candidate strings at once. Returns one entry per input: the
+    ISBN-13 for valid ISBN-10/ISBN-13 values, else None.
+    """
+    n = len(values)
+    if not n:
+        return []
+    cleaned = [RE_NON_ISBN.sub("", v).upper() if isinstance(v, str) else "" for v in values]
+    lens = np.fromiter((len(c) for c in cleaned), dtype=np.int32, count=n)
+    packed = "".join(c[:WIDTH].ljust(WIDTH, "0") for c in cleaned).encode("ascii")
+    raw = np.frombuffer(packed, dtype=np.uint8).reshape(n, WIDTH)
+
+    is_x = raw == ord("X")
+    d = raw.astype(np.int32) - ord("0")
+    d[is_x] = X
+
+    # ISBN-10: X only allowed as the check digit; weighted sum divisible by 11
+    is10 = (lens == 10) & ~is_x[:, :9].any(axis=1)
+    is10 &= (d[:, :10] * _W10).sum(axis=1) % 11 == 0
+    # ISBN-13: digits only, Bookland prefix, EAN checksum
+    is13 = (lens == 13) & ~is_x.any(axis=1)
+    is13 &= (d[:, 0] == 9) & (d[:, 1] == 7) & ((d[:, 2] == 8) | (d[:, 2] == 9))
+    is13 &= (d * _W13).sum(axis=1) % 10 == 0
+
+    # 10 -> 13: "978" + first nine digits + recomputed EAN check digit
+    out = d.astype(np.int8)
+    rows10 = np.flatnonzero(is10)
+    if rows10.size:
+        body = np.empty((rows10.size, WIDTH), dtype=np.int8)
+        body[:, :3] = _PREFIX_978
+        body[:, 3:12] = d[rows10, :9]
+        body[:, 12] = 0
+        body[:, 12] = (10 - (body.astype(np.int32) * _W13).sum(axis=1) % 10) % 10
+        out[rows10] = body
+
+    ok = is10 | is13
+    text = (out.clip(0, 9).astype(np.uint8) + ord("0")).tobytes().decode("ascii")
+    return [text[i * WIDTH:(i + 1) * WIDTH] if ok[i] else None for i in range(n)]
+
+
+def collect_isbns13_batch(records: Sequence[dict]) -> list[list[str]]:
+    """Per record: ordered, de-duplicated valid ISBN-13s. One normalize pass for all records."""
+    owners, flat = [], []
+    for i, rec in enumerate(records):
+        cands = candidate_strings(rec)
+        owners += [i] * len(cands)
+        flat += cands
+    out: list[list[str]] = [[] for _ in records]
+    for i, isbn in zip(owners, normalize_isbns(flat)):
+        if isbn and isbn not in out[i]:
+            out[i].append(isbn)
+    return out
+
+
+def collect_isbns13(rec: dict) -> list[str]:
+    """Single-record convenience wrapper."""
+    return collect_isbns13_batch([rec])[0]
+
+
+def normalize_isbn(value: str) -> str | None:
+    return normalize_isbns([value])[0]
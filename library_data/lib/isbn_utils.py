@@ -1,43 +1,159 @@
-import time, xml.etree.ElementTree as ET, requests
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+
 from library_data.scripts import settings
 
-UA = settings.UA
 
-def _get(url, **kw):
+class HostUnavailable(Exception):
+    """
+    A host is throttling or failing: retries are exhausted or its circuit is open.
+    retry_at is the wall-clock time (epoch seconds) before which it's pointless to retry.
+    """
+    def __init__(self, host: str, retry_at: float, reason: str):
+        when = time.strftime('%H:%M:%S', time.localtime(retry_at))
+        super().__init__(f"{host} unavailable ({reason}); retry after {when}")
+        self.host = host
+        self.retry_at = retry_at
+        self.reason = reason
+
+class _HostState:
+    __slots__ = ("failures", "next_at", "open_until", "last_error")
+
+    def __init__(self):
+        self.failures = 0
+        self.next_at = 0.0      # monotonic: earliest time for the next request
+        self.open_until = 0.0   # monotonic: circuit open (no requests) until then
+        self.last_error = ""
+
+def _retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostScheduler:
+    """
+    Shared per-host request gate. 429/5xx and connection errors are retried with
+    exponential backoff and full jitter (or the server's Retry-After); after
+    `failure_threshold` consecutive failures the host's circuit opens for `cooldown`
+    seconds and requests fail fast with HostUnavailable instead of hitting it.
+    """
+    def __init__(self, *, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 60.0,
+                 failure_threshold: int = 5, cooldown: float = 300.0,
+                 min_interval: dict[str, float] | None = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.min_interval = min_interval or {}
+        self._hosts: dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        with self._lock:
+            return self._hosts.setdefault(host, _HostState())
+
+    def _unavailable(self, host: str, st: _HostState, until: float) -> HostUnavailable:
+        retry_at = time.time() + max(0.0, until - time.monotonic())
+        return HostUnavailable(host, retry_at, st.last_error or "backing off")
+
+    def _failed(self, st: _HostState, error: str, retry_after: float | None):
+        now = time.monotonic()
+        with self._lock:
+            st.failures += 1
+            st.last_error = error
+            if retry_after is not None:
+                delay = min(retry_after, self.cooldown)
+            else:
+                backoff = self.base_delay * 2 ** (st.failures - 1)
+                delay = random.uniform(0, min(self.max_delay, backoff))
+            st.next_at = max(st.next_at, now + delay)
+            if st.failures >= self.failure_threshold:
+                st.open_until = now + max(self.cooldown, retry_after or 0.0)
+
+    def _succeeded(self, host: str, st: _HostState):
+        with self._lock:
+            st.failures = 0
+            st.last_error = ""
+            st.next_at = time.monotonic() + self.min_interval.get(host, 0.0)
+
+    def request(self, url: str, *, session=None, method: str = "GET", **kw) -> requests.Response:
+        host = urlsplit(url).hostname or ""
+        st = self._state(host)
+        for _attempt in range(self.max_retries + 1):
+            now = time.monotonic()
+            if st.open_until > now:
+                raise self._unavailable(host, st, st.open_until)
+            wait = st.next_at - now
+            if wait > self.max_delay:
+                raise self._unavailable(host, st, st.next_at)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                r = (session or requests).request(method, url, **kw)
+            except requests.RequestException as e:
+                self._failed(st, type(e).__name__, None)
+                continue
+            if r.status_code == 429 or r.status_code >= 500:
+                retry_after = _retry_after(r.headers.get("Retry-After"))
+                self._failed(st, f"HTTP {r.status_code}", retry_after)
+                continue
+            self._succeeded(host, st)
+            return r
+        raise self._unavailable(host, st, max(st.next_at, st.open_until))
+
+# one scheduler per process, shared by every LT/OpenLibrary call
+SCHEDULER = HostScheduler(min_interval={"www.librarything.com": 0.25})
+
+def http_get(url, *, session=None, **kw):
+    """GET through SCHEDULER. Raises HostUnavailable when the host is throttling/down."""
     headers = kw.pop("headers", {})
-    headers.setdefault("User-Agent", UA)
-    return requests.get(url, headers=headers, timeout=kw.pop("timeout", 15), **kw)
+    if session is None:
+        headers.setdefault("User-Agent", settings.UA)
+    return SCHEDULER.request(url, session=session, headers=headers,
+                             timeout=kw.pop("timeout", 15), **kw)
 
 def thingisbn_cluster(token: str, isbn: str, *, sleep: float = 0.25) -> list[str]:
     """
-    LT thingISBN. If 403/401/5xx, return [] (non-fatal).
+    LT thingISBN. 404 or 401/403 (bad/unauthorized token) return [].
+    Throttling/5xx are retried by SCHEDULER and raise HostUnavailable when the host
+    stays down, so callers can defer instead of treating the book as cluster-less.
     Tries http:// then https:// (LT docs showed http historically).
     """
     if not token:
         return []
     for scheme in ("http", "https"):
+        url = f"{scheme}://www.librarything.com/api/{token}/thingISBN/{isbn}"
+        r = http_get(url)
+        if r.status_code in (401, 403, 404):
+            return []
+        if not r.ok:
+            continue
         try:
-            url = f"{scheme}://www.librarything.com/api/{token}/thingISBN/{isbn}"
-            r = _get(url)
-            if r.status_code == 404:
-                return []
-            if r.status_code in (401, 403, 429, 500, 502, 503):
-                return []  # treat as unavailable
-            r.raise_for_status()
-            try:
-                root = ET.fromstring(r.text)
-            except ET.ParseError:
-                return []
-            out = []
-            for el in root.findall(".//isbn"):
-                t = (el.text or "").strip()
-                if t:
-                    out.append(t)
-            if sleep:
-                time.sleep(sleep)
-            return out
-        except requests.RequestException:
+            root = ET.fromstring(r.text)
+        except ET.ParseError:
             return []
+        out = []
+        for el in root.findall(".//isbn"):
+            t = (el.text or "").strip()
+            if t:
+                out.append(t)
+        if sleep:
+            time.sleep(sleep)
+        return out
     return []
 
 def explode_isbns_with_lt(token: str | None, base_isbns) -> list[str]:
@@ -53,15 +169,16 @@ def explode_isbns_with_lt(token: str | None, base_isbns) -> list[str]:
     return out
 
 def probe_openlibrary_isbns(isbns13) -> list[str]:
+    """
+    ISBNs that exist on OpenLibrary. Raises HostUnavailable rather than guessing during
+    outages.
+    """
     ok, s = [], requests.Session()
-    s.headers["User-Agent"] = UA
+    s.headers["User-Agent"] = settings.UA
     for i, isbn in enumerate(isbns13):
-        try:
-            r = s.get(f"https://openlibrary.org/isbn/{isbn}.json", timeout=12)
-            if r.ok:
-                ok.append(isbn)
-        except requests.RequestException:
-            pass
+        r = http_get(f"https://openlibrary.org/isbn/{isbn}.json", session=s, timeout=12)
+        if r.ok:
+            ok.append(isbn)
         if (i % 5) == 4:
             time.sleep(0.2)
     return ok
@@ -71,12 +188,12 @@ def expand_via_openlibrary(isbn13: str) -> list[str]:
     OpenLibrary-only expansion: hit search.json with the ISBN,
     then collect sibling edition ISBNs from the same work.
     """
+    r = http_get(f"https://openlibrary.org/search.json?isbn={isbn13}")
+    if not r.ok:
+        return []
     try:
-        r = _get(f"https://openlibrary.org/search.json?isbn={isbn13}")
-        if not r.ok:
-            return []
         j = r.json()
-    except Exception:
+    except ValueError:
         return []
     out = set()
     for doc in j.get("docs", []):
@@ -85,3 +202,77 @@ def expand_via_openlibrary(isbn13: str) -> list[str]:
             if isinstance(e, str) and len(e) in (10, 13):
                 out.add(e)
     return list(out)
+
+OL_BATCH = 50  # ISBNs per /api/books or search.json request (keeps URLs well under limits)
+
+def _chunks(seq, n):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _ol_session(session=None):
+    if session is not None:
+        return session
+    s = requests.Session()
+    s.headers["User-Agent"] = settings.UA
+    return s
+
+def ol_editions_by_isbn(isbns, *, session=None, chunk: int = OL_BATCH,
+                        sleep: float = 0.2) -> dict[str, dict]:
+    """
+    Batch edition lookup via /api/books?bibkeys=ISBN:a,ISBN:b&jscmd=details.
+    Returns {isbn: edition record}; ISBNs missing from the result don't exist on OL,
+    so this doubles as the existence probe (HostUnavailable if OL is down, so an
+    outage never reads as "doesn't exist"). jscmd=details (rather than data) is used
+    because it carries the raw edition record: works key, subjects, description, notes.
+    """
+    s = _ol_session(session)
+    uniq = list(dict.fromkeys(x for x in isbns if x))
+    out: dict[str, dict] = {}
+    for i, part in enumerate(_chunks(uniq, chunk)):
+        if i and sleep:
+            time.sleep(sleep)
+        r = http_get("https://openlibrary.org/api/books", session=s,
+                 params={"bibkeys": ",".join(f"ISBN:{x}" for x in part),
+                         "jscmd": "details", "format": "json"},
+                 timeout=20)
+        if not r.ok:
+            continue
+        try:
+            j = r.json()
+        except ValueError:
+            continue
+        for key, val in j.items():
+            details = val.get("details") if isinstance(val, dict) else None
+            if key.startswith("ISBN:") and isinstance(details, dict):
+                out[key[5:]] = details
+    return out
+
+def ol_works_by_isbn(isbns, *, session=None, chunk: int = OL_BATCH,
+                     sleep: float = 0.2) -> dict[str, dict]:
+    """
+    Batch work lookup via search.json?q=isbn:a OR isbn:b. Returns {isbn: work doc}
+    with the work's key and aggregated subjects (search docs carry no description).
+    """
+    s = _ol_session(session)
+    uniq = list(dict.fromkeys(x for x in isbns if x))
+    out: dict[str, dict] = {}
+    for i, part in enumerate(_chunks(uniq, chunk)):
+        if i and sleep:
+            time.sleep(sleep)
+        r = http_get("https://openlibrary.org/search.json", session=s,
+                 params={"q": " OR ".join(f"isbn:{x}" for x in part), "fields": "key,subject,isbn",
+                         "limit": len(part)},
+                 timeout=20)
+        if not r.ok:
+            continue
+        try:
+            j = r.json()
+        except ValueError:
+            continue
+        wanted = set(part)
+        for doc in j.get("docs", []):
+            work = {"key": doc.get("key"), "subjects": doc.get("subject") or []}
+            for e in doc.get("isbn") or []:
+                if e in wanted:
+                    out.setdefault(e, work)
+    return out
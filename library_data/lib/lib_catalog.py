@@ -1,95 +1,336 @@
 # scripts/lib_catalog.py
-import json, sqlite3
+import base64
+import json
+import sqlite3
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Iterable
+from typing import Any, Dict, Iterable, List, Optional
+
 from library_data.config import DB_PATH as DB_DEFAULT
+from library_data.lib.sortkeys import date_key
+
+# book_levels_rtree stores unknown level dimensions as [LEVEL_MISSING, LEVEL_MISSING]
+LEVEL_MISSING = 2147483647
+LEVEL_DIMS = ("lexile", "grade", "age")
+
+Range = tuple[Optional[int], Optional[int]]
+# query functions take a DB path, or an open connection (with row_factory=sqlite3.Row)
+# that long-running callers such as the query daemon keep warm between calls
+DBLike = str | Path | sqlite3.Connection
 
-def _conn(db_path: str | Path) -> sqlite3.Connection:
+def _conn(db_path: DBLike) -> sqlite3.Connection:
+    if isinstance(db_path, sqlite3.Connection):
+        return db_path
     con = sqlite3.connect(str(db_path))
     con.row_factory = sqlite3.Row
     return con
 
-def get_book(db_path: str | Path = DB_DEFAULT, book_id: str = "") -> Optional[Dict[str, Any]]:
+def get_book(db_path: DBLike = DB_DEFAULT, book_id: str = "") -> Optional[Dict[str, Any]]:
     with _conn(db_path) as con:
         r = con.execute("SELECT raw_json FROM books WHERE id = ?", (book_id,)).fetchone()
         if not r:
             return None
         return json.loads(r["raw_json"])
 
+def _has_table(con: sqlite3.Connection, name: str) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+    ).fetchone() is not None
+
+def find_by_isbn(
+    db_path: DBLike = DB_DEFAULT,
+    isbns: str | Iterable[str] = (),
+    *,
+    clusters: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Resolve ISBN-10/13 strings (any formatting) to owned books via the normalized
+    book_isbns index. With clusters=True, ISBNs of other editions found through the
+    stored thingISBN clusters resolve too (match='cluster'); direct hits win.
+    """
+    from library_data.lib.isbn_batch import normalize_isbns  # numpy only on this path
+
+    if isinstance(isbns, str):
+        isbns = [isbns]
+    isbns = list(isbns)
+    wanted: dict[str, list[str]] = {}
+    for raw, norm in zip(isbns, normalize_isbns(isbns)):
+        if norm:
+            wanted.setdefault(norm, []).append(raw)
+    if not wanted:
+        return []
+
+    marks = ",".join("?" * len(wanted))
+    cols = "x.isbn13, b.id, b.title, b.primaryauthor"
+    q = [f"SELECT {cols}, 'direct' AS match FROM book_isbns x"
+         f" JOIN books b ON b.id = x.book_id WHERE x.isbn13 IN ({marks})"]
+    args: list[Any] = list(wanted)
+    with _conn(db_path) as con:
+        if clusters and _has_table(con, "book_isbn_clusters"):
+            q.append(f"UNION ALL SELECT {cols}, 'cluster' AS match FROM book_isbn_clusters x"
+                     f" JOIN books b ON b.id = x.book_id WHERE x.isbn13 IN ({marks})")
+            args += list(wanted)
+        rows = con.execute(" ".join(q), args).fetchall()
+
+    seen, out = set(), []
+    for r in sorted(rows, key=lambda r: r["match"] != "direct"):
+        if (r["isbn13"], r["id"]) in seen:
+            continue
+        seen.add((r["isbn13"], r["id"]))
+        for raw in wanted[r["isbn13"]]:
+            out.append({"isbn": raw, **dict(r)})
+    return out
+
+def _collapse_sql(inner: str, order: str) -> str:
+    # first row of each book_groups group in `order`, picked over the whole result before any
+    # cursor/LIMIT applies, so a group shows up on exactly one page
+    return ("SELECT * FROM (SELECT *,"
+            f" ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY {order}) AS group_rank"
+            f" FROM ({inner})) WHERE group_rank = 1")
+
 def _like_clause(field: str) -> str:
     # basic LIKE match for comma-joined fields
     return f"LOWER({field}) LIKE ?"
 
+def _level_clauses(con: sqlite3.Connection,
+                   ranges: Dict[str, Range]) -> tuple[str, list[str], list[Any]]:
+    """
+    Range-overlap predicates for the requested level dimensions: the book's [min, max]
+    must intersect the query's [lo, hi] (either end may be open). Uses the R*Tree when
+    enrichment has built it, else plain book_levels columns.
+    """
+    if _has_table(con, "book_levels_rtree"):
+        join = ("JOIN book_levels l ON l.book_id = b.id "
+                "JOIN book_levels_rtree r ON r.id = l.rowid")
+        lo_col, hi_col = "r.{}_lo", "r.{}_hi"
+    else:
+        join = "JOIN book_levels l ON l.book_id = b.id"
+        lo_col, hi_col = "COALESCE(l.{0}_min, l.{0}_max)", "COALESCE(l.{0}_max, l.{0}_min)"
+    where, args = [], []
+    for dim, (lo, hi) in ranges.items():
+        where.append(f"AND {lo_col.format(dim)} <= ? AND {hi_col.format(dim)} >= ?")
+        args += [hi if hi is not None else LEVEL_MISSING - 1,
+                 lo if lo is not None else -LEVEL_MISSING]
+    return join, where, args
+
+def encode_cursor(parts: list) -> str:
+    raw = json.dumps(parts, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, kind: str) -> list:
+    """Opaque page cursor -> its sort-key values; ValueError if it isn't a `kind` cursor."""
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+    if not isinstance(parts, list) or not parts or parts[0] != kind:
+        raise ValueError(f"cursor {cursor!r} is not from this kind of query")
+    return parts[1:]
+
+def _with_cursors(rows: List[Dict[str, Any]], kind: str, keys: tuple[str, ...],
+                  hidden: tuple[str, ...]) -> List[Dict[str, Any]]:
+    # each row carries the cursor that resumes right after it; the last row's is the next page
+    for r in rows:
+        r["cursor"] = encode_cursor([kind] + [r[k] for k in keys])
+        for k in hidden:
+            del r[k]
+    return rows
+
 def filter_books(
-    db_path: str | Path = DB_DEFAULT,
+    db_path: DBLike = DB_DEFAULT,
     *,
     tag: Optional[str] = None,
     genre: Optional[str] = None,
     collection: Optional[str] = None,
-    date_added_after: Optional[str] = None,  # YYYY-MM-DD
+    date_added_after: Optional[str] = None,  # any format ingest understands (sortkeys.date_key)
+    lexile: Optional[Range] = None,  # (lo, hi); either end may be None
+    grade: Optional[Range] = None,
+    age: Optional[Range] = None,
     limit: int = 50,
+    collapse: bool = False,
+    cursor: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
     Returns lightweight rows for display/ranking; fetch full via get_book().
+    Newest entry first, then title A-Z. Every row carries a "cursor"; pass the last
+    row's back as cursor= for the next page (keyset, so deep pages cost the same).
+    Level ranges match books whose [min, max] overlaps the given range; when any is
+    set, rows also carry the book's level columns.
+    collapse=True returns one row per duplicate/edition group (see scripts/dedup.py), at
+    the position of its first member; groups never repeat across pages.
     """
-    q = ["SELECT id, title, primaryauthor, entrydate, genres, subjects, collections FROM books WHERE 1=1"]
-    args: list[Any] = []
-
-    if tag:
-        q.append(f"AND {_like_clause('tags')}")
-        args.append(f"%{tag.lower()}%")
-    if genre:
-        q.append(f"AND {_like_clause('genres')}")
-        args.append(f"%{genre.lower()}%")
-    if collection:
-        q.append(f"AND {_like_clause('collections')}")
-        args.append(f"%{collection.lower()}%")
-    if date_added_after:
-        q.append("AND entrydate >= ?")
-        args.append(date_added_after)
-
-    q.append("ORDER BY entrydate DESC, title COLLATE NOCASE ASC")
-    q.append("LIMIT ?")
-    args.append(limit)
+    ranges = {dim: r for dim, r in zip(LEVEL_DIMS, (lexile, grade, age)) if r is not None}
+    cols = ("b.id, b.title, b.primaryauthor, b.entrydate, b.genres, b.subjects, b.collections,"
+            " b.entry_key, b.title_key")
+    if ranges:
+        cols += ", l.lexile_min, l.lexile_max, l.grade_min, l.grade_max, l.age_min, l.age_max"
 
     with _conn(db_path) as con:
-        rows = con.execute(" ".join(q), args).fetchall()
-        return [dict(r) for r in rows]
+        if ranges and not _has_table(con, "book_levels"):
+            return []  # not enriched yet: no book has levels to match
+        collapse = collapse and _has_table(con, "book_groups")
+        if collapse:
+            cols += ", COALESCE(g.group_id, b.id) AS group_id"
+        q = [f"SELECT {cols} FROM books b"]
+        args: list[Any] = []
+        level_where: list[str] = []
+        if ranges:
+            join, level_where, args = _level_clauses(con, ranges)
+            q.append(join)
+        if collapse:
+            q.append("LEFT JOIN book_groups g ON g.book_id = b.id")
+        q.append("WHERE 1=1")
+        q += level_where
+
+        if tag:
+            q.append(f"AND {_like_clause('b.tags')}")
+            args.append(f"%{tag.lower()}%")
+        if genre:
+            q.append(f"AND {_like_clause('b.genres')}")
+            args.append(f"%{genre.lower()}%")
+        if collection:
+            q.append(f"AND {_like_clause('b.collections')}")
+            args.append(f"%{collection.lower()}%")
+        if date_added_after:
+            q.append("AND b.entry_key >= ?")
+            args.append(date_key(date_added_after) or date_added_after)
+        if collapse:
+            # collapse the whole filtered set first, then page over the survivors
+            q = [_collapse_sql(" ".join(q), "entry_key DESC, title_key, id")]
+        p = "" if collapse else "b."
+        if cursor:
+            entry, title, bid = decode_cursor(cursor, "f")
+            # (entry_key DESC, title_key ASC, id ASC) strictly after the cursor row; the mixed
+            # directions rule out a row-value comparison, so the leading `<=` gives the index a seek
+            q.append(f"AND {p}entry_key <= ? AND ({p}entry_key < ? OR ({p}entry_key = ? AND "
+                     f"({p}title_key > ? OR ({p}title_key = ? AND {p}id > ?))))")
+            args += [entry, entry, entry, title, title, bid]
+
+        q.append(f"ORDER BY {p}entry_key DESC, {p}title_key ASC, {p}id ASC LIMIT ?")
+        args.append(limit)
+        rows = [dict(r) for r in con.execute(" ".join(q), args).fetchall()]
+        hidden = ("entry_key", "title_key") + (("group_rank",) if collapse else ())
+        return _with_cursors(rows, "f", ("entry_key", "title_key", "id"), hidden)
 
 def search_text(
-    db_path: str | Path = DB_DEFAULT,
+    db_path: DBLike = DB_DEFAULT,
     query: str = "",
-    limit: int = 25
+    limit: int = 25,
+    *,
+    collapse: bool = False,
+    cursor: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     """
-    FTS5 if available; else fallback to title LIKE.
+    FTS5 if available (best bm25 first); else fallback to title LIKE (title A-Z).
+    Rows carry a "cursor" for the next page, as in filter_books().
+    collapse=True keeps only the best-ranked row of each book_groups group, across pages.
     """
     with _conn(db_path) as con:
+        collapse = collapse and _has_table(con, "book_groups")
+        group_col = ", COALESCE(g.group_id, b.id) AS group_id" if collapse else ""
+        group_join = "LEFT JOIN book_groups g ON g.book_id = b.id" if collapse else ""
         # FTS5 path
-        has_fts = con.execute(
-            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='books_fts'"
-        ).fetchone() is not None
-
-        if has_fts:
-            q = """
-            SELECT b.id, b.title, b.primaryauthor, b.entrydate,
-                   bm25(books_fts, 1.0, 0.8, 0.3, 0.5, 0.5, 0.8) AS score
-            FROM books_fts
-            JOIN books b ON b.rowid = books_fts.rowid
-            WHERE books_fts MATCH ?
-            ORDER BY score
-            LIMIT ?
+        if _has_table(con, "books_fts"):
+            kind, keys, hidden = "s", ("score", "rid"), ("rid",)
+            src = f"""
+              SELECT b.id, b.title, b.primaryauthor, b.entrydate,
+                     bm25(books_fts, 1.0, 0.8, 0.3, 0.5, 0.5, 0.8) AS score,
+                     b.rowid AS rid{group_col}
+              FROM books_fts
+              JOIN books b ON b.rowid = books_fts.rowid
+              {group_join}
+              WHERE books_fts MATCH ?
+            """
+            args = [query]
+        else:
+            # fallback LIKE
+            kind, keys, hidden = "t", ("title_key", "id"), ("title_key",)
+            src = f"""
+              SELECT b.id, b.title, b.primaryauthor, b.entrydate, b.title_key{group_col}
+              FROM books b {group_join}
+              WHERE LOWER(b.title) LIKE ?
             """
-            rows = con.execute(q, (query, limit)).fetchall()
-            return [dict(r) for r in rows]
+            args = [f"%{query.lower()}%"]
+        order = ", ".join(keys)
+        if collapse:
+            src = _collapse_sql(src, order)
+            hidden += ("group_rank",)
+        after = ""
+        if cursor:
+            after = f"WHERE ({order}) > (?, ?)"
+            args += decode_cursor(cursor, kind)
+        q = f"SELECT * FROM ({src}) {after} ORDER BY {order} LIMIT ?"
+        rows = [dict(r) for r in con.execute(q, args + [limit]).fetchall()]
+        return _with_cursors(rows, kind, keys, hidden)
 
-        # fallback LIKE
+def similar_books(
+    db_path: DBLike = DB_DEFAULT,
+    book_id: str = "",
+    k: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    "More like this": the book's precomputed nearest neighbours by facet/subject
+    TF-IDF cosine (built by scripts/similar.py), best first. [] before the first build.
+    """
+    with _conn(db_path) as con:
+        if not _has_table(con, "book_similar"):
+            return []
         rows = con.execute(
-            "SELECT id, title, primaryauthor, entrydate FROM books WHERE LOWER(title) LIKE ? ORDER BY title LIMIT ?",
-            (f"%{query.lower()}%", limit),
+            """
+            SELECT b.id, b.title, b.primaryauthor, s.score
+            FROM book_similar s JOIN books b ON b.id = s.similar_id
+            WHERE s.book_id = ?
+            ORDER BY s.rank
+            LIMIT ?
+            """,
+            (book_id, k),
         ).fetchall()
         return [dict(r) for r in rows]
 
+def changes_since(
+    db_path: DBLike = DB_DEFAULT,
+    cursor: int = 0,
+    limit: int = 1000,
+    *,
+    include_data: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    Change-log entries after `cursor` (the last `seq` a consumer has applied; 0 = from
+    the start), oldest first: {"seq", "book_id", "op": upsert|delete|levels, "changed_at"}.
+    With include_data, upserts carry the book's current record ("book") and levels
+    entries its current book_levels row ("levels"), so consumers never re-read the table.
+    Page by passing the last seq back in.
+    """
+    with _conn(db_path) as con:
+        if not _has_table(con, "change_log"):
+            return []
+        rows = [dict(r) for r in con.execute(
+            "SELECT seq, book_id, op, changed_at FROM change_log"
+            " WHERE seq > ? ORDER BY seq LIMIT ?",
+            (cursor, limit),
+        )]
+        if not include_data or not rows:
+            return rows
+        want = list({r["book_id"] for r in rows if r["op"] != "delete"})
+        books: Dict[str, Any] = {}
+        levels: Dict[str, Any] = {}
+        for i in range(0, len(want), 500):
+            part = want[i:i + 500]
+            marks = ",".join("?" * len(part))
+            for r in con.execute(f"SELECT id, raw_json FROM books WHERE id IN ({marks})", part):
+                books[r["id"]] = json.loads(r["raw_json"])
+            if _has_table(con, "book_levels"):
+                for r in con.execute(
+                    "SELECT book_id, lexile_min, lexile_max, grade_min, grade_max, age_min,"
+                    " age_max, source, updated_at"
+                    f" FROM book_levels WHERE book_id IN ({marks})", part):
+                    levels[r["book_id"]] = dict(r)
+        for r in rows:
+            if r["op"] == "upsert":
+                r["book"] = books.get(r["book_id"])
+            elif r["op"] == "levels":
+                r["levels"] = levels.get(r["book_id"])
+        return rows
+
 def search_semantic(
     index_dir: str | Path,
     query: str,
@@ -110,8 +351,7 @@ def upsert_from_json(
     """
     Convenience: upsert from an in-memory JSON export.
     """
-    import tempfile
-from library_data.scripts.ingest import upsert_books  # reuse logic
+    from library_data.scripts.ingest import ensure_db, upsert_books  # lazy to avoid circulars
 
     if isinstance(json_obj, dict):
         items = json_obj.items()
@@ -119,7 +359,5 @@ from library_data.scripts.ingest import upsert_books  # reuse logic
         items = json_obj
 
     with _conn(db_path) as con:
-        # ensure schema
-        from library_data.scripts.ingest import ensure_db  # lazy to avoid circulars
         ensure_db(con)
         return upsert_books(con, items)
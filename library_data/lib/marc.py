@@ -0,0 +1,327 @@
+# lib/marc.py
+"""
+Streaming ISO 2709 (MARC 21) reader for LibraryThing MARC exports.
+
+Records are read one at a time from the file handle, so memory stays bounded by the
+largest single record (at most 99999 bytes per the leader). Each record is mapped
+onto the same dict shape as a LibraryThing JSON export entry, so ingest can reuse
+upsert_books() unchanged.
+"""
+import re
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+RECORD_TERMINATOR = b"\x1d"
+FIELD_TERMINATOR = b"\x1e"
+SUBFIELD_DELIMITER = b"\x1f"
+LEADER_LEN = 24
+DIR_ENTRY_LEN = 12
+MAX_RECORD_LEN = 99999  # leader/00-04
+
+RE_YEAR = re.compile(r"(?<!\d)(1[5-9]\d{2}|20\d{2})(?!\d)")
+RE_PAGES = re.compile(r"(\d+)\s*(?:p\b|pages?\b|S\.)", re.I)
+RE_FIRST_INT = re.compile(r"\d+")
+RE_ISBN = re.compile(r"[0-9Xx][0-9Xx\- ]{8,16}[0-9Xx]")
+TRAILING_PUNCT = " /:;,.="
+
+# MARC language codes -> the language names LibraryThing exports in "language"
+# (ingest stores the name, so MARC and JSON imports filter alike; unknown codes stay codes)
+LANGUAGE_NAMES = {
+    "afr": "Afrikaans", "alb": "Albanian", "ara": "Arabic", "arm": "Armenian",
+    "baq": "Basque", "ben": "Bengali", "bul": "Bulgarian", "cat": "Catalan",
+    "chi": "Chinese", "cze": "Czech", "dan": "Danish", "dut": "Dutch", "eng": "English",
+    "epo": "Esperanto", "est": "Estonian", "fao": "Faroese", "fin": "Finnish",
+    "fre": "French", "fry": "Frisian", "geo": "Georgian", "ger": "German",
+    "gla": "Scottish Gaelic", "gle": "Irish", "glg": "Galician", "grc": "Greek (Ancient)",
+    "gre": "Greek (Modern)", "guj": "Gujarati", "hat": "Haitian French Creole",
+    "heb": "Hebrew", "hin": "Hindi", "hrv": "Croatian", "hun": "Hungarian",
+    "ice": "Icelandic", "ind": "Indonesian", "ita": "Italian", "jpn": "Japanese",
+    "kor": "Korean", "lat": "Latin", "lav": "Latvian", "lit": "Lithuanian",
+    "mac": "Macedonian", "may": "Malay", "mul": "Multiple languages", "nor": "Norwegian",
+    "per": "Persian", "pol": "Polish", "por": "Portuguese", "rum": "Romanian",
+    "rus": "Russian", "san": "Sanskrit", "scc": "Serbian", "scr": "Croatian",
+    "slo": "Slovak", "slv": "Slovenian", "spa": "Spanish", "srp": "Serbian",
+    "swa": "Swahili", "swe": "Swedish", "tam": "Tamil", "tha": "Thai", "tur": "Turkish",
+    "ukr": "Ukrainian", "urd": "Urdu", "vie": "Vietnamese", "wel": "Welsh",
+    "yid": "Yiddish", "zxx": "No linguistic content",
+}
+
+
+class MarcRecord:
+    """Parsed record: leader plus an ordered list of (tag, value) fields.
+
+    Control fields (00X) carry a str value; data fields carry
+    (indicators, [(code, value), ...]).
+    """
+    __slots__ = ("leader", "fields")
+
+    def __init__(self, leader: str, fields: list):
+        self.leader = leader
+        self.fields = fields
+
+    def control(self, tag: str) -> str | None:
+        for t, v in self.fields:
+            if t == tag and isinstance(v, str):
+                return v
+        return None
+
+    def datafields(self, *tags: str) -> Iterator[tuple[str, str, list[tuple[str, str]]]]:
+        for t, v in self.fields:
+            if t in tags and not isinstance(v, str):
+                yield t, v[0], v[1]
+
+    def subfields(self, tag: str, codes: str) -> list[str]:
+        out = []
+        for _t, _ind, subs in self.datafields(tag):
+            out += [val for code, val in subs if code in codes]
+        return out
+
+    def first(self, tag: str, codes: str) -> str | None:
+        vals = self.subfields(tag, codes)
+        return vals[0] if vals else None
+
+
+def _decode(b: bytes, utf8: bool) -> str:
+    # leader/09 == 'a' means UCS/Unicode; otherwise MARC-8, which we approximate as latin-1
+    if utf8:
+        return b.decode("utf-8", errors="replace")
+    try:
+        return b.decode("utf-8")
+    except UnicodeDecodeError:
+        return b.decode("latin-1")
+
+
+def parse_record(raw: bytes) -> MarcRecord | None:
+    """Parse one raw record (including its terminator). Returns None if malformed."""
+    if len(raw) < LEADER_LEN + 1:
+        return None
+    leader = raw[:LEADER_LEN].decode("ascii", errors="replace")
+    try:
+        base = int(leader[12:17])
+    except ValueError:
+        return None
+    if base <= LEADER_LEN or base > len(raw):
+        return None
+    utf8 = leader[9] == "a"
+
+    directory = raw[LEADER_LEN:base - 1]  # drop the field terminator ending the directory
+    fields = []
+    for i in range(0, len(directory) - DIR_ENTRY_LEN + 1, DIR_ENTRY_LEN):
+        entry = directory[i:i + DIR_ENTRY_LEN]
+        tag = entry[:3].decode("ascii", errors="replace")
+        try:
+            length = int(entry[3:7])
+            start = int(entry[7:12])
+        except ValueError:
+            continue
+        body = raw[base + start:base + start + length].rstrip(FIELD_TERMINATOR)
+        if tag < "010" and tag.isdigit():
+            fields.append((tag, _decode(body, utf8)))
+            continue
+        parts = body.split(SUBFIELD_DELIMITER)
+        ind = _decode(parts[0], utf8)
+        subs = []
+        for p in parts[1:]:
+            if not p:
+                continue
+            subs.append((chr(p[0]), _decode(p[1:], utf8).strip()))
+        fields.append((tag, (ind, subs)))
+    return MarcRecord(leader, fields)
+
+
+def iter_raw_records(
+    fh: BinaryIO, chunk_size: int = 1 << 16, max_len: int = MAX_RECORD_LEN,
+) -> Iterator[bytes]:
+    """
+    Yield raw records split on the record terminator. Reads in fixed-size chunks, so
+    a truncated or miscounted leader length can't derail the rest of the stream. More
+    than max_len bytes without a terminator can't be a record (the leader length has
+    five digits): they are dropped and reading resumes after the next terminator, so
+    the buffer stays under max_len + chunk_size on a corrupt file.
+    """
+    buf = b""
+    skipping = False
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        start = 0
+        if skipping:
+            end = buf.find(RECORD_TERMINATOR)
+            if end < 0:
+                buf = b""
+                continue
+            start, skipping = end + 1, False
+        while True:
+            end = buf.find(RECORD_TERMINATOR, start)
+            if end < 0:
+                break
+            rec = buf[start:end + 1].lstrip(b"\r\n ")
+            if len(rec) > 1:
+                yield rec
+            start = end + 1
+        buf = buf[start:]
+        if len(buf) > max_len:
+            buf, skipping = b"", True
+    tail = buf.strip()
+    if tail and not skipping:
+        yield tail + RECORD_TERMINATOR
+
+
+def _clean(s: str | None, punct: str = TRAILING_PUNCT) -> str | None:
+    if not s:
+        return None
+    s = s.strip().rstrip(punct).strip()
+    return s or None
+
+
+def _fl_from_lf(lf: str) -> str:
+    # "Rowling, J. K." -> "J. K. Rowling"
+    if "," in lf:
+        last, first = lf.split(",", 1)
+        first = first.strip()
+        if first:
+            return f"{first} {last.strip()}"
+    return lf
+
+
+def _entrydate(f008: str | None) -> str | None:
+    # 008/00-05 is "date entered on file" as yymmdd
+    if not f008 or len(f008) < 6 or not f008[:6].isdigit():
+        return None
+    yy, mm, dd = int(f008[:2]), f008[2:4], f008[4:6]
+    year = 2000 + yy if yy < 70 else 1900 + yy
+    return f"{year}-{mm}-{dd}"
+
+
+def record_to_lt(rec: MarcRecord) -> tuple[str, dict] | None:
+    """
+    Map a MARC record onto the LibraryThing JSON export shape used by ingest:
+    books_id, title, primaryauthor, authors, date, publication, pages, language,
+    language_codeA,
+    isbn, ean, upc, subject, ddc, lcc, summary, tags, entrydate.
+    """
+    bid = _clean(rec.control("001")) or _clean(rec.first("035", "a"))
+    if not bid:
+        return None
+
+    out: dict = {"books_id": bid}
+
+    title_parts = [_clean(x) for x in rec.subfields("245", "abnp")]
+    title = " : ".join(p for p in title_parts if p)
+    if title:
+        out["title"] = title
+
+    authors = []
+    for tag in ("100", "110", "700", "710"):
+        for _t, _ind, subs in rec.datafields(tag):
+            # keep the period after initials ("Rowling, J. K.")
+            name = _clean(next((v for c, v in subs if c == "a"), None), " ,/:;=")
+            if not name:
+                continue
+            a = {"lf": name, "fl": _fl_from_lf(name)}
+            role = _clean(next((v for c, v in subs if c == "e"), None))
+            if role:
+                a["role"] = role
+            authors.append(a)
+    if authors:
+        out["authors"] = authors
+        out["primaryauthor"] = authors[0]["lf"]
+
+    pub = rec.first("264", "b") or rec.first("260", "b")
+    date = rec.first("264", "c") or rec.first("260", "c")
+    if date:
+        m = RE_YEAR.search(date)
+        if m:
+            out["date"] = m.group(1)
+    pub_bits = [_clean(x) for x in (pub, date) if x]
+    if any(pub_bits):
+        out["publication"] = ", ".join(p for p in pub_bits if p)
+
+    extent = rec.first("300", "a")
+    if extent:
+        m = RE_PAGES.search(extent)
+        pages = m.group(1) if m else None
+        if pages is None:
+            m = RE_FIRST_INT.search(extent)
+            pages = m.group(0) if m else None
+        if pages:
+            out["pages"] = pages
+
+    f008 = rec.control("008")
+    langs = [x.strip().lower() for x in rec.subfields("041", "a") if x.strip()]
+    if not langs and f008 and len(f008) >= 38 and f008[35:38].strip():
+        langs = [f008[35:38].lower()]
+    if langs:
+        out["language"] = [LANGUAGE_NAMES.get(c, c) for c in langs]
+        out["language_codeA"] = langs
+
+    isbns = []
+    for v in rec.subfields("020", "a"):
+        m = RE_ISBN.search(v)
+        if m:
+            isbns.append(m.group(0).replace("-", "").replace(" ", ""))
+    if isbns:
+        out["isbn"] = {str(i): v for i, v in enumerate(isbns)}
+    ean, upc = [], []
+    for _t, ind, subs in rec.datafields("024"):
+        for code, v in subs:
+            if code != "a":
+                continue
+            d = "".join(ch for ch in v if ch.isdigit())
+            if len(d) == 13:
+                ean.append(d)
+            elif len(d) == 12:
+                upc.append(d)
+    if ean:
+        out["ean"] = ean
+    if upc:
+        out["upc"] = upc
+
+    subject = {}
+    for _t, _ind, subs in rec.datafields("600", "610", "611", "630", "650", "651"):
+        parts = [_clean(v) for c, v in subs if c in "abvxyz"]
+        parts = [p for p in parts if p]
+        if parts:
+            subject[str(len(subject))] = parts
+    if subject:
+        out["subject"] = subject
+
+    ddc = [x for x in rec.subfields("082", "a") if x]
+    if ddc:
+        out["ddc"] = {"code": ddc}
+    lcc = " ".join(x for x in rec.subfields("050", "ab") if x)
+    if lcc:
+        out["lcc"] = {"code": lcc}
+
+    summary = rec.first("520", "a")
+    if summary:
+        out["summary"] = summary
+    tags = [_clean(x) for x in rec.subfields("653", "a")]
+    tags = [t for t in tags if t]
+    if tags:
+        out["tags"] = tags
+
+    entry = _entrydate(f008)
+    if entry:
+        out["entrydate"] = entry
+    return bid, out
+
+
+def iter_marc_records(path: Path) -> Iterator[tuple[str, dict]]:
+    """Stream (books_id, record) pairs from an ISO 2709 file, skipping malformed records."""
+    with open(path, "rb") as fh:
+        for raw in iter_raw_records(fh):
+            rec = parse_record(raw)
+            if rec is None:
+                continue
+            mapped = record_to_lt(rec)
+            if mapped:
+                yield mapped
+
+
+def looks_like_marc(head: bytes) -> bool:
+    """Sniff: ISO 2709 starts with a 5-digit record length and a 24-byte leader."""
+    head = head.lstrip(b"\xef\xbb\xbf")
+    return len(head) >= LEADER_LEN and head[:5].isdigit() and head[12:17].isdigit()
@@ -0,0 +1,196 @@
+# lib/minhash.py
+"""
+MinHash signatures + LSH banding for near-duplicate / same-work detection.
+
+A book's feature set is character 4-gram shingles of its normalized title and author
+surname, plus ISBN tokens (own ISBN-13s and a thingISBN-cluster key). Tokens are
+hashed with crc32 (stable across processes, unlike hash()), then min-hashed with
+multiply-shift hashes: h_i(x) = (a_i * x + b_i) >> 32 over uint64, all books of a
+chunk at once.
+
+Candidate pairs come from LSH bands: books whose signatures agree on every row of
+some band share a bucket. Within a bucket only neighbours (after sorting by band key)
+are compared, so the work stays near-linear even for very large buckets; the pair
+must also agree on >= threshold of all signature rows (estimated Jaccard) and share
+an identity key (same author surname, or same ISBN/work), since title shingles alone
+can't tell "Selected Poems" by Frost from the one by Dickinson. A shared author alone
+needs >= AUTHOR_ONLY_THRESHOLD: volumes of one series ("The Lord of the Rings: The
+Return of the King" / "...: The Fellowship of the Ring") share most of their shingles.
+
+Grouping is greedy around representatives rather than plain union-find: strongest
+pairs first, and a group only absorbs another if every incoming member matches its
+representative, so chains of pairwise-similar books can't snowball into one group.
+"""
+import re
+import unicodedata
+import zlib
+from typing import Iterable, Sequence
+
+import numpy as np
+
+NUM_PERM = 128
+BANDS = 32          # 32 bands x 4 rows: candidate threshold ~ (1/32) ** (1/4) ~ 0.42
+SHINGLE = 4
+WORK_WEIGHT = 4     # copies of the cluster token, so a shared thingISBN cluster counts
+AUTHOR_ONLY_THRESHOLD = 0.8
+
+RE_PAREN = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+RE_NON_WORD = re.compile(r"[^0-9a-z]+")
+ARTICLES = ("the ", "a ", "an ")
+
+
+def _fold(s: str) -> str:
+    s = unicodedata.normalize("NFKD", s or "")
+    s = "".join(c for c in s if not unicodedata.combining(c)).lower()
+    return RE_NON_WORD.sub(" ", s).strip()
+
+
+def normalize_title(title: str | None) -> str:
+    """Lowercased, accent-folded title without bracketed series/edition notes or leading article."""
+    t = _fold(RE_PAREN.sub(" ", title or ""))
+    for art in ARTICLES:
+        if t.startswith(art):
+            t = t[len(art):]
+            break
+    return t
+
+
+def normalize_author(author: str | None) -> str:
+    """Surname only: LT primaryauthor is "Last, First"; otherwise the last word."""
+    a = author or ""
+    if "," in a:
+        return _fold(a.split(",", 1)[0])
+    parts = _fold(a).split()
+    return parts[-1] if parts else ""
+
+
+def _shingles(s: str, prefix: str) -> set[str]:
+    s = f" {s} "
+    if len(s) <= SHINGLE:
+        return {prefix + s} if s.strip() else set()
+    return {prefix + s[i:i + SHINGLE] for i in range(len(s) - SHINGLE + 1)}
+
+
+def book_tokens(title: str | None, author: str | None, isbns: Iterable[str] = (),
+                cluster: Iterable[str] = ()) -> set[str]:
+    toks = _shingles(normalize_title(title), "t:") | _shingles(normalize_author(author), "a:")
+    own = set(isbns)
+    toks |= {f"i:{x}" for x in own}
+    work = own | set(cluster)
+    if cluster:
+        # every edition in the same thingISBN cluster shares the cluster's smallest ISBN
+        key = min(work)
+        toks |= {f"w{j}:{key}" for j in range(WORK_WEIGHT)}
+    return toks
+
+
+def identity_keys(author: str | None, isbns: Iterable[str] = (),
+                  cluster: Iterable[str] = ()) -> tuple[int, int]:
+    """(author key, work key) for candidate_pairs' gate; 0 = unknown."""
+    surname = normalize_author(author)
+    work = set(isbns) | set(cluster)
+    author_key = (zlib.crc32(surname.encode("utf-8")) or 1) if surname else 0
+    work_key = (zlib.crc32(min(work).encode("utf-8")) or 1) if work else 0
+    return author_key, work_key
+
+
+def permutations(num_perm: int = NUM_PERM, seed: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def signatures(token_sets: Sequence[Iterable[str]],
+               perms: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    (n, num_perm) uint32 MinHash signatures. Empty sets get an all-0xFFFFFFFF row,
+    which callers should drop (it would match every other empty set).
+    """
+    a, b = perms
+    n = len(token_sets)
+    sig = np.full((n, a.size), 0xFFFFFFFF, dtype=np.uint32)
+    hashes, starts, rows = [], [], []
+    for i, toks in enumerate(token_sets):
+        h = [zlib.crc32(t.encode("utf-8")) for t in toks]
+        if h:
+            starts.append(len(hashes))
+            rows.append(i)
+            hashes += h
+    if not hashes:
+        return sig
+    x = np.asarray(hashes, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        # (num_perm, tokens): each book's tokens are contiguous along the fast axis
+        hv = ((a[:, None] * x + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+    sig[rows] = np.minimum.reduceat(hv, starts, axis=1).T
+    return sig
+
+
+def agreement(sig: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard per (i, j) pair: share of signature rows that agree."""
+    return (sig[pairs[:, 0]] == sig[pairs[:, 1]]).mean(axis=1)
+
+
+def candidate_pairs(sig: np.ndarray, bands: int = BANDS, threshold: float = 0.5,
+                    keys: np.ndarray | None = None,
+                    author_threshold: float = AUTHOR_ONLY_THRESHOLD) -> np.ndarray:
+    """
+    (m, 2) row-index pairs that share an LSH bucket and agree on >= threshold of the
+    signature. With keys ((n, 2) identity keys, 0 = unknown; see identity_keys) a pair
+    must also share a nonzero key: the work key, or the author key alone when the pair
+    agrees on >= author_threshold.
+    """
+    n, k = sig.shape
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    r = k // bands
+    # fold each band's r rows into one uint64 key (collisions only add candidates,
+    # which the agreement check below filters out)
+    mix = np.random.default_rng(0).integers(1, 1 << 63, size=r, dtype=np.uint64) | np.uint64(1)
+    found = []
+    for band in range(bands):
+        with np.errstate(over="ignore"):
+            rows = sig[:, band * r:(band + 1) * r].astype(np.uint64)
+            bkeys = (rows * mix).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(bkeys, kind="stable")
+        same = bkeys[order[1:]] == bkeys[order[:-1]]
+        if same.any():
+            found.append(np.stack([order[:-1][same], order[1:][same]], axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.unique(np.sort(np.concatenate(found), axis=1), axis=0)
+    est = agreement(sig, pairs)
+    ok = est >= threshold
+    if keys is not None:
+        a, b = keys[pairs[:, 0]], keys[pairs[:, 1]]
+        shared = (a == b) & (a != 0)
+        ok &= shared[:, 1] | (shared[:, 0] & (est >= author_threshold))
+    return pairs[ok]
+
+
+def group_pairs(n: int, pairs: np.ndarray, sig: np.ndarray, threshold: float = 0.5) -> np.ndarray:
+    """
+    Group label (the representative's row index) for each of n rows. Pairs are merged
+    strongest first, and only if every member of the smaller group agrees with the
+    larger group's representative on >= threshold of the signature; so every member
+    of a group is within threshold of its representative.
+    """
+    rep = list(range(n))
+    members: dict[int, list[int]] = {}
+    plist = pairs.tolist()
+    for p in np.argsort(-agreement(sig, pairs), kind="stable").tolist() if len(plist) else []:
+        i, j = plist[p]
+        ri, rj = rep[i], rep[j]
+        if ri == rj:
+            continue
+        mi, mj = members.get(ri, [ri]), members.get(rj, [rj])
+        if len(mi) < len(mj) or (len(mi) == len(mj) and rj < ri):
+            ri, rj, mi, mj = rj, ri, mj, mi
+        if (sig[mj] == sig[ri]).mean(axis=1).min() < threshold:
+            continue
+        for m in mj:
+            rep[m] = ri
+        members[ri] = mi + mj
+        members.pop(rj, None)
+    return np.array(rep, dtype=np.int64)
@@ -0,0 +1,59 @@
+# lib/query_client.py
+"""
+Thin client for the query daemon (library_data.scripts.query_daemon). Stdlib only, so
+the CLI can use it without importing the catalog code at all.
+"""
+import itertools
+import json
+import socket
+from pathlib import Path
+from typing import Any
+
+_ids = itertools.count(1)
+
+
+class DaemonUnavailable(Exception):
+    """No daemon is listening (or it serves a different DB); callers fall back to local queries."""
+
+
+class QueryClient:
+    def __init__(self, socket_path: str | Path, *, db: str | Path | None = None,
+                 timeout: float = 30.0):
+        self.db = str(db) if db is not None else None
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(str(socket_path))
+        except (OSError, AttributeError) as e:  # AttributeError: no AF_UNIX on this platform
+            raise DaemonUnavailable(str(e)) from e
+        self.rfile = self.sock.makefile("rb")
+
+    def call(self, op: str, **args) -> Any:
+        rid = next(_ids)
+        req = {"id": rid, "op": op, "args": args}
+        if self.db:
+            req["db"] = self.db
+        try:
+            self.sock.sendall((json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8"))
+            line = self.rfile.readline()
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+        if not line:
+            raise DaemonUnavailable("daemon closed the connection")
+        resp = json.loads(line)
+        if not resp.get("ok"):
+            err = resp.get("error", "")
+            if err.startswith("LookupError"):
+                raise DaemonUnavailable(err)
+            raise RuntimeError(err)
+        return resp["result"]
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,104 @@
+# lib/shards.py
+"""
+Federated queries over per-account catalog shards (config.SHARDS_DIR/<name>.db).
+
+Each shard is queried on a thread pool (sqlite3 releases the GIL while executing),
+then the per-shard top-k lists are merged and re-ranked. Rows carry a "shard" key,
+since books ids are only unique within a shard.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from library_data.config import list_shards, shard_path
+from library_data.lib.lib_catalog import decode_cursor, encode_cursor, filter_books, search_text
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="catalog-shard")
+    return _pool
+
+
+def resolve_shards(shards: Optional[Iterable[str]] = None) -> Dict[str, Path]:
+    names = list(shards) if shards is not None else list_shards()
+    out = {}
+    for name in names:
+        p = shard_path(name)
+        if p.exists():
+            out[name] = p
+    return out
+
+
+Rows = List[Dict[str, Any]]
+
+
+def _fan_out(shards: Optional[Iterable[str]],
+             fn: Callable[[str, Path], Rows]) -> tuple[Rows, Dict[str, int]]:
+    """Run fn(name, path) per shard; (rows tagged with "shard", shard -> index for tie-breaks)."""
+    paths = resolve_shards(shards)
+    futures = {name: _executor().submit(fn, name, p) for name, p in paths.items()}
+    rows = []
+    for name, fut in futures.items():
+        for r in fut.result():
+            r["shard"] = name
+            rows.append(r)
+    return rows, {name: i for i, name in enumerate(paths)}
+
+
+def _positions(cursor: Optional[str]) -> Dict[str, str]:
+    # a merged cursor holds, per shard, that shard's own cursor for the last row it contributed
+    after = decode_cursor(cursor, "m")[0] if cursor else {}
+    if not isinstance(after, dict):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return after
+
+
+def _with_merged_cursors(rows: Rows, after: Dict[str, str]) -> Rows:
+    # every shard resumes right after its own last row on the page, so rows that tie across
+    # shards (ids are only unique per shard) are neither skipped nor repeated
+    pos = dict(after)
+    for r in rows:
+        pos[r["shard"]] = r["cursor"]
+        r["cursor"] = encode_cursor(["m", pos])
+    return rows
+
+
+def federated_filter_books(shards: Optional[Iterable[str]] = None, *, limit: int = 50,
+                           cursor: Optional[str] = None, **filters) -> Rows:
+    """
+    filter_books() on every shard; merged in the same order a single catalog uses, then by
+    shard. Rows carry a merged "cursor"; pass the last one back as cursor= for the next page.
+    """
+    after = _positions(cursor)
+    rows, order = _fan_out(
+        shards, lambda name, p: filter_books(p, limit=limit, cursor=after.get(name), **filters))
+    keys = {id(r): decode_cursor(r["cursor"], "f") for r in rows}  # [entry_key, title_key, id]
+    rows.sort(key=lambda r: (keys[id(r)][1], keys[id(r)][2], order[r["shard"]]))
+    rows.sort(key=lambda r: keys[id(r)][0], reverse=True)
+    return _with_merged_cursors(rows[:limit], after)
+
+
+def federated_search_text(shards: Optional[Iterable[str]] = None, query: str = "", limit: int = 25,
+                          *, collapse: bool = False, cursor: Optional[str] = None) -> Rows:
+    """
+    search_text() on every shard, re-ranked globally. FTS hits are ordered by bm25
+    (lower is better); shards without an FTS index return unscored title matches, which
+    rank after scored rows, by title. collapse applies per shard (groups don't span shards).
+    Rows carry a merged "cursor", as in federated_filter_books().
+    """
+    after = _positions(cursor)
+    def search(name: str, p: Path) -> Rows:
+        return search_text(p, query, limit, collapse=collapse, cursor=after.get(name))
+
+    rows, order = _fan_out(shards, search)
+    # merge on each shard's own sort keys, so a page takes a prefix of every shard's list
+    keys = {}
+    for r in rows:
+        kind = "s" if r.get("score") is not None else "t"
+        keys[id(r)] = (kind == "t", decode_cursor(r["cursor"], kind), order[r["shard"]])
+    rows.sort(key=lambda r: keys[id(r)])
+    return _with_merged_cursors(rows[:limit], after)
@@ -0,0 +1,54 @@
+# lib/sortkeys.py
+"""
+Normalized sort keys stored by ingest (books.entry_key / books.title_key) and applied
+to query arguments. Stdlib only: the query path imports it.
+"""
+import re
+import unicodedata
+from datetime import datetime
+
+RE_ISO = re.compile(r"^\s*(\d{4})-(\d{1,2})-(\d{1,2})")
+RE_US = re.compile(r"^\s*(\d{1,2})/(\d{1,2})/(\d{4})\b")
+RE_YEAR = re.compile(r"^\D*(\d{4})\D*$")
+TEXT_DATE_FORMATS = ("%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%d %B %Y", "%b %Y", "%B %Y")
+RE_SPACE = re.compile(r"\s+")
+RE_LEAD_PUNCT = re.compile(r"^[\W_]+")
+ARTICLES = ("the ", "a ", "an ")
+
+
+def date_key(value: str | None) -> str:
+    """
+    'YYYY-MM-DD' for the date formats LT/MARC exports use ('2019-05-04 10:00', '5/4/2019',
+    'May 4, 2019', 'May 2019' -> '2019-05-00', '2019' -> '2019-00-00'); '' if unparseable,
+    which sorts after every real date in newest-first order.
+    """
+    s = value.strip() if isinstance(value, str) else ""
+    if not s:
+        return ""
+    m = RE_ISO.match(s)
+    if m:
+        y, mo, d = m.groups()
+        return f"{y}-{int(mo):02d}-{int(d):02d}"
+    m = RE_US.match(s)
+    if m:
+        mo, d, y = m.groups()
+        return f"{y}-{int(mo):02d}-{int(d):02d}"
+    for fmt in TEXT_DATE_FORMATS:
+        try:
+            dt = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        return dt.strftime("%Y-%m-00" if "%d" not in fmt else "%Y-%m-%d")
+    m = RE_YEAR.match(s)
+    return f"{m.group(1)}-00-00" if m else ""
+
+
+def title_key(value: str | None) -> str:
+    """Case- and accent-folded title without leading punctuation or article, for A-Z order."""
+    s = unicodedata.normalize("NFKD", value if isinstance(value, str) else "")
+    s = "".join(c for c in s if not unicodedata.combining(c)).casefold()
+    s = RE_LEAD_PUNCT.sub("", RE_SPACE.sub(" ", s).strip())
+    for art in ARTICLES:
+        if s.startswith(art):
+            return s[len(art):]
+    return s
@@ -1,10 +1,11 @@
-from playwright.sync_api import sync_playwright
 from library_data.config import SECRETS_DIR, ensure_dirs
 
 STATE = SECRETS_DIR / ".state.json"
 PROFILE = SECRETS_DIR / ".lt_profile"  # persistent profile dir
 
 def main():
+    from playwright.sync_api import sync_playwright  # heavy; only load when actually capturing
+
     ensure_dirs()
     with sync_playwright() as pw:
         ctx = pw.chromium.launch_persistent_context(
@@ -0,0 +1,140 @@
+# scripts/dedup.py
+"""
+Group duplicate entries and editions of the same work (MinHash + LSH, see lib/minhash.py).
+
+Signatures are computed in worker processes, each reading its own rowid range of the
+books table; banding, verification and union-find run in the parent. The result
+replaces book_groups, which filter/search use to collapse a group to one row.
+"""
+import argparse
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from library_data.config import DB_PATH as DB_DEFAULT
+from library_data.config import ensure_dirs, shard_path
+from library_data.lib import minhash
+from library_data.scripts.ingest import ensure_db
+
+GROUPS_SQL = """
+-- only books in groups of two or more; group_id is the group's representative, which
+-- every member matches at >= the dedup threshold
+CREATE TABLE IF NOT EXISTS book_groups (
+  book_id    TEXT PRIMARY KEY,
+  group_id   TEXT NOT NULL,
+  similarity REAL            -- estimated Jaccard with the group_id book
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_book_groups_group ON book_groups(group_id);
+"""
+
+CHUNK = 5000
+
+def ensure_groups_table(conn: sqlite3.Connection):
+    conn.executescript(GROUPS_SQL)
+    conn.commit()
+
+def _signature_chunk(db_path: str, lo: int, hi: int, num_perm: int, seed: int):
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = con.execute(
+            "SELECT rowid, id, title, primaryauthor FROM books"
+            " WHERE rowid BETWEEN ? AND ? ORDER BY rowid",
+            (lo, hi),
+        ).fetchall()
+        isbns: dict[str, list[str]] = {}
+        for bid, x in con.execute(
+            "SELECT x.book_id, x.isbn13 FROM books b JOIN book_isbns x ON x.book_id = b.id"
+            " WHERE b.rowid BETWEEN ? AND ?",
+            (lo, hi),
+        ):
+            isbns.setdefault(bid, []).append(x)
+        cluster: dict[str, list[str]] = {}
+        if con.execute("SELECT 1 FROM sqlite_master"
+                       " WHERE type='table' AND name='book_isbn_clusters'").fetchone():
+            for bid, x in con.execute(
+                "SELECT c.book_id, c.isbn13 FROM books b"
+                " JOIN book_isbn_clusters c ON c.book_id = b.id WHERE b.rowid BETWEEN ? AND ?",
+                (lo, hi),
+            ):
+                cluster.setdefault(bid, []).append(x)
+    finally:
+        con.close()
+
+    toks = [minhash.book_tokens(title, author, isbns.get(bid, ()), cluster.get(bid, ()))
+            for _rid, bid, title, author in rows]
+    keep = [i for i, t in enumerate(toks) if t]
+    sig = minhash.signatures([toks[i] for i in keep], minhash.permutations(num_perm, seed))
+    keys = np.array([minhash.identity_keys(rows[i][3], isbns.get(rows[i][1], ()),
+                                           cluster.get(rows[i][1], ()))
+                     for i in keep], dtype=np.int64).reshape(-1, 2)
+    return [rows[i][1] for i in keep], sig, keys
+
+def dedup(db_path: str | Path, *, jobs: int | None = None, threshold: float = 0.5,
+          num_perm: int = minhash.NUM_PERM, bands: int = minhash.BANDS,
+          seed: int = 1) -> tuple[int, int, int]:
+    """Rebuild book_groups. Returns (books signed, groups, grouped books)."""
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    db_path = str(Path(db_path).resolve())
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_db(conn)
+        ensure_groups_table(conn)
+        lo, hi = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM books").fetchone()
+        ids: list[str] = []
+        sigs, keys = [], []
+        if lo is not None:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(_signature_chunk, db_path, a, min(a + CHUNK - 1, hi),
+                                       num_perm, seed)
+                           for a in range(lo, hi + 1, CHUNK)]
+                for fut in futures:
+                    chunk_ids, sig, key = fut.result()
+                    ids += chunk_ids
+                    sigs.append(sig)
+                    keys.append(key)
+        sig = np.concatenate(sigs) if sigs else np.empty((0, num_perm), dtype=np.uint32)
+        key = np.concatenate(keys) if keys else np.empty((0, 2), dtype=np.int64)
+
+        pairs = minhash.candidate_pairs(sig, bands=bands, threshold=threshold, keys=key)
+        label = minhash.group_pairs(len(ids), pairs, sig, threshold)
+        sizes = np.bincount(label, minlength=len(ids))
+        grouped = np.flatnonzero(sizes[label] > 1)
+        similarity = (sig[grouped] == sig[label[grouped]]).mean(axis=1) if grouped.size else []
+
+        with conn:
+            conn.execute("DELETE FROM book_groups")
+            conn.executemany(
+                "INSERT INTO book_groups (book_id, group_id, similarity) VALUES (?,?,?)",
+                ((ids[i], ids[label[i]], float(s)) for i, s in zip(grouped.tolist(), similarity)),
+            )
+        return len(ids), int((sizes > 1).sum()), int(grouped.size)
+    finally:
+        conn.close()
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Group near-duplicate books and editions of the same work (MinHash/LSH).")
+    ap.add_argument("--db", default=str(DB_DEFAULT))
+    ap.add_argument("--shard", help="Dedup the named account shard instead of --db")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="Signature worker processes (default: CPU count)")
+    ap.add_argument("--threshold", type=float, default=0.5,
+                    help="Minimum estimated Jaccard for a pair to be grouped")
+    ap.add_argument("--num-perm", type=int, default=minhash.NUM_PERM)
+    ap.add_argument("--bands", type=int, default=minhash.BANDS)
+    args = ap.parse_args()
+
+    ensure_dirs()
+    db_path = shard_path(args.shard) if args.shard else Path(args.db)
+    t0 = time.time()
+    n, groups, grouped = dedup(db_path, jobs=args.jobs, threshold=args.threshold,
+                               num_perm=args.num_perm, bands=args.bands)
+    print(f"signed {n} books: {grouped} books in {groups} groups "
+          f"({time.time() - t0:.1f}s) -> {db_path}")
+
+if __name__ == "__main__":
+    main()
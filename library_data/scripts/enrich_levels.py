@@ -2,64 +2,51 @@ from __future__ import annotations
 import argparse, json, re, time
 from pathlib import Path
 import sqlite3, requests
-from library_data.lib.isbn_utils import explode_isbns_with_lt, probe_openlibrary_isbns, expand_via_openlibrary
+from library_data.lib.isbn_utils import (
+    HostUnavailable, explode_isbns_with_lt, http_get, ol_editions_by_isbn, ol_works_by_isbn,
+    probe_openlibrary_isbns,
+)
+from library_data.lib.lib_catalog import LEVEL_DIMS, LEVEL_MISSING
+from library_data.lib.isbn_batch import normalize_isbns
 from library_data.scripts import settings
-from library_data.config import DB_PATH as DB_DEFAULT, ensure_dirs
+from library_data.config import DB_PATH as DB_DEFAULT, ensure_dirs, list_shards, shard_path
+from library_data.scripts.ingest import (
+    compact_change_log, ensure_db, get_meta, reindex_isbns, set_meta,
+)
 
-UA = settings.UA
+DB_DEFAULT = DB_DEFAULT
 
+# Re-check schedule (seconds). Successful books are refreshed after REFRESH_FOUND; books
+# with nothing usable back off exponentially: RETRY_BASE * 2**(attempts-1), capped.
+DAY = 86400
+REFRESH_FOUND = 90 * DAY
+RETRY_BASE = 1 * DAY
+RETRY_CAP = 180 * DAY
+# work-queue priority: never tried (or deferred by an outage) < stale successes < known-empty
+QUEUE_PRIORITY = """
+  CASE WHEN a.book_id IS NULL OR a.outcome = 'deferred' THEN 0
+       WHEN a.outcome = 'found' THEN 1
+       ELSE 2 END
+"""
 
-DB_DEFAULT = DB_DEFAULT
+# One alternation scanned once per string; the group that closes the match (lastgroup)
+# tells which rule fired. Ranges come before singles so they win at the same position.
+RE_LEVELS = re.compile(r"""
+    \blexile[^0-9]*?(?P<lexile_lo>\d{3,4})\s*[-–]\s*(?P<lexile_range>\d{3,4})\b
+  | \bgrades?\s*(?P<grade_lo>\d+)\s*[-–]\s*(?P<grade_range>\d+)\b
+  | \bgrade\s*(?:level\s*)?(?P<grade>\d+)\b
+  | \bages?\s*(?P<age_lo>\d+)\s*[-–]\s*(?P<age_range>\d+)\b
+  | \bage\s*(?P<age>\d+)\b
+  | \b(?P<lexile>\d{3,4})\s*l\b
+""", re.I | re.X)
+# every rule needs a digit; most subject strings have none, so this skips them cheaply
+RE_HAS_DIGIT = re.compile(r"\d")
+LEVEL_KEYS = ("lexile_min", "lexile_max", "grade_min", "grade_max", "age_min", "age_max")
 
-RE_LEXILE_ANY   = re.compile(r"\b(\d{3,4})\s*[lL]\b")
-RE_LEXILE_RANGE = re.compile(r"\blexile[^0-9]*?(\d{3,4})\s*[-–]\s*(\d{3,4})\b", re.I)
-RE_GRADES_RANGE = re.compile(r"\bgrades?\s*(\d+)\s*[-–]\s*(\d+)\b", re.I)
-RE_GRADE_SINGLE = re.compile(r"\bgrade\s*(?:level\s*)?(\d+)\b", re.I)
-RE_AGES_RANGE   = re.compile(r"\bages?\s*(\d+)\s*[-–]\s*(\d+)\b", re.I)
-RE_AGE_SINGLE   = re.compile(r"\bage\s*(\d+)\b", re.I)
-
-def digits(s: str) -> str:
-    return "".join(ch for ch in s if ch.isdigit() or ch.upper() == "X")
-
-def isbn10_to13(isbn10: str) -> str | None:
-    core = digits(isbn10).upper()
-    if len(core) != 10:
-        return None
-    base = "978" + core[:9]
-    total = sum((int(d) if i % 2 == 0 else int(d) * 3) for i, d in enumerate(base))
-    check = (10 - (total % 10)) % 10
-    return base + str(check)
-
-def collect_isbns13(rec) -> list[str]:
-    cand = []
-    isbn_obj = rec.get("isbn")
-    if isinstance(isbn_obj, dict):
-        cand += [v for v in isbn_obj.values() if isinstance(v, str)]
-    elif isinstance(isbn_obj, list):
-        cand += [v for v in isbn_obj if isinstance(v, str)]
-    elif isinstance(isbn_obj, str):
-        cand.append(isbn_obj)
-    for k in ("originalisbn", "asin", "ean", "upc"):
-        v = rec.get(k)
-        if isinstance(v, str):
-            cand.append(v)
-        elif isinstance(v, list):
-            cand += [x for x in v if isinstance(x, str)]
-    # normalize -> 13
-    norm = []
-    for v in cand:
-        d = digits(v)
-        if len(d) == 13:
-            norm.append(d)
-        elif len(d) == 10:
-            c13 = isbn10_to13(d)
-            if c13:
-                norm.append(c13)
-    seen, out = set(), []
-    for x in norm:
-        if x not in seen:
-            seen.add(x); out.append(x)
-    return out
+def book_isbns13(conn, book_id: str) -> list[str]:
+    """Normalized ISBN-13s written by ingest (see lib/isbn_batch.py), in record order."""
+    rows = conn.execute("SELECT isbn13 FROM book_isbns WHERE book_id = ? ORDER BY pos", (book_id,))
+    return [r[0] for r in rows]
 
 def ensure_table(conn):
     conn.executescript("""
@@ -75,61 +62,168 @@ def ensure_table(conn):
       raw_json   TEXT,
       updated_at TEXT DEFAULT (datetime('now'))
     );
+
+    -- thingISBN cluster members (normalized ISBN-13) per book, for other-edition lookups
+    CREATE TABLE IF NOT EXISTS book_isbn_clusters (
+      book_id TEXT NOT NULL,
+      isbn13  TEXT NOT NULL,
+      PRIMARY KEY (book_id, isbn13)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_book_isbn_clusters_isbn13 ON book_isbn_clusters(isbn13);
+
+    -- one row per book that enrichment has looked at: last outcome
+    -- (found | fallback | empty | no_isbn | deferred), completed attempts, and when it may
+    -- be looked at again (epoch seconds)
+    CREATE TABLE IF NOT EXISTS enrich_attempts (
+      book_id       TEXT PRIMARY KEY,
+      outcome       TEXT NOT NULL,
+      attempts      INTEGER NOT NULL DEFAULT 0,
+      last_attempt  REAL,
+      next_eligible REAL NOT NULL,
+      host          TEXT,
+      reason        TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_enrich_attempts_next ON enrich_attempts(next_eligible);
+
+    -- level changes feed the change log (ingest.SCHEMA_SQL); deletes ride on the book's delete
+    CREATE TRIGGER IF NOT EXISTS book_levels_change_ai AFTER INSERT ON book_levels BEGIN
+      INSERT INTO change_log (book_id, op) VALUES (new.book_id, 'levels');
+    END;
+    CREATE TRIGGER IF NOT EXISTS book_levels_change_au AFTER UPDATE ON book_levels
+    WHEN old.lexile_min IS NOT new.lexile_min OR old.lexile_max IS NOT new.lexile_max
+      OR old.grade_min IS NOT new.grade_min OR old.grade_max IS NOT new.grade_max
+      OR old.age_min IS NOT new.age_min OR old.age_max IS NOT new.age_max BEGIN
+      INSERT INTO change_log (book_id, op) VALUES (new.book_id, 'levels');
+    END;
     """)
     conn.commit()
+    ensure_level_index(conn)
+    _migrate_attempts(conn)
+
+def _migrate_attempts(conn):
+    # level rows written before attempt tracking count as fresh successes, not new books
+    if get_meta(conn, "enrich_attempts_backfilled") is None:
+        conn.execute("""
+          INSERT OR IGNORE INTO enrich_attempts
+            (book_id, outcome, attempts, last_attempt, next_eligible)
+          SELECT book_id, 'found', 1, strftime('%s', updated_at), strftime('%s', updated_at) + ?
+          FROM book_levels
+        """, (REFRESH_FOUND,))
+        set_meta(conn, "enrich_attempts_backfilled")
+
+def _rtree_bounds(p: str = "") -> str:
+    # [lo, hi] per dimension from the row's min/max columns (p = "new." in triggers); MIN/MAX
+    # keep a row written with min > max by something other than _store_levels a valid box
+    out = []
+    for dim in LEVEL_DIMS:
+        lo = f"COALESCE({p}{dim}_min, {p}{dim}_max, {LEVEL_MISSING})"
+        hi = f"COALESCE({p}{dim}_max, {p}{dim}_min, {LEVEL_MISSING})"
+        out += [f"MIN({lo}, {hi})", f"MAX({lo}, {hi})"]
+    return ", ".join(out)
+
+# R*Tree over (lexile, grade, age) ranges, keyed by book_levels.rowid and kept in sync by
+# triggers. Missing dimensions are stored as [LEVEL_MISSING, LEVEL_MISSING] so they never
+# overlap a query range (see lib_catalog.filter_books).
+LEVEL_INDEX_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS book_levels_rtree USING rtree_i32(
+  id, lexile_lo, lexile_hi, grade_lo, grade_hi, age_lo, age_hi
+);
+CREATE TRIGGER IF NOT EXISTS book_levels_rtree_ai AFTER INSERT ON book_levels BEGIN
+  INSERT OR REPLACE INTO book_levels_rtree VALUES (new.rowid, {_rtree_bounds("new.")});
+END;
+CREATE TRIGGER IF NOT EXISTS book_levels_rtree_au AFTER UPDATE ON book_levels BEGIN
+  DELETE FROM book_levels_rtree WHERE id = old.rowid;
+  INSERT OR REPLACE INTO book_levels_rtree VALUES (new.rowid, {_rtree_bounds("new.")});
+END;
+CREATE TRIGGER IF NOT EXISTS book_levels_rtree_ad AFTER DELETE ON book_levels BEGIN
+  DELETE FROM book_levels_rtree WHERE id = old.rowid;
+END;
+"""
+# used when SQLite is built without the R*Tree module
+LEVEL_FALLBACK_SQL = """
+CREATE INDEX IF NOT EXISTS idx_book_levels_lexile ON book_levels(lexile_min, lexile_max);
+CREATE INDEX IF NOT EXISTS idx_book_levels_grade  ON book_levels(grade_min, grade_max);
+CREATE INDEX IF NOT EXISTS idx_book_levels_age    ON book_levels(age_min, age_max);
+"""
+
+def ensure_level_index(conn):
+    if get_meta(conn, "book_levels_ranges_sorted") is None:
+        # once per DB: enrichment before _store_levels sorted ranges could store min > max
+        for dim in LEVEL_DIMS:
+            conn.execute(f"UPDATE book_levels SET {dim}_min = {dim}_max, {dim}_max = {dim}_min "
+                         f"WHERE {dim}_min > {dim}_max")
+        set_meta(conn, "book_levels_ranges_sorted")
+    try:
+        conn.executescript(LEVEL_INDEX_SQL)
+    except sqlite3.OperationalError:
+        conn.executescript(LEVEL_FALLBACK_SQL)
+        return
+    # rebuild if out of step (DB enriched before the index existed, or VACUUM renumbered rowids)
+    have = conn.execute("SELECT count(*), total(id) FROM book_levels_rtree").fetchone()
+    want = conn.execute("SELECT count(*), total(rowid) FROM book_levels").fetchone()
+    if tuple(have) != tuple(want):
+        conn.execute("DELETE FROM book_levels_rtree")
+        conn.execute(
+            f"INSERT INTO book_levels_rtree SELECT rowid, {_rtree_bounds()} FROM book_levels")
+    conn.commit()
+
+def store_cluster(conn, book_id: str, isbns: list[str]):
+    rows = {(book_id, x) for x in normalize_isbns(isbns) if x}
+    conn.executemany(
+        "INSERT OR IGNORE INTO book_isbn_clusters (book_id, isbn13) VALUES (?, ?)", rows)
+
+def backfill_clusters(conn) -> int:
+    """Load clusters already recorded in book_levels.raw_json ('expanded')."""
+    n = 0
+    rows = conn.execute(
+        "SELECT book_id, raw_json FROM book_levels WHERE raw_json IS NOT NULL").fetchall()
+    for bid, raw in rows:
+        try:
+            expanded = json.loads(raw).get("expanded") or []
+        except (ValueError, AttributeError):
+            continue
+        store_cluster(conn, bid, [x for x in expanded if isinstance(x, str)])
+        n += 1
+    conn.commit()
+    return n
 
 def _extract_from_text(blob: str, out: dict):
-    if not blob or not isinstance(blob, str):
+    if not blob or not isinstance(blob, str) or not RE_HAS_DIGIT.search(blob):
         return
-    m = RE_LEXILE_RANGE.search(blob)
-    if m:
-        out.setdefault("lexile_min", int(m.group(1)))
-        out.setdefault("lexile_max", int(m.group(2)))
-    if "lexile_min" not in out or "lexile_max" not in out:
-        m2 = RE_LEXILE_ANY.search(blob)
-        if m2:
-            n = int(m2.group(1))
-            out.setdefault("lexile_min", n)
-            out.setdefault("lexile_max", n)
-    mg = RE_GRADES_RANGE.search(blob)
-    if mg:
-        out.setdefault("grade_min", int(mg.group(1)))
-        out.setdefault("grade_max", int(mg.group(2)))
-    else:
-        mg2 = RE_GRADE_SINGLE.search(blob)
-        if mg2:
-            g = int(mg2.group(1))
-            out.setdefault("grade_min", g)
-            out.setdefault("grade_max", g)
-    ma = RE_AGES_RANGE.search(blob)
-    if ma:
-        out.setdefault("age_min", int(ma.group(1)))
-        out.setdefault("age_max", int(ma.group(2)))
-    else:
-        ma2 = RE_AGE_SINGLE.search(blob)
-        if ma2:
-            a = int(ma2.group(1))
-            out.setdefault("age_min", a)
-            out.setdefault("age_max", a)
+    found = {}
+    for m in RE_LEVELS.finditer(blob):
+        found.setdefault(m.lastgroup, m)
+    for kind in ("lexile", "grade", "age"):
+        m = found.get(f"{kind}_range")
+        if m:
+            # sorted: "Ages 12-8"
+            lo, hi = sorted((int(m.group(f"{kind}_lo")), int(m.group(f"{kind}_range"))))
+        elif kind in found:
+            lo = hi = int(found[kind].group(kind))
+        else:
+            continue
+        out.setdefault(f"{kind}_min", lo)
+        out.setdefault(f"{kind}_max", hi)
+
+def _iter_level_texts(obj: dict):
+    for s in obj.get("subjects") or []:
+        if isinstance(s, str):
+            yield s
+    for key in ("description", "notes"):
+        v = obj.get(key)
+        if isinstance(v, dict):
+            v = v.get("value")
+        if isinstance(v, str):
+            yield v
 
 def parse_levels_rich(obj: dict | None) -> dict:
     out = {}
     if not obj:
         return out
-    subs = obj.get("subjects") or []
-    for s in subs:
-        if isinstance(s, str):
-            _extract_from_text(s, out)
-    desc = obj.get("description")
-    if isinstance(desc, dict):
-        _extract_from_text(desc.get("value"), out)
-    elif isinstance(desc, str):
-        _extract_from_text(desc, out)
-    notes = obj.get("notes")
-    if isinstance(notes, dict):
-        _extract_from_text(notes.get("value"), out)
-    elif isinstance(notes, str):
-        _extract_from_text(notes, out)
+    for text in _iter_level_texts(obj):
+        _extract_from_text(text, out)
+        if len(out) == len(LEVEL_KEYS):
+            break  # first match per key wins, so nothing later can change the result
     return out
 
 def lt_subjects_fallback(rec: dict) -> dict:
@@ -152,106 +246,303 @@ def lt_subjects_fallback(rec: dict) -> dict:
 
 def fetch_ol_pair(session: requests.Session, isbn13: str):
     ed = wk = None
-    r = session.get(f"https://openlibrary.org/isbn/{isbn13}.json", timeout=15)
+    r = http_get(f"https://openlibrary.org/isbn/{isbn13}.json", session=session, timeout=15)
     if not r.ok:
         return None, None
     ed = r.json()
     if ed.get("works"):
         wkkey = ed["works"][0].get("key")
         if wkkey:
-            r2 = session.get(f"https://openlibrary.org{wkkey}.json", timeout=15)
+            r2 = http_get(f"https://openlibrary.org{wkkey}.json", session=session, timeout=15)
             if r2.ok:
                 wk = r2.json()
     return ed, wk
 
-def enrich(conn, *, lt_token: str | None, limit=500, sleep=0.5, probe_all=False):
-    conn.row_factory = sqlite3.Row
-    ensure_table(conn)
+def defer_books(conn, book_ids: list[str], err: HostUnavailable):
+    """Queue books for a later run instead of writing degraded (fallback-only) levels."""
+    conn.executemany("""
+      INSERT INTO enrich_attempts (book_id, outcome, next_eligible, host, reason)
+      VALUES (?, 'deferred', ?, ?, ?)
+      ON CONFLICT(book_id) DO UPDATE SET
+        outcome='deferred', next_eligible=excluded.next_eligible, host=excluded.host,
+        reason=excluded.reason
+    """, [(bid, err.retry_at, err.host, err.reason) for bid in book_ids])
+    conn.commit()
 
-    rows = conn.execute("""
-      SELECT id, raw_json FROM books
-      WHERE id NOT IN (SELECT book_id FROM book_levels)
-    """).fetchall()
+def record_attempt(conn, book_id: str, outcome: str):
+    """Log a completed attempt and schedule the next one (see REFRESH_FOUND / RETRY_BASE)."""
+    now = time.time()
+    row = conn.execute("SELECT attempts FROM enrich_attempts WHERE book_id = ?",
+                       (book_id,)).fetchone()
+    attempts = (row[0] if row else 0) + 1
+    if outcome == "found":
+        wait = REFRESH_FOUND
+    else:
+        wait = min(RETRY_CAP, RETRY_BASE * 2 ** (attempts - 1))
+    conn.execute("""
+      INSERT INTO enrich_attempts (book_id, outcome, attempts, last_attempt, next_eligible)
+      VALUES (?,?,?,?,?)
+      ON CONFLICT(book_id) DO UPDATE SET
+        outcome=excluded.outcome, attempts=excluded.attempts, last_attempt=excluded.last_attempt,
+        next_eligible=excluded.next_eligible, host=NULL, reason=NULL
+    """, (book_id, outcome, attempts, now, now + wait))
+    conn.commit()
 
-    s = requests.Session()
-    s.headers["User-Agent"] = UA
-
-    scanned = wrote = 0
-    for row in rows[:limit]:
-        scanned += 1
-        bid = row["id"]
-        rec = json.loads(row["raw_json"])
-
-        base_isbns = collect_isbns13(rec)
-        # expand via LT cluster if token provided
-        cluster = explode_isbns_with_lt(lt_token, base_isbns) if base_isbns else []
-        expanded = cluster or base_isbns  # fall back to base if cluster empty
-
-        # ensure the ISBN actually exists on OL
-        candidates = probe_openlibrary_isbns(expanded) if expanded else []
-        if not candidates and not probe_all:
-            # still try with base list (cheap)
-            candidates = base_isbns
-
-        data = {}
-        ed = wk = None
+def _outcome(ol_data: dict, fallback: dict, base_isbns: list[str]) -> str:
+    if ol_data:
+        return "found"
+    if fallback:
+        return "fallback"
+    return "empty" if base_isbns else "no_isbn"
+
+def _merge_levels(data: dict, obj: dict | None):
+    for k, v in parse_levels_rich(obj).items():
+        if v is not None and k not in data:
+            data[k] = v
+
+def _expand(conn, bid: str, lt_token: str | None) -> tuple[list[str], list[str]]:
+    base_isbns = book_isbns13(conn, bid)
+    # expand via LT cluster if token provided
+    cluster = explode_isbns_with_lt(lt_token, base_isbns) if base_isbns else []
+    if cluster:
+        store_cluster(conn, bid, cluster)
+        conn.commit()
+    return base_isbns, cluster or base_isbns  # fall back to base if cluster empty
+
+def _store_levels(conn, bid: str, data: dict, meta: dict):
+    # new values win per column, stored ones fill the gaps; each range is then sorted, since
+    # merging sources (or a stored max with a new min) can leave min > max
+    cols = [f"{dim}_{end}" for dim in LEVEL_DIMS for end in ("min", "max")]
+    old = conn.execute(f"SELECT {', '.join(cols)} FROM book_levels WHERE book_id = ?",
+                       (bid,)).fetchone()
+    vals = [data.get(c) if data.get(c) is not None else (old[i] if old else None)
+            for i, c in enumerate(cols)]
+    for i in range(0, len(vals), 2):
+        if vals[i] is not None and vals[i + 1] is not None and vals[i] > vals[i + 1]:
+            vals[i], vals[i + 1] = vals[i + 1], vals[i]
+    conn.execute("""
+      INSERT INTO book_levels (book_id, lexile_min, lexile_max, grade_min, grade_max,
+                               age_min, age_max, source, raw_json)
+      VALUES (?,?,?,?,?,?,?,?,?)
+      ON CONFLICT(book_id) DO UPDATE SET
+        lexile_min=excluded.lexile_min, lexile_max=excluded.lexile_max,
+        grade_min=excluded.grade_min, grade_max=excluded.grade_max,
+        age_min=excluded.age_min, age_max=excluded.age_max,
+        source=excluded.source,
+        raw_json=excluded.raw_json,
+        updated_at=datetime('now')
+    """, (bid, *vals, "openlibrary+ltcluster", json.dumps(meta, ensure_ascii=False)))
+    conn.commit()
+
+def _enrich_one(conn, s: requests.Session, row, *, lt_token, probe_all) -> bool:
+    bid = row["id"]
+    base_isbns, expanded = _expand(conn, bid, lt_token)
+
+    # ensure the ISBN actually exists on OL
+    candidates = probe_openlibrary_isbns(expanded) if expanded else []
+    if not candidates and not probe_all:
+        # still try with base list (cheap)
+        candidates = base_isbns
+
+    data = {}
+    ed = wk = None
+    for isbn in candidates:
+        try:
+            ed, wk = fetch_ol_pair(s, isbn)
+        except ValueError:  # not JSON
+            continue
+        _merge_levels(data, ed)
+        _merge_levels(data, wk)
+        if data:
+            break
+
+    fallback = {} if data else lt_subjects_fallback(json.loads(row["raw_json"]))
+    record_attempt(conn, bid, _outcome(data, fallback, base_isbns))
+    data = data or fallback
+    if not data:
+        return False
+    _store_levels(conn, bid, data, {"base_isbns": base_isbns, "expanded": expanded,
+                                    "picked": candidates[:3], "ed": ed, "wk": wk})
+    return True
+
+def _chunk_levels(conn, s: requests.Session, row, base_isbns, expanded, editions, works, *,
+                  probe_all, work_cache: dict) -> bool:
+    candidates = list(dict.fromkeys(x for x in expanded if x in editions))
+    data = {}
+    ed = wk = None
+    for isbn in candidates:
+        ed, wk = editions[isbn], works.get(isbn)
+        _merge_levels(data, ed)
+        _merge_levels(data, wk)
+        if data:
+            break
+
+    if not data and candidates:
+        # search docs carry no work description; fall back to the full work record once
+        ed = editions[candidates[0]]
+        wkkey = (ed.get("works") or [{}])[0].get("key")
+        if wkkey and wkkey not in work_cache:
+            try:
+                r = http_get(f"https://openlibrary.org{wkkey}.json", session=s, timeout=15)
+                work_cache[wkkey] = r.json() if r.ok else None
+            except ValueError:
+                work_cache[wkkey] = None
+        wk = work_cache.get(wkkey) if wkkey else None
+        _merge_levels(data, wk)
+
+    if not candidates and not probe_all:
+        # as in _enrich_one: still try the book's own ISBNs directly (cheap)
+        candidates = base_isbns
         for isbn in candidates:
             try:
                 ed, wk = fetch_ol_pair(s, isbn)
-            except requests.RequestException:
+            except ValueError:  # not JSON
                 continue
-            for obj in (ed, wk):
-                d = parse_levels_rich(obj)
-                for k, v in d.items():
-                    if v is not None and k not in data:
-                        data[k] = v
+            _merge_levels(data, ed)
+            _merge_levels(data, wk)
             if data:
                 break
 
-        if not data:
-            data = lt_subjects_fallback(rec)
+    fallback = {} if data else lt_subjects_fallback(json.loads(row["raw_json"]))
+    record_attempt(conn, row["id"], _outcome(data, fallback, base_isbns))
+    data = data or fallback
+    if not data:
+        return False
+    meta = {"base_isbns": base_isbns, "expanded": expanded, "picked": candidates[:3],
+            "ed": ed, "wk": wk}
+    _store_levels(conn, row["id"], data, meta)
+    return True
 
-        if data:
-            conn.execute("""
-              INSERT INTO book_levels (book_id, lexile_min, lexile_max, grade_min, grade_max, age_min, age_max, source, raw_json)
-              VALUES (?,?,?,?,?,?,?,?,?)
-              ON CONFLICT(book_id) DO UPDATE SET
-                lexile_min=COALESCE(excluded.lexile_min, lexile_min),
-                lexile_max=COALESCE(excluded.lexile_max, lexile_max),
-                grade_min=COALESCE(excluded.grade_min, grade_min),
-                grade_max=COALESCE(excluded.grade_max, grade_max),
-                age_min=COALESCE(excluded.age_min, age_min),
-                age_max=COALESCE(excluded.age_max, age_max),
-                source='openlibrary+ltcluster',
-                raw_json=excluded.raw_json,
-                updated_at=datetime('now')
-            """, (bid,
-                  data.get("lexile_min"), data.get("lexile_max"),
-                  data.get("grade_min"), data.get("grade_max"),
-                  data.get("age_min"), data.get("age_max"),
-                  "openlibrary+ltcluster",
-                  json.dumps({"base_isbns": base_isbns, "expanded": expanded, "picked": candidates[:3], "ed": ed, "wk": wk}, ensure_ascii=False)))
-            conn.commit(); wrote += 1
-
-        time.sleep(sleep)
+def _enrich_chunk(conn, s: requests.Session, rows, *, lt_token, sleep, work_cache: dict,
+                  probe_all: bool = False) -> tuple[int, int]:
+    """
+    Batched mode: one /api/books pass resolves (and so probes) every candidate ISBN of
+    every book in the chunk, one search.json pass supplies work subjects, and full work
+    JSON is fetched only as a last resort (cached across books sharing a work). A host
+    outage defers only the books that needed that host. Returns (wrote, deferred).
+    """
+    prepped, deferred = [], 0
+    for row in rows:
+        try:
+            prepped.append((row, *_expand(conn, row["id"], lt_token)))
+        except HostUnavailable as e:  # LibraryThing: only this book lacks its cluster
+            defer_books(conn, [row["id"]], e)
+            deferred += 1
+    try:
+        all_isbns = [x for _row, _base, expanded in prepped for x in expanded]
+        editions = ol_editions_by_isbn(all_isbns, session=s, sleep=sleep)
+        works = ol_works_by_isbn([x for x in all_isbns if x in editions], session=s, sleep=sleep)
+    except HostUnavailable as e:
+        defer_books(conn, [row["id"] for row, *_ in prepped], e)
+        return 0, deferred + len(prepped)
+
+    wrote = 0
+    for row, base_isbns, expanded in prepped:
+        try:
+            wrote += _chunk_levels(conn, s, row, base_isbns, expanded, editions, works,
+                                   probe_all=probe_all, work_cache=work_cache)
+        except HostUnavailable as e:
+            defer_books(conn, [row["id"]], e)
+            deferred += 1
+    return wrote, deferred
+
+def enrich(conn, *, lt_token: str | None, limit=500, sleep=0.5, probe_all=False, batch=0):
+    """
+    batch > 0 switches to multi-ISBN OpenLibrary lookups, `batch` books per round.
+    """
+    conn.row_factory = sqlite3.Row
+    ensure_db(conn)
+    ensure_table(conn)
+    if get_meta(conn, "book_isbns_backfilled") is None:
+        # once per DB: one ingested before book_isbns existed has books but no ISBN rows
+        if conn.execute("SELECT 1 FROM book_isbns LIMIT 1").fetchone() is None:
+            reindex_isbns(conn)
+        set_meta(conn, "book_isbns_backfilled")
+    if get_meta(conn, "book_isbn_clusters_backfilled") is None:
+        if conn.execute("SELECT 1 FROM book_isbn_clusters LIMIT 1").fetchone() is None:
+            backfill_clusters(conn)
+        set_meta(conn, "book_isbn_clusters_backfilled")
 
+    rows = conn.execute(f"""
+      SELECT b.id, b.raw_json FROM books b
+      LEFT JOIN enrich_attempts a ON a.book_id = b.id
+      WHERE a.book_id IS NULL OR a.next_eligible <= ?
+      ORDER BY {QUEUE_PRIORITY}, a.next_eligible
+      LIMIT ?
+    """, (time.time(), limit)).fetchall()
+
+    s = requests.Session()
+    s.headers["User-Agent"] = settings.UA
+
+    scanned = wrote = deferred = 0
+    if batch > 0:
+        work_cache: dict = {}
+        for i in range(0, len(rows), batch):
+            chunk = rows[i:i + batch]
+            scanned += len(chunk)
+            w, d = _enrich_chunk(conn, s, chunk, lt_token=lt_token, sleep=sleep,
+                                 work_cache=work_cache, probe_all=probe_all)
+            wrote += w
+            deferred += d
+            time.sleep(sleep)
+    else:
+        for row in rows:
+            scanned += 1
+            try:
+                if _enrich_one(conn, s, row, lt_token=lt_token, probe_all=probe_all):
+                    wrote += 1
+            except HostUnavailable as e:
+                # circuit is open: later books fail fast without touching the host
+                defer_books(conn, [row["id"]], e)
+                deferred += 1
+                continue
+            time.sleep(sleep)
+
+    if deferred:
+        print(f"deferred {deferred} books to the retry queue (host unavailable)")
+    compact_change_log(conn)
     return scanned, wrote
 
+def enrich_db(db_path: str | Path, **kw) -> tuple[int, int]:
+    con = sqlite3.connect(str(db_path))
+    try:
+        return enrich(con, **kw)
+    finally:
+        con.close()
+
 def main():
     ap = argparse.ArgumentParser(description="Enrich catalog with reading levels: LT thingISBN expansion + OpenLibrary probe.")
     ap.add_argument("--db", default=str(DB_DEFAULT))
+    ap.add_argument("--shard", action="append",
+                    help="Enrich the named account shard instead of --db (can repeat)")
+    ap.add_argument("--all-shards", action="store_true",
+                    help="Enrich every shard under data/db/shards")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Shards enriched in parallel (one process each)")
     ap.add_argument("--lt-token", default=settings.LT_TOKEN, help="LibraryThing API token for thingISBN (optional but recommended)")
     ap.add_argument("--limit", type=int, default=500)
     ap.add_argument("--sleep", type=float, default=0.5)
+    ap.add_argument("--batch", type=int, default=0,
+                    help="Books per batched OpenLibrary round (multi-ISBN endpoints); "
+                         "0 = one book at a time")
     args = ap.parse_args()
 
     ensure_dirs()
-    con = sqlite3.connect(str(args.db))
-    try:
-        scanned, wrote = enrich(con, lt_token=args.lt_token, limit=args.limit, sleep=args.sleep)
+    kw = dict(lt_token=args.lt_token, limit=args.limit, sleep=args.sleep, batch=args.batch)
+    names = list_shards() if args.all_shards else (args.shard or [])
+    if not names:
+        scanned, wrote = enrich_db(args.db, **kw)
         print(f"scanned {scanned} books, wrote {wrote} level rows")
-    finally:
-        con.close()
+        return
+
+    # shards are separate SQLite files, so their writers never contend
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {name: pool.submit(enrich_db, shard_path(name), **kw) for name in names}
+        for name, fut in futures.items():
+            scanned, wrote = fut.result()
+            print(f"[{name}] scanned {scanned} books, wrote {wrote} level rows")
 
 if __name__ == "__main__":
     main()
@@ -3,7 +3,6 @@ from datetime import datetime
 import argparse
 import re
 
-from playwright.sync_api import sync_playwright
 from library_data.config import SECRETS_DIR, EXPORTS_DIR, ensure_dirs
 
 STATE = SECRETS_DIR / ".state.json"
@@ -81,6 +80,7 @@ def run_export(fmt="json", since=None, collections=None, tags=None, search=None,
     if not STATE.exists():
         raise SystemExit(f".state.json not found at {STATE}. Run your state capture first.")
     ensure_dirs()
+    from playwright.sync_api import sync_playwright  # heavy; only load when actually exporting
 
     out_name = build_filename(fmt, since, collections, tags, search)
     out_path = EXPORTS_DIR / out_name
@@ -2,7 +2,10 @@
 import argparse, json, sqlite3, sys
 from pathlib import Path
 from typing import Iterable
-from library_data.config import DB_PATH as DB_DEFAULT, ensure_dirs
+from library_data.config import DB_PATH as DB_DEFAULT, ensure_dirs, shard_path
+from library_data.lib.isbn_batch import collect_isbns13_batch
+from library_data.lib.marc import iter_marc_records, looks_like_marc
+from library_data.lib.sortkeys import date_key, title_key
 
 SCHEMA_SQL = """
 PRAGMA journal_mode=WAL;
@@ -19,12 +22,83 @@ CREATE TABLE IF NOT EXISTS books (
   subjects      TEXT,
   collections   TEXT,
   tags          TEXT,
-  raw_json      TEXT NOT NULL
+  raw_json      TEXT NOT NULL,
+  entry_key     TEXT,  -- sortkeys.date_key(entrydate): 'YYYY-MM-DD' or ''
+  title_key     TEXT   -- sortkeys.title_key(title)
 );
 
 CREATE INDEX IF NOT EXISTS idx_books_entrydate     ON books(entrydate);
 CREATE INDEX IF NOT EXISTS idx_books_title         ON books(title);
 CREATE INDEX IF NOT EXISTS idx_books_primaryauthor ON books(primaryauthor);
+
+-- normalized, checksum-validated ISBN-13s per book (pos keeps the record's preference order)
+CREATE TABLE IF NOT EXISTS book_isbns (
+  book_id TEXT NOT NULL,
+  isbn13  TEXT NOT NULL,
+  pos     INTEGER NOT NULL,
+  PRIMARY KEY (book_id, isbn13)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_book_isbns_isbn13 ON book_isbns(isbn13);
+
+-- markers for one-off backfills/migrations that must not be re-detected from table contents
+CREATE TABLE IF NOT EXISTS catalog_meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT
+) WITHOUT ROWID;
+
+-- change feed for downstream mirrors (lib_catalog.changes_since): one row per book change,
+-- seq only ever grows (AUTOINCREMENT never reuses ids, even after compaction).
+-- op: upsert | delete | levels (written by enrich_levels' book_levels triggers)
+CREATE TABLE IF NOT EXISTS change_log (
+  seq        INTEGER PRIMARY KEY AUTOINCREMENT,
+  book_id    TEXT NOT NULL,
+  op         TEXT NOT NULL,
+  changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_book ON change_log(book_id, seq);
+
+CREATE TRIGGER IF NOT EXISTS books_change_ai AFTER INSERT ON books BEGIN
+  INSERT INTO change_log (book_id, op) VALUES (new.id, 'upsert');
+END;
+-- re-ingesting an unchanged record is not a change
+CREATE TRIGGER IF NOT EXISTS books_change_au AFTER UPDATE ON books
+WHEN old.raw_json IS NOT new.raw_json BEGIN
+  INSERT INTO change_log (book_id, op) VALUES (new.id, 'upsert');
+END;
+CREATE TRIGGER IF NOT EXISTS books_change_ad AFTER DELETE ON books BEGIN
+  INSERT INTO change_log (book_id, op) VALUES (old.id, 'delete');
+END;
+"""
+
+# tables keyed by book_id that go with a deleted book (created by other stages, if present)
+BOOK_TABLES = ("book_isbns", "book_levels", "book_isbn_clusters", "enrich_attempts", "book_groups",
+               "book_similar")
+CHANGE_LOG_KEEP_DAYS = 7
+
+# after _migrate_sort_keys, so DBs created before these columns get them first.
+# Ordering indexes for filter_books/search_text; `id` breaks ties so keyset cursors are exact.
+SORT_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_books_entry_order ON books(entry_key DESC, title_key, id);
+CREATE INDEX IF NOT EXISTS idx_books_title_order ON books(title_key, id);
+"""
+
+# books whose "more like this" lists (scripts/similar.py) are stale. Created once by
+# _migrate_similar_queue so every writer of books feeds it from the first ingest on.
+SIMILAR_QUEUE_SQL = """
+CREATE TABLE book_similar_dirty (book_id TEXT PRIMARY KEY) WITHOUT ROWID;
+
+CREATE TRIGGER books_similar_ai AFTER INSERT ON books BEGIN
+  INSERT OR IGNORE INTO book_similar_dirty (book_id) VALUES (new.id);
+END;
+CREATE TRIGGER books_similar_au AFTER UPDATE OF genres, subjects, tags ON books
+WHEN old.genres IS NOT new.genres OR old.subjects IS NOT new.subjects
+  OR old.tags IS NOT new.tags BEGIN
+  INSERT OR IGNORE INTO book_similar_dirty (book_id) VALUES (new.id);
+END;
+CREATE TRIGGER books_similar_ad AFTER DELETE ON books BEGIN
+  INSERT OR IGNORE INTO book_similar_dirty (book_id) VALUES (old.id);
+END;
 """
 
 FTS_SQL = """
@@ -41,12 +115,117 @@ CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
 
 def ensure_db(conn: sqlite3.Connection):
     conn.executescript(SCHEMA_SQL)
+    _migrate_sort_keys(conn)
+    conn.executescript(SORT_INDEX_SQL)
+    _migrate_similar_queue(conn)
+    if conn.execute("SELECT 1 FROM change_log LIMIT 1").fetchone() is None:
+        # first run on a DB that predates the change log: seed it so a consumer starting
+        # from cursor 0 sees every existing book
+        conn.execute("INSERT INTO change_log (book_id, op)"
+                     " SELECT id, 'upsert' FROM books ORDER BY rowid")
+        if _has_table(conn, "book_levels"):
+            conn.execute("INSERT INTO change_log (book_id, op)"
+                         " SELECT book_id, 'levels' FROM book_levels ORDER BY rowid")
+    conn.commit()
+
+def _migrate_sort_keys(conn: sqlite3.Connection):
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(books)")}
+    if "entry_key" in cols:
+        return
+    conn.execute("ALTER TABLE books ADD COLUMN entry_key TEXT")
+    conn.execute("ALTER TABLE books ADD COLUMN title_key TEXT")
+    conn.create_function("date_key", 1, date_key, deterministic=True)
+    conn.create_function("title_key", 1, title_key, deterministic=True)
+    conn.execute("UPDATE books SET entry_key = date_key(entrydate), title_key = title_key(title)")
     conn.commit()
 
+def _migrate_similar_queue(conn: sqlite3.Connection):
+    if _has_table(conn, "book_similar_dirty"):
+        return
+    with conn:
+        conn.executescript("BEGIN;" + SIMILAR_QUEUE_SQL)
+        # lists built before the queue existed can't tell what changed since: redo them all
+        if _has_table(conn, "book_similar"):
+            conn.execute("INSERT INTO book_similar_dirty (book_id) SELECT id FROM books")
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (name,)).fetchone() is not None
+
+def get_meta(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str = "1"):
+    conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (?, ?)", (key, value))
+    conn.commit()
+
+def compact_change_log(conn: sqlite3.Connection, keep_days: int = CHANGE_LOG_KEEP_DAYS) -> int:
+    """
+    Drop change-log entries older than keep_days that a later entry for the same book
+    supersedes (a later upsert/delete supersedes book entries, a later levels entry
+    supersedes levels, a delete supersedes both). Consumers read current state for
+    each entry, so this loses nothing; it only bounds the log to ~one row per book.
+    """
+    cur = conn.execute("""
+      DELETE FROM change_log
+      WHERE changed_at < datetime('now', ?)
+        AND EXISTS (
+          SELECT 1 FROM change_log c2
+          WHERE c2.book_id = change_log.book_id AND c2.seq > change_log.seq
+            AND (c2.op = 'delete' OR (c2.op = 'levels') = (change_log.op = 'levels'))
+        )
+    """, (f"-{keep_days} days",))
+    conn.commit()
+    return cur.rowcount
+
+def delete_books(conn: sqlite3.Connection, ids: Iterable[str]) -> int:
+    """Remove books and their per-book rows; each delete lands in the change log."""
+    ids = [(bid,) for bid in ids]
+    _fts_unindex(conn, [bid for (bid,) in ids])
+    for table in BOOK_TABLES:
+        if _has_table(conn, table):
+            conn.executemany(f"DELETE FROM {table} WHERE book_id = ?", ids)
+    n = conn.executemany("DELETE FROM books WHERE id = ?", ids).rowcount
+    conn.commit()
+    return n
+
 def ensure_fts(conn: sqlite3.Connection):
     conn.executescript(FTS_SQL)
     conn.commit()
 
+FTS_COLUMNS = "title, summary, tags, subjects, genres, author"
+FTS_INSERT = f"INSERT INTO books_fts (rowid, {FTS_COLUMNS}) VALUES (?,?,?,?,?,?,?)"
+# books_fts is contentless: removing a row takes the values it was indexed with
+FTS_DELETE = (f"INSERT INTO books_fts (books_fts, rowid, {FTS_COLUMNS})"
+              " VALUES ('delete',?,?,?,?,?,?,?)")
+
+def _fts_values(rec: dict) -> tuple[str, ...]:
+    # pull minimal fields from raw_json to avoid schema drift
+    return (rec.get("title") or "",
+            rec.get("summary") or "",
+            ", ".join(rec.get("tags") or []),
+            ", ".join(_flatten_subjects(rec.get("subject"))),
+            ", ".join(rec.get("genre") or []),
+            rec.get("primaryauthor") or "")
+
+def _fts_rows(conn: sqlite3.Connection, ids: list[str]) -> list[tuple]:
+    """(rowid, *values) for the given books, as stored now."""
+    out = []
+    for bid in ids:
+        row = conn.execute("SELECT rowid, raw_json FROM books WHERE id = ?", (bid,)).fetchone()
+        if row:
+            out.append((row[0], *_fts_values(json.loads(row[1]))))
+    return out
+
+def _fts_unindex(conn: sqlite3.Connection, ids: list[str]):
+    """Drop the given books from books_fts (if built), before their rows change or go."""
+    if not _has_table(conn, "books_fts"):
+        return
+    rows = [r for r in _fts_rows(conn, ids)
+            if conn.execute("SELECT 1 FROM books_fts WHERE rowid = ?", (r[0],)).fetchone()]
+    conn.executemany(FTS_DELETE, rows)
+
 def _flatten_subjects(subj) -> list[str]:
     # subject can be { "0": [...], "2": [...], ... } or list; convert to flat unique strings
     out = []
@@ -112,11 +291,39 @@ def iter_records(json_path: Path):
             continue
         yield bid, rec
 
+def detect_format(path: Path) -> str:
+    """'marc' or 'json', by extension first and then by sniffing the first bytes."""
+    suffix = path.suffix.lower()
+    if suffix in (".mrc", ".marc"):
+        return "marc"
+    if suffix == ".json":
+        return "json"
+    with open(path, "rb") as fh:
+        head = fh.read(64)
+    return "marc" if looks_like_marc(head) else "json"
+
+def iter_export(path: Path, fmt: str = "auto"):
+    """Yield (books_id, record) from a JSON or MARC export; fmt='auto' detects it."""
+    if fmt == "auto":
+        fmt = detect_format(path)
+    if fmt == "marc":
+        return iter_marc_records(path)
+    return iter_records(path)
+
+def _write_isbns(cur: sqlite3.Cursor, ids: list[str], recs: list[dict]):
+    cur.executemany("DELETE FROM book_isbns WHERE book_id = ?", [(bid,) for bid in ids])
+    rows = []
+    for bid, isbns in zip(ids, collect_isbns13_batch(recs)):
+        rows += [(bid, isbn, pos) for pos, isbn in enumerate(isbns)]
+    cur.executemany(
+        "INSERT OR IGNORE INTO book_isbns (book_id, isbn13, pos) VALUES (?, ?, ?)", rows)
+
 def upsert_books(conn: sqlite3.Connection, items: Iterable[tuple[str, dict]], batch_size: int = 500):
     cur = conn.cursor()
     q = """
-    INSERT INTO books (id, entrydate, title, primaryauthor, language, pages, genres, subjects, collections, tags, raw_json)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    INSERT INTO books (id, entrydate, title, primaryauthor, language, pages, genres, subjects,
+                       collections, tags, raw_json, entry_key, title_key)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ON CONFLICT(id) DO UPDATE SET
       entrydate=excluded.entrydate,
       title=excluded.title,
@@ -127,10 +334,26 @@ def upsert_books(conn: sqlite3.Connection, items: Iterable[tuple[str, dict]], ba
       subjects=excluded.subjects,
       collections=excluded.collections,
       tags=excluded.tags,
-      raw_json=excluded.raw_json
+      raw_json=excluded.raw_json,
+      entry_key=excluded.entry_key,
+      title_key=excluded.title_key
     """
-    buf = []
+    buf, recs = [], []
     n = 0
+    fts = _has_table(conn, "books_fts")  # once built, keep it current
+
+    def flush():
+        ids = [row[0] for row in buf]
+        if fts:
+            _fts_unindex(conn, ids)
+        cur.executemany(q, buf)
+        _write_isbns(cur, ids, recs)
+        if fts:
+            cur.executemany(FTS_INSERT, _fts_rows(conn, ids))
+        conn.commit()
+        buf.clear()
+        recs.clear()
+
     for bid, rec in items:
         entrydate = rec.get("entrydate") or rec.get("date_entered")
         title = rec.get("title")
@@ -149,64 +372,103 @@ def upsert_books(conn: sqlite3.Connection, items: Iterable[tuple[str, dict]], ba
             tags = ""
         raw_json = json.dumps(rec, ensure_ascii=False)
 
-        buf.append((bid, entrydate, title, primaryauthor, language, pages, genres, subjects, collections, tags, raw_json))
+        buf.append((bid, entrydate, title, primaryauthor, language, pages, genres, subjects,
+                    collections, tags, raw_json, date_key(entrydate), title_key(title)))
+        recs.append(rec)
         if len(buf) >= batch_size:
-            cur.executemany(q, buf)
-            conn.commit()
             n += len(buf)
-            buf.clear()
+            flush()
     if buf:
-        cur.executemany(q, buf)
-        conn.commit()
         n += len(buf)
+        flush()
+    compact_change_log(conn)
+    return n
+
+def reindex_isbns(conn: sqlite3.Connection, batch_size: int = 2000) -> int:
+    """Rebuild book_isbns from raw_json (one-off for DBs ingested before the table existed)."""
+    cur = conn.cursor()
+    ids, recs, n = [], [], 0
+    for bid, raw in conn.execute("SELECT id, raw_json FROM books"):
+        ids.append(bid)
+        recs.append(json.loads(raw))
+        if len(ids) >= batch_size:
+            _write_isbns(cur, ids, recs)
+            n += len(ids)
+            ids.clear()
+            recs.clear()
+    if ids:
+        _write_isbns(cur, ids, recs)
+        n += len(ids)
+    conn.commit()
     return n
 
 def rebuild_fts(conn: sqlite3.Connection):
     ensure_fts(conn)
     cur = conn.cursor()
-    cur.execute("DELETE FROM books_fts")
-    # pull minimal fields from raw_json to avoid schema drift
-    rows = cur.execute("SELECT id, raw_json FROM books")
+    cur.execute("INSERT INTO books_fts (books_fts) VALUES ('delete-all')")
+    # keyed by books.rowid, which search_text joins on
+    rows = conn.execute("SELECT rowid, raw_json FROM books")
     batch = []
-    for _id, raw in rows:
-        rec = json.loads(raw)
-        title = rec.get("title") or ""
-        summary = rec.get("summary") or ""
-        tags = ", ".join(rec.get("tags") or [])
-        subjects = ", ".join(_flatten_subjects(rec.get("subject")))
-        genres = ", ".join(rec.get("genre") or [])
-        author = rec.get("primaryauthor") or ""
-        batch.append((title, summary, tags, subjects, genres, author))
+    for rid, raw in rows:
+        batch.append((rid, *_fts_values(json.loads(raw))))
         if len(batch) >= 1000:
-            cur.executemany("INSERT INTO books_fts (title, summary, tags, subjects, genres, author) VALUES (?,?,?,?,?,?)", batch)
-            conn.commit()
+            cur.executemany(FTS_INSERT, batch)
             batch.clear()
     if batch:
-        cur.executemany("INSERT INTO books_fts (title, summary, tags, subjects, genres, author) VALUES (?,?,?,?,?,?)", batch)
-        conn.commit()
+        cur.executemany(FTS_INSERT, batch)
+    conn.commit()
+
+def _track(items, seen: set[str]):
+    for bid, rec in items:
+        seen.add(bid)
+        yield bid, rec
 
 def main():
-    ap = argparse.ArgumentParser(description="Ingest LibraryThing JSON exports into SQLite.")
+    ap = argparse.ArgumentParser(
+        description="Ingest LibraryThing JSON or MARC exports into SQLite.")
     ap.add_argument("--db", default=str(DB_DEFAULT), help="Path to SQLite DB (default: data/db/catalog.db)")
-    ap.add_argument("--file", action="append", required=True, help="Path to export JSON file (can repeat)")
+    ap.add_argument("--shard", help="Ingest into the named account shard "
+                                    "(data/db/shards/<name>.db) instead of --db")
+    ap.add_argument("--file", action="append", help="Path to export JSON/MARC file (can repeat)")
+    ap.add_argument("--format", choices=["auto", "json", "marc"], default="auto",
+                    help="Export format (default: detect)")
     ap.add_argument("--rebuild-fts", action="store_true", help="Rebuild FTS5 index after ingest")
     ap.add_argument("--batch-size", type=int, default=500, help="Upsert batch size")
+    ap.add_argument("--reindex-isbns", action="store_true",
+                    help="Rebuild the book_isbns table from stored raw_json")
+    ap.add_argument("--prune", action="store_true",
+                    help="Delete books that are not in the given files "
+                         "(use with full exports only)")
     args = ap.parse_args()
+    if not args.file and not args.reindex_isbns:
+        ap.error("--file is required (unless only reindexing ISBNs)")
 
-    db_path = Path(args.db)
+    db_path = shard_path(args.shard) if args.shard else Path(args.db)
     ensure_dirs()
     conn = sqlite3.connect(str(db_path))
     try:
         ensure_db(conn)
         total = 0
-        for f in args.file:
+        seen: set[str] = set()
+        missing = False
+        for f in args.file or []:
             p = Path(f)
             if not p.exists():
                 print(f"skip (missing): {p}", file=sys.stderr)
+                missing = True
                 continue
-            n = upsert_books(conn, iter_records(p), batch_size=args.batch_size)
+            n = upsert_books(conn, _track(iter_export(p, args.format), seen),
+                             batch_size=args.batch_size)
             print(f"ingested {n} from {p}")
             total += n
+        if args.prune:
+            if missing or not seen:
+                print("not pruning: an input file was missing or empty", file=sys.stderr)
+            else:
+                gone = [bid for (bid,) in conn.execute("SELECT id FROM books") if bid not in seen]
+                print(f"pruned {delete_books(conn, gone)} books not in the export")
+        if args.reindex_isbns:
+            print(f"reindexed ISBNs for {reindex_isbns(conn)} books")
         if args.rebuild_fts:
             print("rebuilding FTS…")
             rebuild_fts(conn)
@@ -4,10 +4,9 @@ import sqlite3
 from pathlib import Path
 
 from library_data.config import DB_PATH, ensure_dirs
-from library_data.scripts.export_lt import run_export
-from library_data.scripts.settings import LT_TOKEN, UA
-from library_data.scripts.ingest import ensure_db, iter_records, upsert_books, rebuild_fts
-from library_data.scripts.enrich_levels import enrich
+
+# Stage modules (playwright, numpy, requests) are imported inside main() as each stage
+# runs, so a skipped or failing export doesn't pay for them.
 
 
 def _env_list(name: str) -> list[str] | None:
@@ -30,30 +29,62 @@ def main():
     tags = _env_list('TAGS')
     search = os.getenv('SEARCH')
 
-    out_path = run_export(fmt='json', since=since, collections=collections, tags=tags, search=search, headed=False)
+    export_file = os.getenv('EXPORT_FILE')
+    if export_file:
+        # skip the browser export and ingest an already-downloaded file
+        fmt = 'auto'
+        out_path = export_file
+    else:
+        from library_data.scripts.export_lt import run_export
+
+        fmt = os.getenv('EXPORT_FMT', 'json')
+        out_path = run_export(fmt=fmt, since=since, collections=collections, tags=tags,
+                              search=search, headed=False)
+
+    # Ingest exported JSON/MARC directly
+    from library_data.scripts.ingest import ensure_db, iter_export, rebuild_fts, upsert_books
 
-    # Ingest exported JSON directly
     p = Path(out_path)
     con = sqlite3.connect(str(DB_PATH))
     try:
         ensure_db(con)
-        n = upsert_books(con, iter_records(p))
+        n = upsert_books(con, iter_export(p, fmt))
         if os.getenv('REBUILD_FTS', 'false').lower() in ('1', 'true', 'yes'):
             rebuild_fts(con)
         print(f"nightly: ingested {n} from {p}")
     finally:
         con.close()
 
+    # Similar-books lists for books whose facets changed
+    from library_data.scripts.similar import refresh
+
+    con = sqlite3.connect(str(DB_PATH))
+    try:
+        print(f"nightly: refreshed similar books for {refresh(con)}")
+    finally:
+        con.close()
+
     # Enrich
+    from library_data.scripts.enrich_levels import enrich
+    from library_data.scripts.settings import LT_TOKEN
+
     con = sqlite3.connect(str(DB_PATH))
     try:
         limit = int(os.getenv('ENRICH_LIMIT', '500'))
         sleep = float(os.getenv('ENRICH_SLEEP', '0.5'))
-        scanned, wrote = enrich(con, lt_token=LT_TOKEN, limit=limit, sleep=sleep)
+        batch = int(os.getenv('ENRICH_BATCH', '0'))
+        scanned, wrote = enrich(con, lt_token=LT_TOKEN, limit=limit, sleep=sleep, batch=batch)
         print(f"nightly: enriched {wrote} (scanned {scanned})")
     finally:
         con.close()
 
+    # Columnar snapshot for catalog-wide statistics
+    from library_data.config import snapshot_path
+    from library_data.scripts.snapshot import build
+
+    out = snapshot_path(DB_PATH)
+    print(f"nightly: snapshot of {build(DB_PATH, out)} books -> {out}")
+
 
 if __name__ == '__main__':
     main()
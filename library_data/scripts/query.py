@@ -1,39 +1,137 @@
 import argparse
 import json
+import time
 from typing import Optional
 from pathlib import Path
-from library_data.config import DB_PATH as DEFAULT_DB
-from library_data.lib.lib_catalog import get_book, filter_books, search_text
+from library_data.config import DB_PATH as DEFAULT_DB, QUERY_SOCKET, list_shards, shard_path
+from library_data.lib.lib_catalog import (
+    changes_since, filter_books, find_by_isbn, get_book, search_text, similar_books,
+)
+from library_data.lib.query_client import DaemonUnavailable, QueryClient
+
+
+def _query(args, op: str, params: dict, local):
+    """Use the query daemon when one is serving this DB; else run the query in-process."""
+    if not args.no_daemon:
+        try:
+            with QueryClient(args.socket, db=args.db) as client:
+                return client.call(op, **params)
+        except DaemonUnavailable:
+            pass
+    return local()
 
 
 def cmd_get(args):
-    rec = get_book(args.db, args.id)
+    rec = _query(args, "get", {"id": args.id}, lambda: get_book(args.db, args.id))
     if not rec:
         print("{}")
         return
     print(json.dumps(rec, ensure_ascii=False, indent=2))
 
 
+def _range(s: str) -> tuple[int | None, int | None]:
+    """'8-10' -> (8, 10); '8' -> (8, 8); '8-' / '-10' leave that end open."""
+    lo, sep, hi = s.partition("-")
+    try:
+        lo_v = int(lo) if lo.strip() else None
+        hi_v = (int(hi) if hi.strip() else None) if sep else lo_v
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected N, N-M, N- or -M; got {s!r}")
+    return lo_v, hi_v
+
+
 def cmd_filter(args):
-    rows = filter_books(
-        args.db,
+    params = dict(
         tag=args.tag,
         genre=args.genre,
         collection=args.collection,
         date_added_after=args.date_added_after,
+        lexile=args.lexile,
+        grade=args.grade,
+        age=args.age,
         limit=args.limit,
     )
+    if args.collapse:
+        params["collapse"] = True
+    if args.cursor:
+        params["cursor"] = args.cursor
+    if args.all_shards:
+        from library_data.lib.shards import federated_filter_books
+
+        rows = federated_filter_books(list_shards(), **params)
+    else:
+        rows = _query(args, "filter", params, lambda: filter_books(args.db, **params))
     print(json.dumps(rows, ensure_ascii=False, indent=2))
 
 
 def cmd_search(args):
-    rows = search_text(args.db, args.query, args.limit)
+    if args.all_shards:
+        from library_data.lib.shards import federated_search_text
+
+        rows = federated_search_text(list_shards(), args.query, args.limit,
+                                     collapse=args.collapse, cursor=args.cursor)
+    else:
+        params = {"query": args.query, "limit": args.limit}
+        if args.collapse:
+            params["collapse"] = True
+        if args.cursor:
+            params["cursor"] = args.cursor
+        rows = _query(args, "search", params,
+                      lambda: search_text(args.db, args.query, args.limit,
+                                          collapse=args.collapse, cursor=args.cursor))
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+def cmd_isbn(args):
+    clusters = not args.no_clusters
+    rows = _query(args, "isbn", {"isbns": args.isbns, "clusters": clusters},
+                  lambda: find_by_isbn(args.db, args.isbns, clusters=clusters))
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+def cmd_similar(args):
+    rows = _query(args, "similar", {"id": args.id, "k": args.k},
+                  lambda: similar_books(args.db, args.id, args.k))
     print(json.dumps(rows, ensure_ascii=False, indent=2))
 
 
+def cmd_changes(args):
+    """Stream change-log entries as JSON lines; --follow keeps waiting for new ones."""
+    cursor = args.since
+    include_data = not args.no_data
+    while True:
+        params = {"since": cursor, "limit": args.limit, "include_data": include_data}
+        if args.follow:
+            params["wait"] = args.wait
+        rows = _query(args, "changes", params,
+                      lambda: changes_since(args.db, cursor, args.limit, include_data=include_data))
+        for r in rows:
+            print(json.dumps(r, ensure_ascii=False), flush=True)
+        if rows:
+            cursor = rows[-1]["seq"]
+        if len(rows) < args.limit:
+            if not args.follow:
+                break
+            if not rows:
+                time.sleep(1.0)  # poll interval when reading the DB directly
+
+
+def cmd_serve(args):
+    from library_data.scripts.query_daemon import serve  # asyncio server only loads here
+
+    serve(args.db, args.socket, workers=args.workers, cache_size=args.cache_size)
+
+
 def build_parser():
-    ap = argparse.ArgumentParser(description="Query the catalog (get/filter/search).")
+    ap = argparse.ArgumentParser(
+        description="Query the catalog (get/filter/search/isbn/similar/changes/serve).")
     ap.add_argument("--db", default=str(DEFAULT_DB), help="Path to SQLite DB")
+    ap.add_argument("--shard", help="Query the named account shard instead of --db")
+    ap.add_argument("--all-shards", action="store_true",
+                    help="filter/search: fan out over every shard and merge")
+    ap.add_argument("--socket", default=str(QUERY_SOCKET), help="Query daemon Unix socket")
+    ap.add_argument("--no-daemon", action="store_true",
+                    help="Query the DB directly even if a daemon is running")
     sub = ap.add_subparsers(dest="cmd", required=True)
 
     ap_get = sub.add_parser("get", help="Get full record by id")
@@ -45,20 +143,66 @@ def build_parser():
     ap_filter.add_argument("--genre")
     ap_filter.add_argument("--collection")
     ap_filter.add_argument("--date-added-after")
+    ap_filter.add_argument("--lexile", type=_range, help="Lexile range overlap, e.g. 600-800")
+    ap_filter.add_argument("--grade", type=_range, help="Grade range overlap, e.g. 3-5")
+    ap_filter.add_argument("--age", type=_range, help="Age range overlap, e.g. 8-10")
     ap_filter.add_argument("--limit", type=int, default=50)
+    ap_filter.add_argument("--cursor",
+                           help="Resume after a row: pass the last row's \"cursor\" "
+                                "for the next page")
+    ap_filter.add_argument("--collapse", action="store_true",
+                           help="One row per duplicate/edition group (library-data-dedup)")
     ap_filter.set_defaults(func=cmd_filter)
 
     ap_search = sub.add_parser("search", help="Search title/fts")
     ap_search.add_argument("query")
     ap_search.add_argument("--limit", type=int, default=25)
+    ap_search.add_argument("--cursor",
+                           help="Resume after a row: pass the last row's \"cursor\" "
+                                "for the next page")
+    ap_search.add_argument("--collapse", action="store_true",
+                           help="One row per duplicate/edition group (library-data-dedup)")
     ap_search.set_defaults(func=cmd_search)
 
+    ap_isbn = sub.add_parser("isbn", help="Find owned books by ISBN-10/13 (any formatting)")
+    ap_isbn.add_argument("isbns", nargs="+")
+    ap_isbn.add_argument("--no-clusters", action="store_true",
+                         help="Only match the book's own ISBNs")
+    ap_isbn.set_defaults(func=cmd_isbn)
+
+    ap_similar = sub.add_parser(
+        "similar", help="More like this: precomputed neighbours of a book (library-data-similar)")
+    ap_similar.add_argument("id")
+    ap_similar.add_argument("--k", type=int, default=10)
+    ap_similar.set_defaults(func=cmd_similar)
+
+    ap_changes = sub.add_parser("changes",
+                                help="Stream change-log entries (JSON lines) after a cursor")
+    ap_changes.add_argument("--since", type=int, default=0,
+                            help="Last seq already applied (0 = from the start)")
+    ap_changes.add_argument("--limit", type=int, default=1000, help="Entries per page")
+    ap_changes.add_argument("--follow", action="store_true", help="Keep waiting for new changes")
+    ap_changes.add_argument("--wait", type=float, default=20.0,
+                            help="Daemon long-poll seconds per empty page (--follow); "
+                                 "keep under the client's 30s timeout")
+    ap_changes.add_argument("--no-data", action="store_true",
+                            help="Omit current book/levels payloads")
+    ap_changes.set_defaults(func=cmd_changes)
+
+    ap_serve = sub.add_parser("serve",
+                              help="Run the query daemon (warm connections + cache) on --socket")
+    ap_serve.add_argument("--workers", type=int, default=4, help="SQLite worker threads")
+    ap_serve.add_argument("--cache-size", type=int, default=2048, help="Cached results (LRU)")
+    ap_serve.set_defaults(func=cmd_serve)
+
     return ap
 
 
 def main():
     ap = build_parser()
     args = ap.parse_args()
+    if args.shard:
+        args.db = str(shard_path(args.shard))
     args.func(args)
 
 
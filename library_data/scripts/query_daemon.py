@@ -0,0 +1,231 @@
+# scripts/query_daemon.py
+"""
+Long-running query daemon behind `library-data-query serve`.
+
+JSON-lines over a Unix socket: each request line is
+    {"id": <any>, "op": "<op>", "args": {...}, "db": "<path>"}
+with op one of get, get_many, filter, search, isbn, similar, changes, batch, ping,
+and gets one response line {"id": ..., "ok": true, "result": ...} or
+{"id": ..., "ok": false, "error": "..."}. Requests on one connection may be pipelined;
+responses carry the request id and are written as they complete.
+
+`changes` long-polls: with "wait": <seconds> an empty page is held until new entries are
+committed (or the wait runs out), without tying up a worker thread.
+
+An asyncio front end hands SQLite work to a bounded thread pool; each worker thread
+keeps its own warm connection, and results are cached until the DB files change.
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from library_data.lib.lib_catalog import (
+    changes_since,
+    filter_books,
+    find_by_isbn,
+    get_book,
+    search_text,
+    similar_books,
+)
+
+CHANGES_POLL = 0.25  # seconds between generation checks while a changes request waits
+CHANGES_MAX_WAIT = 60.0
+
+FILTER_KEYS = ("tag", "genre", "collection", "date_added_after", "lexile", "grade", "age", "limit",
+               "collapse", "cursor")
+
+
+class QueryService:
+    """Thread-safe dispatcher: per-thread connections plus a generation-checked LRU cache."""
+
+    def __init__(self, db_path: str | Path, *, cache_size: int = 2048):
+        self.db_path = Path(db_path).resolve()
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            self._local.con = con
+        return con
+
+    def generation(self) -> tuple:
+        # any committed write touches the DB or its WAL file
+        out = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(f"{self.db_path}{suffix}")
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    def call(self, op: str, args: dict) -> Any:
+        if op == "ping":
+            return {"db": str(self.db_path)}
+        if op == "batch":
+            return [self._call_one(r) for r in args.get("requests", [])]
+        key = (op, json.dumps(args, sort_keys=True))
+        gen = self.generation()
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == gen:
+                self._cache.move_to_end(key)
+                return hit[1]
+        result = self._run(op, args)
+        with self._lock:
+            self._cache[key] = (gen, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _call_one(self, req: dict) -> dict:
+        try:
+            return {"ok": True, "result": self.call(req.get("op", ""), req.get("args") or {})}
+        except Exception as e:  # per-item errors don't fail the whole batch
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    def _run(self, op: str, args: dict) -> Any:
+        con = self.conn()
+        if op == "get":
+            return get_book(con, args["id"])
+        if op == "get_many":
+            return {bid: get_book(con, bid) for bid in args["ids"]}
+        if op == "filter":
+            kw = {k: args[k] for k in FILTER_KEYS if args.get(k) is not None}
+            for dim in ("lexile", "grade", "age"):
+                if dim in kw:
+                    kw[dim] = tuple(kw[dim])
+            return filter_books(con, **kw)
+        if op == "search":
+            return search_text(con, args["query"], args.get("limit", 25),
+                               collapse=args.get("collapse", False), cursor=args.get("cursor"))
+        if op == "changes":
+            return changes_since(con, args.get("since", 0), args.get("limit", 1000),
+                                 include_data=args.get("include_data", True))
+        if op == "similar":
+            return similar_books(con, args["id"], args.get("k", 10))
+        if op == "isbn":
+            return find_by_isbn(con, args["isbns"], clusters=args.get("clusters", True))
+        raise ValueError(f"unknown op {op!r}")
+
+
+async def _wait_changes(service: QueryService, pool: ThreadPoolExecutor, gate: asyncio.Semaphore,
+                        args: dict):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(float(args["wait"]), CHANGES_MAX_WAIT)
+    gen = service.generation()
+    while loop.time() < deadline:
+        await asyncio.sleep(CHANGES_POLL)
+        if service.generation() == gen:
+            continue
+        gen = service.generation()
+        async with gate:
+            result = await loop.run_in_executor(pool, service.call, "changes", args)
+        if result:
+            return result
+    return []
+
+
+async def _handle(service: QueryService, pool: ThreadPoolExecutor, gate: asyncio.Semaphore,
+                  reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    wlock = asyncio.Lock()
+    tasks = set()
+
+    async def answer(line: bytes):
+        rid = None
+        try:
+            req = json.loads(line)
+            rid = req.get("id")
+            db = req.get("db")
+            if db and Path(db).resolve() != service.db_path:
+                raise LookupError(f"daemon serves {service.db_path}, not {db}")
+            op, args = req.get("op", ""), req.get("args") or {}
+            async with gate:
+                result = await loop.run_in_executor(pool, service.call, op, args)
+            if op == "changes" and not result and args.get("wait"):
+                result = await _wait_changes(service, pool, gate, args)
+            resp = {"id": rid, "ok": True, "result": result}
+        except Exception as e:
+            resp = {"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        data = (json.dumps(resp, ensure_ascii=False) + "\n").encode("utf-8")
+        async with wlock:
+            writer.write(data)
+            await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            t = asyncio.create_task(answer(line))
+            tasks.add(t)
+            t.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except asyncio.CancelledError:
+        pass  # shutting down with requests (e.g. a changes long-poll) still in flight
+    finally:
+        writer.close()
+
+
+def _claim_socket(socket_path: Path):
+    """Remove a stale socket file; refuse to start if a daemon is still answering on it."""
+    if not socket_path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    probe.settimeout(1.0)
+    try:
+        probe.connect(str(socket_path))
+    except (ConnectionRefusedError, FileNotFoundError):
+        socket_path.unlink(missing_ok=True)  # left behind by a daemon that didn't shut down
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"a query daemon is already serving on {socket_path}")
+
+
+async def _serve(service: QueryService, socket_path: Path, workers: int):
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="catalog-q")
+    gate = asyncio.Semaphore(workers * 4)  # bound queued work, not just running work
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    server = await asyncio.start_unix_server(
+        lambda r, w: _handle(service, pool, gate, r, w), path=str(socket_path), limit=1 << 24
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"serving {service.db_path} on {socket_path} ({workers} workers)", flush=True)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def serve(db_path: str | Path, socket_path: str | Path, *, workers: int = 4,
+          cache_size: int = 2048):
+    _claim_socket(Path(socket_path))
+    service = QueryService(db_path, cache_size=cache_size)
+    asyncio.run(_serve(service, Path(socket_path), workers))
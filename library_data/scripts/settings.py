@@ -1,10 +1,30 @@
 import os
-from dotenv import load_dotenv
 from library_data.config import DATA_ROOT
 
-# Load env from CWD (.env) and from data root if present; env vars override
-load_dotenv()  # default search from CWD upwards
-load_dotenv(DATA_ROOT / ".env")
+_loaded = False
 
-LT_TOKEN = os.getenv("LT_TOKEN")
-UA = os.getenv("UA", "library-data/levels (+mailto:you@example.com)")
+def load_env():
+    """
+    Load env from CWD (.env) and from data root if present; env vars override.
+    Runs once, on first access to a setting, so importing this module stays cheap.
+    """
+    global _loaded
+    if _loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()  # default search from CWD upwards
+    load_dotenv(DATA_ROOT / ".env")
+    _loaded = True
+
+_DEFAULTS = {
+    "LT_TOKEN": None,
+    "UA": "library-data/levels (+mailto:you@example.com)",
+}
+
+def __getattr__(name: str):
+    # LT_TOKEN, UA resolve lazily (PEP 562), after .env files are loaded
+    if name in _DEFAULTS:
+        load_env()
+        return os.getenv(name, _DEFAULTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
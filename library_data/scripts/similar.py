@@ -0,0 +1,256 @@
+# scripts/similar.py
+"""
+Precomputed "more like this" neighbours (book_similar), read by lib_catalog.similar_books().
+
+Each book is a sparse TF-IDF vector over its genres, subjects and tags (binary tf,
+L2-normalized, so dot products are cosines). Every term stays in the vectors; common
+ones simply get a low IDF. Neighbours come from a blocked sparse product against the
+term postings: rows are grouped into blocks whose expanded (row, posting) pair count
+stays under PAIR_BUDGET, and each block's pair scores are summed and cut to the top k
+per row with NumPy. A term on more than MAX_POSTINGS books would cost ~df**2 pairs, so
+only its MAX_POSTINGS highest-weight postings (the books with the fewest other terms)
+take part in the product; the term still counts in every book's norm, and a capped
+term adds to a pair's score only when both books hold one of its kept postings, which
+keeps scores symmetric.
+
+ingest.ensure_db's triggers queue a book in book_similar_dirty when it is inserted,
+deleted or its facets change; `refresh` recomputes only those books plus the books that
+listed them, and merges the changed books into everyone else's lists where they now
+rank. An empty book_similar is always built in full. IDF drifts slowly as the catalog
+grows, so run --full occasionally.
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+from library_data.config import DB_PATH as DB_DEFAULT
+from library_data.config import ensure_dirs, shard_path
+from library_data.scripts.ingest import ensure_db
+
+SIMILAR_SQL = """
+CREATE TABLE IF NOT EXISTS book_similar (
+  book_id    TEXT NOT NULL,
+  rank       INTEGER NOT NULL,
+  similar_id TEXT NOT NULL,
+  score      REAL NOT NULL,
+  PRIMARY KEY (book_id, rank)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_book_similar_similar ON book_similar(similar_id);
+"""
+
+FACETS = (("g", "genres"), ("s", "subjects"), ("t", "tags"))
+K = 20
+MAX_POSTINGS = 1000  # postings per term used in the pair product (see module docstring)
+PAIR_BUDGET = 4_000_000
+FULL_REBUILD_SHARE = 0.2  # refresh falls back to a full build past this share of dirty books
+
+def ensure_similar_table(conn: sqlite3.Connection):
+    conn.executescript(SIMILAR_SQL)
+    conn.commit()
+
+class Vectors:
+    """Row-major (CSR) TF-IDF vectors plus term postings (CSC) for every book."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        ids, terms, rows = [], {}, []
+        books = conn.execute("SELECT id, genres, subjects, tags FROM books ORDER BY rowid")
+        for bid, *vals in books:
+            toks = set()
+            for (prefix, _col), v in zip(FACETS, vals):
+                toks |= {f"{prefix}:{x.strip().lower()}" for x in (v or "").split(",") if x.strip()}
+            ids.append(bid)
+            rows.append([terms.setdefault(t, len(terms)) for t in toks])
+        self.ids = ids
+        self.pos = {bid: i for i, bid in enumerate(ids)}
+        n = len(ids)
+
+        lens = np.fromiter((len(r) for r in rows), dtype=np.int64, count=n)
+        cols = np.fromiter((t for r in rows for t in r), dtype=np.int64, count=int(lens.sum()))
+        owner = np.repeat(np.arange(n), lens)
+        df = np.bincount(cols, minlength=len(terms))
+        w = np.log(n / df[cols]).astype(np.float32)
+        norm = np.sqrt(np.bincount(owner, weights=w * w, minlength=n)).astype(np.float32)
+        w /= np.where(norm > 0, norm, 1)[owner]
+
+        # single-book terms can't pair; past MAX_POSTINGS keep a term's heaviest postings
+        by_term = np.lexsort((-w, cols))
+        first = np.concatenate([[0], np.cumsum(df)])[cols[by_term]]
+        rank = np.empty_like(cols)
+        rank[by_term] = np.arange(cols.size) - first
+        keep = (df[cols] >= 2) & (rank < MAX_POSTINGS)
+        cols, owner, w = cols[keep], owner[keep], w[keep]
+
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(owner, minlength=n))])
+        self.indices, self.data = cols, w
+        order = np.argsort(cols, kind="stable")
+        self.post_ptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=len(terms)))])
+        self.post_rows, self.post_w = owner[order], w[order]
+        self.df = np.diff(self.post_ptr)
+        self.cost = np.bincount(owner, weights=self.df[cols], minlength=n).astype(np.int64)
+
+        # don't recommend other editions/duplicates of the same work (scripts/dedup.py)
+        self.group = np.arange(n)
+        if conn.execute("SELECT 1 FROM sqlite_master"
+                        " WHERE type='table' AND name='book_groups'").fetchone():
+            for bid, gid in conn.execute("SELECT book_id, group_id FROM book_groups"):
+                if bid in self.pos and gid in self.pos:
+                    self.group[self.pos[bid]] = self.pos[gid]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def blocks(self, rows: np.ndarray):
+        """Split rows so each block expands to at most ~PAIR_BUDGET (row, posting) pairs."""
+        start, acc = 0, 0
+        for i, c in enumerate(self.cost[rows].tolist()):
+            if acc and acc + c > PAIR_BUDGET:
+                yield rows[start:i]
+                start, acc = i, 0
+            acc += c
+        if start < len(rows):
+            yield rows[start:]
+
+    def scores(self, block: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        All nonzero cosines for a block of rows: (row, other, score), self and same-group
+        pairs dropped.
+        """
+        lo, hi = self.indptr[block], self.indptr[block + 1]
+        nnz = hi - lo
+        q_owner = np.repeat(block, nnz)
+        q_start = lo - np.cumsum(np.concatenate([[0], nnz[:-1]]))
+        q_idx = np.repeat(q_start, nnz) + np.arange(nnz.sum())
+        q_term, q_w = self.indices[q_idx], self.data[q_idx]
+
+        counts = self.df[q_term]
+        rep = np.repeat(np.arange(q_term.size), counts)
+        p_start = self.post_ptr[q_term] - np.cumsum(np.concatenate([[0], counts[:-1]]))
+        p_idx = np.repeat(p_start, counts) + np.arange(counts.sum())
+        row, other = q_owner[rep], self.post_rows[p_idx]
+        contrib = q_w[rep] * self.post_w[p_idx]
+
+        key = row.astype(np.int64) * len(self) + other
+        order = np.argsort(key, kind="stable")
+        key = key[order]
+        if not key.size:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        first = np.concatenate([[True], key[1:] != key[:-1]])
+        total = np.add.reduceat(contrib[order], np.flatnonzero(first))
+        row, other = np.divmod(key[first], len(self))
+        keep = self.group[row] != self.group[other]
+        return row[keep], other[keep], total[keep]
+
+def top_k(row: np.ndarray, other: np.ndarray, score: np.ndarray, k: int):
+    if not row.size:
+        return row, other, score, row
+    # one float sort key: row-major, best score first within a row (cosines are in [0, 1])
+    order = np.argsort(row * 4.0 + (2.0 - score))
+    row, other, score = row[order], other[order], score[order]
+    start = np.concatenate([[True], row[1:] != row[:-1]])
+    rank = np.arange(row.size) - np.maximum.accumulate(np.where(start, np.arange(row.size), 0))
+    keep = rank < k
+    return row[keep], other[keep], score[keep], rank[keep]
+
+def _write_lists(conn, vec: Vectors, rows, others, scores, ranks):
+    ids = vec.ids
+    conn.executemany(
+        "INSERT INTO book_similar (book_id, rank, similar_id, score) VALUES (?,?,?,?)",
+        ((ids[r], rk, ids[o], float(s)) for r, o, s, rk
+         in zip(rows.tolist(), others.tolist(), scores.tolist(), ranks.tolist())),
+    )
+
+def build(conn: sqlite3.Connection, *, k: int = K) -> int:
+    """Recompute every neighbour list. Returns books indexed."""
+    ensure_db(conn)
+    ensure_similar_table(conn)
+    vec = Vectors(conn)
+    with conn:
+        conn.execute("DELETE FROM book_similar")
+        conn.execute("DELETE FROM book_similar_dirty")
+        for block in vec.blocks(np.arange(len(vec))):
+            _write_lists(conn, vec, *top_k(*vec.scores(block), k))
+    return len(vec)
+
+def refresh(conn: sqlite3.Connection, *, k: int = K) -> int:
+    """Recompute lists for books queued in book_similar_dirty. Returns books recomputed."""
+    ensure_db(conn)
+    ensure_similar_table(conn)
+    if conn.execute("SELECT 1 FROM book_similar LIMIT 1").fetchone() is None:
+        return build(conn, k=k)
+    dirty = [r[0] for r in conn.execute("SELECT book_id FROM book_similar_dirty")]
+    if not dirty:
+        return 0
+    vec = Vectors(conn)
+    if len(dirty) > FULL_REBUILD_SHARE * len(vec):
+        return build(conn, k=k)
+
+    # books whose lists mention a changed/deleted book must be recomputed too
+    referers = set()
+    for i in range(0, len(dirty), 500):
+        part = dirty[i:i + 500]
+        marks = ",".join("?" * len(part))
+        referers |= {r[0] for r in conn.execute(
+            f"SELECT DISTINCT book_id FROM book_similar WHERE similar_id IN ({marks})", part)}
+    recompute = sorted({vec.pos[b] for b in set(dirty) | referers if b in vec.pos})
+    changed = np.array(sorted(vec.pos[b] for b in dirty if b in vec.pos), dtype=np.int64)
+    in_recompute = np.zeros(len(vec), dtype=bool)
+    in_recompute[recompute] = True
+
+    with conn:
+        gone = [(b,) for b in set(dirty) | referers]
+        conn.executemany("DELETE FROM book_similar WHERE book_id = ?", gone)
+        for block in vec.blocks(np.array(recompute, dtype=np.int64)):
+            _write_lists(conn, vec, *top_k(*vec.scores(block), k))
+
+        # cosine is symmetric: a changed book's scores are every other book's score for it
+        merge: dict[int, list[tuple[float, int]]] = {}
+        for block in vec.blocks(changed):
+            row, other, score = vec.scores(block)
+            keep = ~in_recompute[other]
+            for r, o, s in zip(row[keep].tolist(), other[keep].tolist(), score[keep].tolist()):
+                merge.setdefault(o, []).append((s, r))
+        for o, cands in merge.items():
+            bid = vec.ids[o]
+            stored = conn.execute("SELECT similar_id, score FROM book_similar"
+                                  " WHERE book_id = ? ORDER BY rank", (bid,))
+            cur = [(s, vec.pos[sid]) for sid, s in stored if sid in vec.pos]
+            if len(cur) >= k and max(cands)[0] <= cur[-1][0]:
+                continue
+            best = sorted(cur + cands, key=lambda x: -x[0])[:k]
+            conn.execute("DELETE FROM book_similar WHERE book_id = ?", (bid,))
+            conn.executemany(
+                "INSERT INTO book_similar (book_id, rank, similar_id, score) VALUES (?,?,?,?)",
+                [(bid, rk, vec.ids[r], s) for rk, (s, r) in enumerate(best)],
+            )
+        conn.executemany("DELETE FROM book_similar_dirty WHERE book_id = ?", [(b,) for b in dirty])
+    return len(recompute)
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Build/refresh the precomputed similar-books (more like this) index.")
+    ap.add_argument("--db", default=str(DB_DEFAULT))
+    ap.add_argument("--shard", help="Index the named account shard instead of --db")
+    ap.add_argument("--full", action="store_true",
+                    help="Rebuild every list (default: only books changed since the last run)")
+    ap.add_argument("--k", type=int, default=K, help="Neighbours stored per book")
+    args = ap.parse_args()
+
+    ensure_dirs()
+    db_path = shard_path(args.shard) if args.shard else Path(args.db)
+    t0 = time.time()
+    conn = sqlite3.connect(str(db_path))
+    try:
+        if args.full:
+            n, verb = build(conn, k=args.k), "indexed"
+        else:
+            n, verb = refresh(conn, k=args.k), "refreshed"
+        print(f"{verb} {n} books ({time.time() - t0:.1f}s) -> {db_path}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
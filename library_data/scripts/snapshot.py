@@ -0,0 +1,141 @@
+# scripts/snapshot.py
+"""
+Materialize books + book_levels into a columnar snapshot (lib/columnar.py) and run
+catalog-wide statistics over it without touching SQLite.
+
+    library-data-snapshot                               # build SNAPSHOTS_DIR/catalog/
+    library-data-snapshot count genres --top 20
+    library-data-snapshot group language pages --agg mean max
+    library-data-snapshot hist lexile_min --bins 12
+
+The build streams rows in BATCH-sized pieces straight to the column files, so memory is
+bounded by one batch plus the string dictionaries. Rebuild after ingest/enrich; the
+new snapshot replaces the old one in a single rename.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from library_data.config import DB_PATH as DB_DEFAULT
+from library_data.config import ensure_dirs, shard_path, snapshot_path
+from library_data.lib.columnar import AGGS, Snapshot, SnapshotWriter
+
+BATCH = 50_000
+LEVELS = ("lexile_min", "lexile_max", "grade_min", "grade_max", "age_min", "age_max")
+LISTS = ("genres", "subjects", "collections", "tags")
+
+SCHEMA = {
+    "id": "bytes",
+    "entry_date": "int",    # YYYYMMDD from books.entry_key (00 for unknown month/day)
+    "entry_month": "int",   # YYYYMM
+    "entry_year": "int",
+    "pages": "int",
+    "language": "dict",
+    "primaryauthor": "dict",
+    **{c: "multi" for c in LISTS},
+    **{c: "int" for c in LEVELS},
+}
+
+def _split(v: str | None) -> list[str]:
+    return [x.strip() for x in (v or "").split(",") if x.strip()]
+
+def _date(key: str | None, width: int) -> int | None:
+    digits = (key or "").replace("-", "")[:width]
+    return int(digits) if len(digits) == width and digits.isdigit() else None
+
+def build(db_path: str | Path, out: str | Path) -> int:
+    """Write the snapshot for db_path to out. Returns the number of books."""
+    con = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+    try:
+        has_levels = con.execute("SELECT 1 FROM sqlite_master"
+                                 " WHERE type='table' AND name='book_levels'").fetchone()
+        levels = ", ".join(f"l.{c}" if has_levels else "NULL" for c in LEVELS)
+        join = "LEFT JOIN book_levels l ON l.book_id = b.id" if has_levels else ""
+        id_width = con.execute("SELECT MAX(LENGTH(CAST(id AS BLOB))) FROM books").fetchone()[0] or 1
+        w = SnapshotWriter(out, SCHEMA, source=str(db_path), id_width=id_width)
+        cur = con.execute(f"""
+          SELECT b.id, b.entry_key, b.pages, b.language, b.primaryauthor,
+                 b.genres, b.subjects, b.collections, b.tags, {levels}
+          FROM books b {join}
+          ORDER BY b.rowid
+        """)
+        while True:
+            rows = cur.fetchmany(BATCH)
+            if not rows:
+                break
+            cols = list(zip(*rows))
+            w.append({
+                "id": cols[0],
+                "entry_date": [_date(k, 8) for k in cols[1]],
+                "entry_month": [_date(k, 6) for k in cols[1]],
+                "entry_year": [_date(k, 4) for k in cols[1]],
+                "pages": cols[2],
+                "language": [v or None for v in cols[3]],
+                "primaryauthor": [v or None for v in cols[4]],
+                **{c: [_split(v) for v in cols[5 + i]] for i, c in enumerate(LISTS)},
+                **{c: cols[9 + i] for i, c in enumerate(LEVELS)},
+            })
+        w.close()
+        return w.rows
+    finally:
+        con.close()
+
+def _emit(obj):
+    json.dump(obj, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+def main():
+    ap = argparse.ArgumentParser(description="Columnar analytics snapshot of the catalog.")
+    ap.add_argument("--db", default=str(DB_DEFAULT))
+    ap.add_argument("--shard", help="Use the named account shard instead of --db")
+    ap.add_argument("--out", help="Snapshot directory (default: SNAPSHOTS_DIR/<db name>)")
+    sub = ap.add_subparsers(dest="cmd")
+    sub.add_parser("build", help="Build or replace the snapshot (default)")
+    sub.add_parser("info", help="Rows, build time and columns")
+    p = sub.add_parser("count", help="Books per value of a column")
+    p.add_argument("column")
+    p.add_argument("--top", type=int, default=25)
+    p = sub.add_parser("group", help="Aggregate a numeric column per value of another")
+    p.add_argument("key")
+    p.add_argument("value")
+    p.add_argument("--agg", nargs="+", choices=AGGS, default=["mean"])
+    p.add_argument("--top", type=int, default=25)
+    p = sub.add_parser("hist", help="Histogram of a numeric column")
+    p.add_argument("column")
+    p.add_argument("--bins", type=int, default=10)
+    p.add_argument("--range", type=float, nargs=2, metavar=("LO", "HI"))
+    args = ap.parse_args()
+
+    ensure_dirs()
+    db_path = shard_path(args.shard) if args.shard else Path(args.db)
+    out = Path(args.out) if args.out else snapshot_path(db_path)
+
+    if args.cmd in (None, "build"):
+        t0 = time.time()
+        n = build(db_path, out)
+        print(f"snapshot of {n} books ({time.time() - t0:.1f}s) -> {out}")
+        return
+    if not (out / "meta.json").exists():
+        raise SystemExit(f"no snapshot at {out}; run library-data-snapshot build first")
+    snap = Snapshot(out)
+    try:
+        if args.cmd == "info":
+            meta = {k: v for k, v in snap.meta.items() if k != "columns"}
+            _emit(meta | {"columns": snap.columns})
+        elif args.cmd == "count":
+            _emit([{"key": k, "count": n} for k, n in snap.count_by(args.column, top=args.top)])
+        elif args.cmd == "group":
+            _emit(snap.group_by(args.key, args.value, args.agg, top=args.top))
+        else:
+            rng = tuple(args.range) if args.range else None
+            counts, edges = snap.histogram(args.column, args.bins, rng)
+            _emit([{"lo": float(a), "hi": float(b), "count": int(c)}
+                   for a, b, c in zip(edges, edges[1:], counts)])
+    except (KeyError, ValueError) as e:
+        raise SystemExit(str(e.args[0]))
+
+if __name__ == "__main__":
+    main()
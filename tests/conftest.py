@@ -0,0 +1,20 @@
+import sqlite3
+
+import pytest
+
+from library_data.scripts.ingest import ensure_db, upsert_books
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """make_db({id: LT-export record, ...}) -> path of a freshly ingested catalog DB."""
+    def make(records: dict, name: str = "catalog.db"):
+        path = tmp_path / name
+        con = sqlite3.connect(path)
+        try:
+            ensure_db(con)
+            upsert_books(con, records.items())
+        finally:
+            con.close()
+        return path
+    return make
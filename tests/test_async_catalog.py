@@ -0,0 +1,143 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from library_data.lib import lib_catalog
+from library_data.lib.async_catalog import AsyncCatalog
+
+SLOW_SQL = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT COUNT(*) FROM n"
+
+
+@pytest.fixture
+def db(make_db):
+    return make_db({"1": {"title": "Dune", "entrydate": "2020-01-01"},
+                    "2": {"title": "Emma", "entrydate": "2021-01-01"}})
+
+
+def _blocking(calls, release, result=None):
+    # stand-in for a lib_catalog query that waits until the test lets it finish
+    def filter_books(con, **kw):
+        calls.append(kw)
+        release.wait(5)
+        return result
+    return filter_books
+
+
+def test_same_results_as_lib_catalog(db):
+    async def main():
+        async with AsyncCatalog(db, max_workers=2) as cat:
+            return await asyncio.gather(cat.get_book("1"), cat.filter_books(limit=5),
+                                        cat.search_text("emma"))
+
+    book, rows, hits = asyncio.run(main())
+    assert book == lib_catalog.get_book(db, "1")
+    assert rows == lib_catalog.filter_books(db, limit=5)
+    assert [r["id"] for r in hits] == ["2"]
+
+
+def test_identical_concurrent_queries_run_once(db, monkeypatch):
+    calls, release = [], threading.Event()
+    monkeypatch.setattr(lib_catalog, "filter_books", _blocking(calls, release, ["rows"]))
+
+    async def main():
+        async with AsyncCatalog(db) as cat:
+            same = [asyncio.ensure_future(cat.filter_books(tag="x")) for _ in range(5)]
+            other = asyncio.ensure_future(cat.filter_books(tag="y"))
+            await asyncio.sleep(0.05)
+            release.set()
+            return await asyncio.gather(*same), await other
+
+    same, other = asyncio.run(main())
+    assert same == [["rows"]] * 5 and other == ["rows"]
+    assert sorted(c["tag"] for c in calls) == ["x", "y"]
+
+
+def test_cancelling_one_waiter_keeps_the_shared_query(db, monkeypatch):
+    calls, release = [], threading.Event()
+    monkeypatch.setattr(lib_catalog, "filter_books", _blocking(calls, release, ["rows"]))
+
+    async def main():
+        async with AsyncCatalog(db) as cat:
+            a = asyncio.ensure_future(cat.filter_books(tag="x"))
+            b = asyncio.ensure_future(cat.filter_books(tag="x"))
+            await asyncio.sleep(0.05)
+            a.cancel()
+            release.set()
+            return await b, a.cancelled()
+
+    assert asyncio.run(main()) == (["rows"], True)
+    assert len(calls) == 1
+
+
+def test_cancelling_last_waiter_interrupts_running_query(db, monkeypatch):
+    started, errors = threading.Event(), []
+
+    def filter_books(con, **kw):
+        started.set()
+        try:
+            return con.execute(SLOW_SQL).fetchone()
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+            raise
+
+    monkeypatch.setattr(lib_catalog, "filter_books", filter_books)
+
+    async def main():
+        async with AsyncCatalog(db, max_workers=1) as cat:
+            task = asyncio.ensure_future(cat.filter_books())
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # the worker is free again for the next query
+            return await asyncio.wait_for(cat.get_book("2"), 5)
+
+    assert asyncio.run(main())["title"] == "Emma"
+    assert errors == ["interrupted"]
+
+
+def test_cancelled_queued_query_never_runs(db, monkeypatch):
+    calls, release = [], threading.Event()
+    monkeypatch.setattr(lib_catalog, "filter_books", _blocking(calls, release))
+
+    async def main():
+        async with AsyncCatalog(db, max_workers=1) as cat:
+            busy = asyncio.ensure_future(cat.filter_books(tag="busy"))
+            queued = asyncio.ensure_future(cat.filter_books(tag="queued"))
+            await asyncio.sleep(0.05)
+            queued.cancel()
+            release.set()
+            await busy
+
+    asyncio.run(main())
+    assert [c["tag"] for c in calls] == ["busy"]
+
+
+def test_cancel_before_the_statement_starts_still_stops_it(db, monkeypatch):
+    ready, cancelled, errors = threading.Event(), threading.Event(), []
+
+    def filter_books(con, **kw):
+        ready.set()
+        cancelled.wait(5)  # the interrupt lands while no statement is running
+        try:
+            return con.execute(SLOW_SQL).fetchone()
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+            raise
+
+    monkeypatch.setattr(lib_catalog, "filter_books", filter_books)
+
+    async def main():
+        async with AsyncCatalog(db, max_workers=1) as cat:
+            task = asyncio.ensure_future(cat.filter_books())
+            await asyncio.get_running_loop().run_in_executor(None, ready.wait, 5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            cancelled.set()
+            return await asyncio.wait_for(cat.get_book("2"), 5)
+
+    assert asyncio.run(main())["title"] == "Emma"
+    assert errors == ["interrupted"]
@@ -0,0 +1,85 @@
+import sqlite3
+
+from library_data.lib.lib_catalog import changes_since, search_text
+from library_data.scripts import enrich_levels
+from library_data.scripts.ingest import (
+    compact_change_log,
+    delete_books,
+    rebuild_fts,
+    upsert_books,
+)
+
+
+def _ops(db, cursor=0):
+    return [(r["book_id"], r["op"]) for r in changes_since(db, cursor, include_data=False)]
+
+
+def test_upserts_levels_and_deletes_in_order(make_db):
+    db = make_db({"1": {"title": "A"}, "2": {"title": "B"}})
+    con = sqlite3.connect(db)
+    upsert_books(con, [("1", {"title": "A"})])           # unchanged: not a change
+    upsert_books(con, [("2", {"title": "B, revised"})])
+    enrich_levels.ensure_table(con)
+    enrich_levels._store_levels(con, "1", {"age_min": 8, "age_max": 12}, {})
+    enrich_levels._store_levels(con, "1", {"age_min": 8}, {})  # same levels: not a change
+    delete_books(con, ["1"])
+    con.close()
+
+    assert _ops(db) == [("1", "upsert"), ("2", "upsert"), ("2", "upsert"), ("1", "levels"),
+                        ("1", "delete")]
+    rows = changes_since(db, 0)
+    assert rows[2]["book"] == {"title": "B, revised"}
+    assert rows[0]["book"] is None              # deleted since: consumers read current state
+    assert rows[3]["levels"] is None
+    assert [r["seq"] for r in rows] == sorted(r["seq"] for r in rows)
+
+
+def test_paging_by_cursor(make_db):
+    db = make_db({str(i): {"title": f"T{i}"} for i in range(5)})
+    seen, cursor = [], 0
+    while page := changes_since(db, cursor, limit=2):
+        seen += [r["book_id"] for r in page]
+        cursor = page[-1]["seq"]
+    assert seen == [str(i) for i in range(5)]
+    assert changes_since(db, cursor) == []
+
+
+def test_compaction_keeps_latest_entry_per_book(make_db):
+    db = make_db({"1": {"title": "A"}, "2": {"title": "B"}})
+    con = sqlite3.connect(db)
+    upsert_books(con, [("1", {"title": "A2"}), ("1", {"title": "A3"})])
+    enrich_levels.ensure_table(con)
+    enrich_levels._store_levels(con, "2", {"grade_min": 3}, {})
+    delete_books(con, ["2"])
+    assert compact_change_log(con) == 0          # recent entries are kept for live consumers
+    last = con.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+    con.execute("UPDATE change_log SET changed_at = datetime('now', '-30 days')")
+    con.commit()
+    assert compact_change_log(con) == 4
+    upsert_books(con, [("3", {"title": "C"})])
+    con.close()
+
+    rows = changes_since(db, 0, include_data=False)
+    assert [(r["book_id"], r["op"]) for r in rows] == [
+        ("1", "upsert"), ("2", "delete"), ("3", "upsert")]
+    assert rows[-1]["seq"] == last + 1           # seq never goes back after compaction
+
+
+def test_search_after_prune_and_reuse_of_rowid(make_db):
+    db = make_db({"1": {"title": "Apples"}, "2": {"title": "Bananas"},
+                  "3": {"title": "Cherries"}})
+    con = sqlite3.connect(db)
+    rebuild_fts(con)
+    delete_books(con, ["3"])
+    upsert_books(con, [("9", {"title": "Zulu zebras"}),          # takes over book 3's rowid
+                       ("2", {"title": "Blackberries"})])
+    con.close()
+    assert search_text(db, "cherries") == []
+    assert [r["id"] for r in search_text(db, "zebras")] == ["9"]
+    assert search_text(db, "bananas") == []
+    assert [r["id"] for r in search_text(db, "blackberries")] == ["2"]
+
+    con = sqlite3.connect(db)
+    rebuild_fts(con)  # a contentless table can't take DELETE FROM
+    con.close()
+    assert [r["id"] for r in search_text(db, "zebras")] == ["9"]
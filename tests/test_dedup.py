@@ -0,0 +1,70 @@
+import sqlite3
+
+import numpy as np
+
+from library_data.lib import minhash
+from library_data.scripts.dedup import dedup
+
+
+def _groups(db):
+    con = sqlite3.connect(db)
+    rows = con.execute("SELECT book_id, group_id FROM book_groups").fetchall()
+    out: dict[str, set] = {}
+    for bid, gid in rows:
+        out.setdefault(gid, set()).add(bid)
+    return sorted(sorted(g) for g in out.values())
+
+
+def test_same_title_different_author_is_not_merged(make_db):
+    db = make_db({
+        "1": {"title": "Selected Poems", "primaryauthor": "Frost, Robert"},
+        "2": {"title": "Selected Poems", "primaryauthor": "Dickinson, Emily"},
+        "3": {"title": "Collected Stories", "primaryauthor": "Welty, Eudora"},
+        "4": {"title": "Collected Stories", "primaryauthor": "Cheever, John"},
+        "5": {"title": "Dune", "primaryauthor": "Herbert, Frank"},
+        "6": {"title": "Dune (Penguin Galaxy)", "primaryauthor": "Frank Herbert"},
+        # no author on either: the shared ISBN vouches for them; the title alone doesn't
+        "7": {"title": "The Hobbit", "isbn": ["9780261102217"]},
+        "8": {"title": "Hobbit", "isbn": ["9780261102217"]},
+        "9": {"title": "Hobbit"},
+    })
+    dedup(db, jobs=1)
+    assert _groups(db) == [["5", "6"], ["7", "8"]]
+
+
+def test_chain_of_similar_pairs_does_not_merge_end_to_end():
+    # A~B and B~C clear the threshold, A~C (Jaccard 0.25) doesn't
+    sets = [{f"x{i}" for i in range(a, a + 100)} for a in (0, 30, 60)]
+    sig = minhash.signatures(sets, minhash.permutations(256))
+    pairs = np.array([[0, 1], [1, 2]])
+    assert (minhash.agreement(sig, pairs) >= 0.45).all()
+    label = minhash.group_pairs(3, pairs, sig, threshold=0.45)
+    assert label[0] != label[2]
+    assert label[1] in (label[0], label[2])
+
+
+def test_identity_keys_gate_candidates():
+    authors = ("Frost, Robert", "Dickinson, Emily", "Robert Frost")
+    toks = [minhash.book_tokens("Selected Poems", a) for a in authors]
+    sig = minhash.signatures(toks, minhash.permutations())
+    keys = np.array([minhash.identity_keys(a) for a in authors])
+    pairs = minhash.candidate_pairs(sig, threshold=0.3, keys=keys)
+    assert pairs.tolist() == [[0, 2]]
+
+
+def test_series_volumes_by_one_author_stay_separate(make_db):
+    db = make_db({
+        "1": {"title": "The Lord of the Rings: The Fellowship of the Ring",
+              "primaryauthor": "Tolkien, J. R. R."},
+        "2": {"title": "The Lord of the Rings: The Return of the King",
+              "primaryauthor": "Tolkien, J. R. R."},
+        "3": {"title": "The Lord of the Rings: The Two Towers",
+              "primaryauthor": "Tolkien, J. R. R."},
+        "4": {"title": "Dune", "primaryauthor": "Herbert, Frank"},
+        "5": {"title": "Dune Messiah", "primaryauthor": "Herbert, Frank"},
+        "6": {"title": "Fellowship of the Ring (Lord of the Rings, Part 1)",
+              "primaryauthor": "J. R. R. Tolkien"},
+        "7": {"title": "The Fellowship of the Ring", "primaryauthor": "Tolkien, J.R.R."},
+    })
+    dedup(db, jobs=1)
+    assert _groups(db) == [["6", "7"]]
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from library_data.scripts import enrich_levels
+from library_data.scripts.enrich_levels import DAY, REFRESH_FOUND, ensure_table, record_attempt
+
+
+def _next_eligible(con, bid):
+    return con.execute("SELECT attempts, next_eligible - last_attempt FROM enrich_attempts"
+                       " WHERE book_id = ?", (bid,)).fetchone()
+
+
+def test_backoff_schedule(make_db):
+    con = sqlite3.connect(make_db({"1": {"title": "A"}, "2": {"title": "B"}}))
+    ensure_table(con)
+    for _ in range(3):
+        record_attempt(con, "1", "empty")
+    assert _next_eligible(con, "1") == (3, 4 * DAY)
+    record_attempt(con, "2", "found")
+    assert _next_eligible(con, "2") == (1, REFRESH_FOUND)
+
+
+def test_queue_order_skips_books_not_yet_due(make_db, monkeypatch):
+    db = make_db({b: {"title": b} for b in ("new", "stale", "empty", "waiting", "deferred")})
+    con = sqlite3.connect(db)
+    ensure_table(con)
+    now = time.time()
+    con.executemany("INSERT INTO enrich_attempts (book_id, outcome, attempts, next_eligible)"
+                    " VALUES (?,?,?,?)", [
+        ("stale", "found", 1, now - 10),
+        ("empty", "empty", 2, now - 20),
+        ("waiting", "empty", 1, now + DAY),
+        ("deferred", "deferred", 0, now - 5),
+    ])
+    con.commit()
+    con.close()
+
+    seen = []
+    monkeypatch.setattr(enrich_levels, "_enrich_one",
+                        lambda conn, s, row, **kw: seen.append(row["id"]))
+    scanned, _ = enrich_levels.enrich_db(db, lt_token=None, limit=10, sleep=0)
+    assert scanned == 4
+    assert seen == ["new", "deferred", "stale", "empty"]
+
+
+def test_level_rows_are_backfilled_once(make_db):
+    con = sqlite3.connect(make_db({"1": {"title": "A"}, "2": {"title": "B"}}))
+    ensure_table(con)
+    # a catalog enriched before attempts were tracked
+    con.execute("INSERT INTO book_levels (book_id, lexile_min) VALUES ('1', 500)")
+    con.execute("DELETE FROM catalog_meta WHERE key = 'enrich_attempts_backfilled'")
+    ensure_table(con)
+    assert _next_eligible(con, "1") == (1, REFRESH_FOUND)
+    con.execute("INSERT INTO book_levels (book_id, lexile_min) VALUES ('2', 600)")
+    ensure_table(con)
+    assert _next_eligible(con, "2") is None
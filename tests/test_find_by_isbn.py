@@ -0,0 +1,37 @@
+import sqlite3
+
+from library_data.lib.lib_catalog import find_by_isbn
+from library_data.scripts import enrich_levels
+
+
+def test_direct_and_cluster_matches(make_db):
+    db = make_db({
+        "1": {"title": "Sorcerer's Stone", "isbn": ["0439708184"]},
+        "2": {"title": "Unrelated", "isbn": ["9780306406157"]},
+    })
+    con = sqlite3.connect(db)
+    enrich_levels.ensure_table(con)
+    enrich_levels.store_cluster(con, "1", ["9780747532699"])  # UK edition of book 1
+    con.commit()
+    con.close()
+
+    rows = find_by_isbn(db, ["0-439-70818-4", "978-0-7475-3269-9", "not an isbn"])
+    assert [(r["isbn"], r["id"], r["match"]) for r in rows] == [
+        ("0-439-70818-4", "1", "direct"),
+        ("978-0-7475-3269-9", "1", "cluster"),
+    ]
+    assert find_by_isbn(db, "9780747532699", clusters=False) == []
+
+
+def test_without_cluster_table(make_db):
+    db = make_db({"1": {"title": "A", "isbn": ["9780306406157"]}})
+    assert [r["id"] for r in find_by_isbn(db, "0306406152")] == ["1"]
+
+
+def test_cluster_backfill_runs_once(make_db, monkeypatch):
+    db = make_db({"1": {"title": "A"}})
+    calls = []
+    monkeypatch.setattr(enrich_levels, "backfill_clusters", lambda conn: calls.append(1))
+    for _ in range(3):
+        enrich_levels.enrich_db(db, lt_token=None, limit=0, sleep=0)
+    assert calls == [1]
@@ -0,0 +1,49 @@
+import pytest
+
+from library_data.lib.isbn_utils import HostScheduler, HostUnavailable
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, **kw):
+        self.calls += 1
+        return FakeResponse(self.statuses.pop(0) if self.statuses else 200)
+
+
+def test_retries_then_succeeds():
+    sched = HostScheduler(max_retries=3, base_delay=0.0)
+    s = FakeSession([503, 429])
+    assert sched.request("https://openlibrary.org/x", session=s).status_code == 200
+    assert s.calls == 3
+
+
+def test_circuit_opens_and_fails_fast():
+    sched = HostScheduler(max_retries=1, base_delay=0.0, failure_threshold=3, cooldown=300)
+    s = FakeSession([500] * 10)
+    with pytest.raises(HostUnavailable):
+        sched.request("https://openlibrary.org/x", session=s)
+    with pytest.raises(HostUnavailable) as e:
+        sched.request("https://openlibrary.org/x", session=s)
+    assert s.calls == 3  # third failure opened the circuit; no fourth request
+    assert e.value.host == "openlibrary.org" and e.value.reason == "HTTP 500"
+    # other hosts are unaffected
+    r = sched.request("https://www.librarything.com/y", session=FakeSession([]))
+    assert r.status_code == 200
+
+
+def test_long_retry_after_defers_instead_of_sleeping():
+    sched = HostScheduler(max_retries=3, max_delay=60)
+    s = FakeSession([])
+    s.request = lambda method, url, **kw: FakeResponse(429, {"Retry-After": "120"})
+    with pytest.raises(HostUnavailable) as e:
+        sched.request("https://openlibrary.org/x", session=s)
+    assert e.value.reason == "HTTP 429"
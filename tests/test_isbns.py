@@ -0,0 +1,33 @@
+import sqlite3
+
+from library_data.lib.isbn_batch import collect_isbns13, normalize_isbns
+from library_data.scripts import enrich_levels
+
+
+def test_normalize_isbns():
+    raw = ["0-439-70818-4", "978-0-306-40615-7", "0439708185", "12345", "", "979-10-90636-07-1"]
+    assert normalize_isbns(raw) == [
+        "9780439708180", "9780306406157", None, None, None, "9791090636071",
+    ]
+
+
+def test_collect_isbns13_dedups_in_record_order():
+    rec = {"isbn": {"0": "0439708184", "1": "9780439708180"}, "ean": ["9780306406157"],
+           "upc": "036000291452"}
+    assert collect_isbns13(rec) == ["9780439708180", "9780306406157"]
+
+
+def test_ingest_writes_book_isbns(make_db):
+    db = make_db({"1": {"title": "A", "isbn": ["0-439-70818-4"]}, "2": {"title": "B"}})
+    con = sqlite3.connect(db)
+    rows = con.execute("SELECT book_id, isbn13 FROM book_isbns").fetchall()
+    assert rows == [("1", "9780439708180")]
+
+
+def test_isbn_backfill_runs_once_without_isbns(make_db, monkeypatch):
+    db = make_db({"1": {"title": "No ISBN"}, "2": {"title": "Also none"}})
+    calls = []
+    monkeypatch.setattr(enrich_levels, "reindex_isbns", lambda conn: calls.append(1))
+    for _ in range(3):
+        enrich_levels.enrich_db(db, lt_token=None, limit=0, sleep=0)
+    assert calls == [1]
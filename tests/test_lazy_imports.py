@@ -0,0 +1,18 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "check_import_time",
+    Path(__file__).resolve().parents[1] / "benchmarks" / "check_import_time.py")
+check_import_time = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(check_import_time)
+
+
+# timings are machine-dependent (make import-check); which modules load is not
+@pytest.mark.parametrize("module", sorted(check_import_time.BUDGETS))
+def test_entry_points_do_not_load_heavy_deps(module):
+    _ms, loaded = check_import_time.measure(module)
+    forbidden = check_import_time.BUDGETS[module][1]
+    assert not set(forbidden) & loaded
@@ -0,0 +1,86 @@
+import sqlite3
+
+from library_data.lib.lib_catalog import filter_books
+from library_data.scripts.enrich_levels import _store_levels, ensure_table, parse_levels_rich
+
+
+def test_ranges_and_singles():
+    obj = {
+        "subjects": ["Fantasy", "Juvenile fiction", "Lexile 650-800", "Grade 4"],
+        "description": {"value": "Recommended for ages 8-12."},
+    }
+    assert parse_levels_rich(obj) == {
+        "lexile_min": 650, "lexile_max": 800,
+        "grade_min": 4, "grade_max": 4,
+        "age_min": 8, "age_max": 12,
+    }
+
+
+def test_first_match_per_key_wins():
+    obj = {"subjects": ["Ages 9-11", "Ages 5-6", "720L"], "notes": "Lexile 900-1000"}
+    assert parse_levels_rich(obj) == {
+        "age_min": 9, "age_max": 11, "lexile_min": 720, "lexile_max": 720}
+
+
+def test_no_levels():
+    assert parse_levels_rich(None) == {}
+    assert parse_levels_rich({"subjects": ["Dragons", "Magic"], "description": "A quest."}) == {}
+
+
+def test_inverted_range_is_normalized():
+    assert parse_levels_rich({"subjects": ["Ages 12-8"]}) == {"age_min": 8, "age_max": 12}
+
+
+def _levels_db(make_db):
+    db = make_db({"1": {"title": "A"}, "2": {"title": "B"}})
+    return db, sqlite3.connect(db)
+
+
+def test_inverted_levels_store_and_filter(make_db):
+    db, con = _levels_db(make_db)
+    ensure_table(con)
+    # merged from two sources, min ends up above max; must not abort the run
+    _store_levels(con, "1", {"age_min": 12, "age_max": 8}, {})
+    _store_levels(con, "2", {"lexile_min": 900, "lexile_max": 700}, {})
+    con.close()
+    assert [r["id"] for r in filter_books(db, age=(10, 10))] == ["1"]
+    assert [r["id"] for r in filter_books(db, lexile=(800, 800))] == ["2"]
+
+
+def test_index_rebuild_fixes_stored_inverted_rows(make_db):
+    db, con = _levels_db(make_db)
+    # enriched before the R*Tree existed
+    con.execute("CREATE TABLE book_levels (book_id TEXT PRIMARY KEY, "
+                "lexile_min INTEGER, lexile_max INTEGER, grade_min INTEGER, grade_max INTEGER, "
+                "age_min INTEGER, age_max INTEGER, source TEXT, raw_json TEXT, "
+                "updated_at TEXT DEFAULT (datetime('now')))")
+    con.execute("INSERT INTO book_levels (book_id, age_min, age_max) VALUES ('1', 12, 8)")
+    con.commit()
+    ensure_table(con)
+    assert con.execute("SELECT age_min, age_max FROM book_levels").fetchone() == (8, 12)
+    con.close()
+    assert [r["id"] for r in filter_books(db, age=(9, 9))] == ["1"]
+
+
+def test_level_filter_before_enrichment(make_db):
+    db = make_db({"1": {"title": "A"}})
+    assert filter_books(db, age=(8, 10)) == []
+    assert [r["id"] for r in filter_books(db)] == ["1"]
+
+
+def test_merged_ranges_are_stored_sorted(make_db):
+    con = sqlite3.connect(make_db({"1": {"title": "A"}}))
+    ensure_table(con)
+    _store_levels(con, "1", {"age_min": 3, "age_max": 5}, {})
+    _store_levels(con, "1", {"age_min": 9}, {})  # a later source's bare minimum
+    assert con.execute("SELECT age_min, age_max FROM book_levels").fetchone() == (5, 9)
+    assert con.execute("SELECT age_lo, age_hi FROM book_levels_rtree").fetchone() == (5, 9)
+
+
+def test_stored_range_repair_runs_once(make_db):
+    con = sqlite3.connect(make_db({"1": {"title": "A"}}))
+    ensure_table(con)
+    con.execute("INSERT INTO book_levels (book_id, age_min, age_max) VALUES ('1', 12, 8)")
+    ensure_table(con)  # already repaired this DB: rows are left as written
+    assert con.execute("SELECT age_min, age_max FROM book_levels").fetchone() == (12, 8)
+    assert con.execute("SELECT age_lo, age_hi FROM book_levels_rtree").fetchone() == (8, 12)
@@ -0,0 +1,80 @@
+import io
+import sqlite3
+
+from library_data.lib.marc import (
+    FIELD_TERMINATOR,
+    RECORD_TERMINATOR,
+    SUBFIELD_DELIMITER,
+    iter_marc_records,
+    iter_raw_records,
+)
+
+
+def marc_record(fields: list[tuple[str, str | tuple[str, list[tuple[str, str]]]]]) -> bytes:
+    """Minimal ISO 2709 writer: control fields as str, data fields as (indicators, subfields)."""
+    directory, body = b"", b""
+    for tag, value in fields:
+        if isinstance(value, str):
+            data = value.encode()
+        else:
+            ind, subs = value
+            data = ind.encode() + b"".join(
+                SUBFIELD_DELIMITER + c.encode() + v.encode() for c, v in subs)
+        data += FIELD_TERMINATOR
+        directory += f"{tag}{len(data):04d}{len(body):05d}".encode()
+        body += data
+    base = 24 + len(directory) + 1
+    total = base + len(body) + 1
+    leader = f"{total:05d}nam a22{base:05d}   4500".encode()
+    return leader + directory + FIELD_TERMINATOR + body + RECORD_TERMINATOR
+
+
+RECORD = marc_record([
+    ("001", "12345"),
+    ("008", "190504s2019    nyu           000 1 eng d"),
+    ("020", ("  ", [("a", "0-439-70818-4 (pbk.)")])),
+    ("100", ("1 ", [("a", "Rowling, J. K."), ("e", "author.")])),
+    ("245", ("10", [("a", "Harry Potter and the sorcerer's stone /"), ("c", "J.K. Rowling.")])),
+    ("300", ("  ", [("a", "309 p. :")])),
+    ("650", (" 0", [("a", "Wizards"), ("v", "Fiction.")])),
+    ("653", ("  ", [("a", "fantasy")])),
+])
+
+
+def test_marc_round_trip(tmp_path):
+    path = tmp_path / "export.mrc"
+    path.write_bytes(RECORD + b"\n" + RECORD.replace(b"12345", b"67890"))
+    recs = list(iter_marc_records(path))
+    assert [bid for bid, _ in recs] == ["12345", "67890"]
+    rec = recs[0][1]
+    assert rec["title"] == "Harry Potter and the sorcerer's stone"
+    assert rec["primaryauthor"] == "Rowling, J. K."
+    assert rec["authors"][0]["fl"] == "J. K. Rowling"
+    assert rec["pages"] == "309"
+    assert rec["isbn"] == {"0": "0439708184"}
+    assert rec["subject"] == {"0": ["Wizards", "Fiction"]}
+    assert rec["tags"] == ["fantasy"]
+    assert rec["entrydate"] == "2019-05-04"
+    assert rec["language"] == ["English"] and rec["language_codeA"] == ["eng"]
+
+
+def test_marc_and_json_imports_store_the_same_language(tmp_path, make_db):
+    path = tmp_path / "export.mrc"
+    path.write_bytes(RECORD)
+    (bid, rec), = iter_marc_records(path)
+    json_rec = {"title": "B", "language": ["English"], "language_codeA": ["eng"]}
+    db = make_db({bid: rec, "2": json_rec})
+    con = sqlite3.connect(db)
+    assert [r[0] for r in con.execute("SELECT language FROM books ORDER BY id")] == ["English"] * 2
+    con.close()
+
+
+def test_unterminated_run_past_limit_is_skipped():
+    garbage = b"0" * 50_000  # corrupt stretch with no record terminator
+    fh = io.BytesIO(RECORD + garbage + RECORD_TERMINATOR + RECORD)
+    assert list(iter_raw_records(fh, chunk_size=1024, max_len=4096)) == [RECORD, RECORD]
+
+
+def test_truncated_tail_past_limit_is_dropped():
+    fh = io.BytesIO(RECORD + b"9" * 10_000)
+    assert list(iter_raw_records(fh, chunk_size=1024, max_len=4096)) == [RECORD]
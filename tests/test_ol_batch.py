@@ -0,0 +1,89 @@
+import sqlite3
+
+from library_data.lib import isbn_utils
+from library_data.scripts import enrich_levels
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def test_editions_batched_per_chunk(monkeypatch):
+    calls = []
+
+    def fake_get(url, *, session=None, params=None, **kw):
+        keys = params["bibkeys"].split(",")
+        calls.append(keys)
+        # OL omits ISBNs it doesn't know
+        return FakeResponse({k: {"details": {"works": [{"key": "/works/W1"}], "isbn": k}}
+                             for k in keys if k != "ISBN:9780000000002"})
+
+    monkeypatch.setattr(isbn_utils, "http_get", fake_get)
+    isbns = ["9780000000001", "9780000000002", "9780000000003", "9780000000001"]
+    out = isbn_utils.ol_editions_by_isbn(isbns, chunk=2, sleep=0)
+    assert calls == [["ISBN:9780000000001", "ISBN:9780000000002"], ["ISBN:9780000000003"]]
+    assert sorted(out) == ["9780000000001", "9780000000003"]
+    assert out["9780000000003"]["works"] == [{"key": "/works/W1"}]
+
+
+def test_works_mapped_back_to_requested_isbns(monkeypatch):
+    def fake_get(url, *, session=None, params=None, **kw):
+        assert params["q"] == "isbn:9780000000001 OR isbn:9780000000003"
+        return FakeResponse({"docs": [
+            {"key": "/works/W1", "subject": ["Magic", "Ages 8-12"],
+             "isbn": ["9780000000001", "9789999999999"]},
+        ]})
+
+    monkeypatch.setattr(isbn_utils, "http_get", fake_get)
+    out = isbn_utils.ol_works_by_isbn(["9780000000001", "9780000000003"], sleep=0)
+    assert out == {"9780000000001": {"key": "/works/W1", "subjects": ["Magic", "Ages 8-12"]}}
+
+
+def _chunk_db(make_db):
+    db = make_db({"1": {"title": "A", "isbn": ["9780306406157"]},
+                  "2": {"title": "B", "isbn": ["9780439708180"]}})
+    con = sqlite3.connect(db)
+    con.row_factory = sqlite3.Row
+    enrich_levels.ensure_table(con)
+    return con, con.execute("SELECT id, raw_json FROM books ORDER BY id").fetchall()
+
+
+def test_chunk_defers_only_books_whose_host_failed(make_db, monkeypatch):
+    def explode(token, isbns):
+        if "9780439708180" in isbns:
+            raise isbn_utils.HostUnavailable("www.librarything.com", 0, "HTTP 503")
+        return list(isbns)
+
+    monkeypatch.setattr(enrich_levels, "explode_isbns_with_lt", explode)
+    monkeypatch.setattr(enrich_levels, "ol_editions_by_isbn", lambda isbns, **kw: {
+        x: {"subjects": ["Ages 8-12"]} for x in isbns})
+    monkeypatch.setattr(enrich_levels, "ol_works_by_isbn", lambda isbns, **kw: {})
+    con, rows = _chunk_db(make_db)
+    out = enrich_levels._enrich_chunk(con, None, rows, lt_token="t", sleep=0, work_cache={})
+    assert out == (1, 1)  # (wrote, deferred)
+    levels = con.execute("SELECT book_id, age_min, age_max FROM book_levels").fetchall()
+    assert [tuple(r) for r in levels] == [("1", 8, 12)]
+    outcomes = con.execute(
+        "SELECT book_id, outcome FROM enrich_attempts ORDER BY book_id").fetchall()
+    assert [tuple(r) for r in outcomes] == [("1", "found"), ("2", "deferred")]
+
+
+def test_chunk_honours_probe_all(make_db, monkeypatch):
+    fetched = []
+    monkeypatch.setattr(enrich_levels, "ol_editions_by_isbn", lambda isbns, **kw: {})
+    monkeypatch.setattr(enrich_levels, "ol_works_by_isbn", lambda isbns, **kw: {})
+    monkeypatch.setattr(enrich_levels, "fetch_ol_pair",
+                        lambda s, isbn: fetched.append(isbn) or (None, None))
+    con, rows = _chunk_db(make_db)
+    enrich_levels._enrich_chunk(con, None, rows, lt_token=None, sleep=0, work_cache={},
+                                probe_all=True)
+    assert fetched == []
+    # like one-at-a-time mode, the default still tries each book's own ISBNs directly
+    enrich_levels._enrich_chunk(con, None, rows, lt_token=None, sleep=0, work_cache={})
+    assert fetched == ["9780306406157", "9780439708180"]
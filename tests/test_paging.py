@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from library_data import config
+from library_data.lib.lib_catalog import filter_books, search_text
+from library_data.lib.shards import federated_search_text
+from library_data.scripts.dedup import ensure_groups_table
+from library_data.scripts.ingest import rebuild_fts
+
+
+def _pages(fn, limit, **kw):
+    out, cursor = [], None
+    while page := fn(limit=limit, cursor=cursor, **kw):
+        out.append([r["id"] for r in page])
+        cursor = page[-1]["cursor"]
+    return out
+
+
+@pytest.fixture
+def grouped_db(make_db):
+    # "d1".."d3" are editions of one work, spread over the newest-first order so a
+    # page boundary falls between them
+    recs = {f"b{i}": {"title": f"Book {i:02}", "entrydate": f"2020-01-{i:02}"}
+            for i in range(1, 10)}
+    recs |= {"d1": {"title": "Dune", "entrydate": "2020-01-08"},
+             "d2": {"title": "Dune (Book Club)", "entrydate": "2020-01-05"},
+             "d3": {"title": "Dune, reissue", "entrydate": "2020-01-02"}}
+    db = make_db(recs)
+    con = sqlite3.connect(db)
+    ensure_groups_table(con)
+    con.executemany("INSERT INTO book_groups (book_id, group_id, similarity) VALUES (?, 'd2', 1.0)",
+                    [("d1",), ("d2",), ("d3",)])
+    con.commit()
+    con.close()
+    return db
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_filter_collapse_never_repeats_a_group_across_pages(grouped_db, limit):
+    pages = _pages(lambda **kw: filter_books(grouped_db, **kw), limit, collapse=True)
+    ids = [i for p in pages for i in p]
+    assert ids == ["b9", "b8", "d1", "b7", "b6", "b5", "b4", "b3", "b2", "b1"]
+    assert all(len(p) == limit for p in pages[:-1])
+
+
+@pytest.mark.parametrize("fts", [False, True])
+def test_search_collapse_across_pages(grouped_db, fts):
+    if fts:
+        con = sqlite3.connect(grouped_db)
+        rebuild_fts(con)
+        con.close()
+    pages = _pages(lambda **kw: search_text(grouped_db, "dune", **kw), 1, collapse=True)
+    assert len(pages) == 1 and pages[0][0] in {"d1", "d2", "d3"}
+    ids = [i for p in _pages(lambda **kw: search_text(grouped_db, "dune", **kw), 1) for i in p]
+    assert sorted(ids) == ["d1", "d2", "d3"]
+
+
+def test_federated_search_pages_with_merged_cursor(make_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SHARDS_DIR", tmp_path)
+    make_db({str(i): {"title": f"Dragon {i}"} for i in range(4)}, "alice.db")
+    db = make_db({str(i): {"title": f"Dragon {i}"} for i in range(3)}, "bob.db")
+    con = sqlite3.connect(db)
+    rebuild_fts(con)  # bob ranks by bm25, alice by title
+    con.close()
+
+    whole = [(r["shard"], r["id"]) for r in federated_search_text(["alice", "bob"], "dragon", 10)]
+    paged, cursor = [], None
+    while page := federated_search_text(["alice", "bob"], "dragon", 2, cursor=cursor):
+        paged += [(r["shard"], r["id"]) for r in page]
+        cursor = page[-1]["cursor"]
+    assert len(whole) == 7 and paged == whole
+    with pytest.raises(ValueError):
+        federated_search_text(["alice"], "dragon", cursor=filter_books(db)[0]["cursor"])
@@ -0,0 +1,88 @@
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from library_data.lib.query_client import DaemonUnavailable, QueryClient
+
+
+def _serve(db, sock, **kw):
+    cmd = [sys.executable, "-m", "library_data.scripts.query",
+           "--db", str(db), "--socket", str(sock), "serve", "--workers", "2"]
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, **kw)
+
+
+@pytest.fixture
+def daemon(make_db, tmp_path):
+    db = make_db({"1": {"title": "Dune", "entrydate": "2020-01-02"},
+                  "2": {"title": "Emma", "entrydate": "2021-05-06"}})
+    sock = tmp_path / "q.sock"
+    proc = _serve(db, sock)
+    try:
+        for _ in range(100):
+            if sock.exists():
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail("daemon did not start")
+        yield db, sock
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def test_ping_and_queries(daemon):
+    db, sock = daemon
+    with QueryClient(sock, db=db) as client:
+        assert client.call("ping") == {"db": str(db.resolve())}
+        assert client.call("get", id="1")["title"] == "Dune"
+        assert [r["id"] for r in client.call("filter", limit=10)] == ["2", "1"]
+        batch = [{"op": "get", "args": {"id": "2"}}, {"op": "nope"}]
+        assert client.call("batch", requests=batch) == [
+            {"ok": True, "result": {"title": "Emma", "entrydate": "2021-05-06"}},
+            {"ok": False, "error": "ValueError: unknown op 'nope'"},
+        ]
+        with pytest.raises(RuntimeError):
+            client.call("nope")
+
+
+def test_other_db_or_no_daemon_is_unavailable(daemon, tmp_path):
+    _db, sock = daemon
+    with QueryClient(sock, db=tmp_path / "other.db") as client:
+        with pytest.raises(DaemonUnavailable):
+            client.call("ping")
+    with pytest.raises(DaemonUnavailable):
+        QueryClient(tmp_path / "missing.sock")
+
+
+def test_second_daemon_leaves_a_live_socket_alone(daemon, tmp_path):
+    db, sock = daemon
+    second = _serve(tmp_path / "other.db", sock, stderr=subprocess.PIPE, text=True)
+    _out, err = second.communicate(timeout=30)
+    assert second.returncode != 0 and "already serving" in err
+    with QueryClient(sock, db=db) as client:
+        assert client.call("ping") == {"db": str(db.resolve())}
+
+
+def test_stale_socket_is_replaced(make_db, tmp_path):
+    db = make_db({"1": {"title": "Dune"}})
+    sock = tmp_path / "q.sock"
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(str(sock))  # bound, never listening: what a killed daemon leaves behind
+    dead.close()
+    proc = _serve(db, sock)
+    try:
+        for _ in range(100):
+            try:
+                with QueryClient(sock, db=db) as client:
+                    assert client.call("get", id="1")["title"] == "Dune"
+                break
+            except DaemonUnavailable:
+                time.sleep(0.05)
+        else:
+            pytest.fail("daemon did not take over the stale socket")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
@@ -0,0 +1,46 @@
+import pytest
+
+from library_data import config
+from library_data.lib.shards import federated_filter_books, federated_search_text, resolve_shards
+
+
+@pytest.fixture
+def shards(make_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SHARDS_DIR", tmp_path)
+    make_db({"1": {"title": "Dune", "entrydate": "2020-01-01", "tags": ["scifi"]},
+             "2": {"title": "Emma", "entrydate": "2022-03-01"}}, "alice.db")
+    make_db({"1": {"title": "Dune Messiah", "entrydate": "2021-06-01", "tags": ["scifi"]}},
+            "bob.db")
+    return ["alice", "bob"]
+
+
+def test_resolve_skips_missing_shards(shards):
+    assert list(resolve_shards(shards + ["carol"])) == ["alice", "bob"]
+
+
+def test_federated_filter_merges_in_catalog_order(shards):
+    rows = federated_filter_books(shards, limit=10)
+    assert [(r["shard"], r["title"]) for r in rows] == [
+        ("alice", "Emma"), ("bob", "Dune Messiah"), ("alice", "Dune")]
+    rows = federated_filter_books(shards, tag="scifi", limit=1)
+    assert [(r["shard"], r["id"]) for r in rows] == [("bob", "1")]
+
+
+def test_federated_search(shards):
+    rows = federated_search_text(shards, "dune", 10)
+    assert sorted((r["shard"], r["title"]) for r in rows) == [
+        ("alice", "Dune"), ("bob", "Dune Messiah")]
+
+
+def test_federated_filter_pages_ties_across_shards(make_db, tmp_path, monkeypatch):
+    # the same book id, title and entry date in two accounts: the merged order ties on every
+    # key but the shard, and a page boundary falls between the two rows
+    monkeypatch.setattr(config, "SHARDS_DIR", tmp_path)
+    same = {"7": {"title": "Dune", "entrydate": "2020-01-01"}}
+    make_db(same | {"8": {"title": "Emma", "entrydate": "2019-01-01"}}, "alice.db")
+    make_db(same | {"9": {"title": "Kim", "entrydate": "2018-01-01"}}, "bob.db")
+    seen, cursor = [], None
+    while page := federated_filter_books(["bob", "alice"], limit=1, cursor=cursor):
+        seen += [(r["shard"], r["id"]) for r in page]
+        cursor = page[-1]["cursor"]
+    assert seen == [("bob", "7"), ("alice", "7"), ("alice", "8"), ("bob", "9")]
@@ -0,0 +1,65 @@
+import sqlite3
+
+from library_data.lib.lib_catalog import similar_books
+from library_data.scripts import similar
+
+
+def _catalog(n=150):
+    # every book is Fiction and most are science fiction: terms far too common to pair
+    # books on their own merit, but still what the two "plain" books have in common
+    recs = {str(i): {"title": f"Book {i}", "genre": ["Fiction"],
+                     "subject": ["Science fiction"] if i < 110 else [],
+                     "tags": [f"series {i // 2}", f"shelf {i % 7}"]}
+            for i in range(3, n)}
+    recs["1"] = recs["2"] = {"title": "Plain", "genre": ["Fiction"],
+                             "subject": ["Science fiction"]}
+    recs["dune"] = {"title": "Dune", "genre": ["Fiction"],
+                    "tags": ["desert planet", "spice", "space opera"]}
+    recs["messiah"] = {"title": "Dune Messiah", "genre": ["Fiction"],
+                       "tags": ["desert planet", "spice"]}
+    return recs
+
+
+def test_default_refresh_lists_related_books(make_db):
+    db = make_db(_catalog())
+    con = sqlite3.connect(db)
+    assert similar.refresh(con) == 151
+    con.close()
+
+    assert similar_books(db, "messiah", 1)[0]["id"] == "dune"
+    top = similar_books(db, "1", 3)
+    assert top[0]["id"] == "2" and abs(top[0]["score"] - 1.0) < 1e-5
+
+
+def test_empty_index_is_built_even_with_empty_queue(make_db):
+    db = make_db(_catalog())
+    con = sqlite3.connect(db)
+    similar.ensure_similar_table(con)
+    con.execute("DELETE FROM book_similar_dirty")
+    con.commit()
+    assert similar.refresh(con) == 151
+    assert con.execute("SELECT COUNT(*) FROM book_similar WHERE book_id = 'dune'").fetchone()[0] > 0
+    con.close()
+
+
+def test_refresh_picks_up_changes_queued_by_ingest(make_db):
+    db = make_db(_catalog())
+    con = sqlite3.connect(db)
+    similar.build(con)
+    con.execute("UPDATE books SET tags = 'desert planet, spice, space opera' WHERE id = '40'")
+    con.commit()
+    assert [r[0] for r in con.execute("SELECT book_id FROM book_similar_dirty")] == ["40"]
+    assert similar.refresh(con) > 0
+    con.close()
+    assert {r["id"] for r in similar_books(db, "dune", 2)} == {"40", "messiah"}
+
+
+def test_postings_cap_keeps_scores_symmetric(make_db, monkeypatch):
+    monkeypatch.setattr(similar, "MAX_POSTINGS", 5)
+    db = make_db(_catalog(60))
+    con = sqlite3.connect(db)
+    similar.build(con, k=100)
+    rows = con.execute("SELECT book_id, similar_id, score FROM book_similar")
+    scores = {(a, b): s for a, b, s in rows}
+    con.close()
+    assert scores and all(abs(scores[b, a] - s) < 1e-5 for (a, b), s in scores.items())
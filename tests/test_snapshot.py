@@ -0,0 +1,70 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from library_data.lib import columnar
+from library_data.lib.columnar import Snapshot
+from library_data.scripts import enrich_levels, snapshot
+
+
+@pytest.fixture
+def snap(make_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, "CHUNK", 2)  # make every aggregation cross chunk boundaries
+    db = make_db({
+        "1": {"title": "A", "entrydate": "2020-01-05", "language": "English", "pages": 100,
+              "genre": ["Fiction", "Fantasy"]},
+        "2": {"title": "B", "entrydate": "2020-02-01", "language": "English", "pages": 300,
+              "genre": ["Fiction"]},
+        "3": {"title": "C", "entrydate": "2021-07-04", "language": "French", "pages": 200},
+        "4": {"title": "D", "language": "English", "genre": ["Fantasy"]},
+        "5": {"title": "E", "entrydate": "2022-12-31", "language": "German", "pages": 50,
+              "genre": ["Poetry"]},
+    })
+    con = sqlite3.connect(db)
+    enrich_levels.ensure_table(con)
+    enrich_levels._store_levels(con, "1", {"lexile_min": 500, "lexile_max": 700}, {})
+    enrich_levels._store_levels(con, "3", {"lexile_min": 900}, {})
+    con.close()
+    out = tmp_path / "snap"
+    assert snapshot.build(db, out) == 5
+    return Snapshot(out)
+
+
+def test_count_by(snap):
+    assert snap.count_by("language") == [("English", 3), ("French", 1), ("German", 1)]
+    assert snap.count_by("genres", top=2) == [("Fiction", 2), ("Fantasy", 2)]
+    assert snap.count_by("entry_year") == [(2020, 2), (2021, 1), (2022, 1)]
+
+
+def test_group_by_skips_missing_values(snap):
+    rows = {r["key"]: r for r in snap.group_by("language", "pages", ["mean", "min", "max"])}
+    assert rows["English"] == {"key": "English", "count": 2, "mean": 200.0, "min": 100.0,
+                               "max": 300.0}
+    assert rows["German"]["count"] == 1
+    by_genre = {r["key"]: r["sum"] for r in snap.group_by("genres", "pages", "sum")}
+    assert by_genre == {"Fiction": 400.0, "Fantasy": 100.0, "Poetry": 50.0}
+
+
+def test_histogram(snap):
+    counts, edges = snap.histogram("pages", bins=[0, 100, 200, 400])
+    assert counts.tolist() == [1, 1, 2]
+    counts, edges = snap.histogram("lexile_min", bins=2)
+    assert counts.tolist() == [1, 1] and edges.tolist() == [500.0, 700.0, 900.0]
+    assert np.sum(snap.histogram("lexile_max")[0]) == 1  # book 3 has no max
+
+
+def test_errors_and_rebuild(snap, make_db):
+    with pytest.raises(KeyError):
+        snap.count_by("nope")
+    with pytest.raises(ValueError):
+        snap.histogram("language")
+    with pytest.raises(ValueError):
+        snap.group_by("language", "genres")
+
+    assert snap.count_by("language")[0] == ("English", 3)
+    db = make_db({"9": {"title": "Z", "language": "Welsh"}}, "other.db")
+    snapshot.build(db, snap.path)
+    # columns already mapped keep the old data
+    assert snap.count_by("language")[0] == ("English", 3)
+    assert Snapshot(snap.path).count_by("language") == [("Welsh", 1)]